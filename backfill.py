@@ -0,0 +1,402 @@
+"""Backfill the daily extractions of a range of dates into the database.
+
+Downloads the raw Excel files from Azure Blob Storage with a bounded thread
+pool, parses them in a process pool and writes them through the shared
+connection pool. Days already recorded in Dates_data are skipped, so an
+interrupted backfill can be resumed by running the same command again.
+
+With --opb-sql, the events are only loaded into LTH_Evt_defauts and the OPB
+aggregates of the whole range are then recomputed by the database in one pass.
+With --recompute-opb, nothing is downloaded: only the OPB aggregates of the
+range are recomputed from the events already in LTH_Evt_defauts.
+
+Example:
+    python backfill.py 2024-07-16 2024-07-31 --types OPB Injection --workers 4
+"""
+
+import argparse
+import datetime
+import io
+import logging
+import multiprocessing
+import sys
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+from src.utilsExcel import *
+
+logging.basicConfig(level=logging.INFO)
+
+# Files and Dates_data types of each data type that can be backfilled
+BACKFILL_TYPES = {
+    "OPB": {
+        "files": ["Evenementsetdefauts.xlsx"],
+        "data_types": ["OPB"],
+    },
+    "Injection": {
+        "files": [
+            "Injectiondescolisauxantennes_trieur_haut.xlsx",
+            "Injectiondescolisauxantennes_trieur_bas.xlsx",
+        ],
+        "data_types": ["Injection_haut", "Injection_bas"],
+    },
+    "Qualité_de_tri": {
+        "files": ["Qualité_de_tri.xlsx"],
+        "data_types": ["Qualité_de_tri"],
+    },
+    "Temps_fonctionnement": {
+        "files": ["Temps_de_fonctionnement_et_arrêts_machine.xlsx"],
+        "data_types": ["Temps_fonctionnement"],
+    },
+}
+
+
+def date_range(start_date: datetime.date, end_date: datetime.date) -> list:
+    """Get all the dates between two dates, both included.
+
+    Args:
+        start_date (datetime.date): The first date.
+        end_date (datetime.date): The last date.
+
+    Returns:
+        list: The dates.
+    """
+    days = (end_date - start_date).days
+    return [start_date + datetime.timedelta(days=i) for i in range(days + 1)]
+
+
+def get_done_dates(start_date: datetime.date, end_date: datetime.date) -> set:
+    """Get the (data type, date) pairs already recorded in Dates_data.
+
+    Args:
+        start_date (datetime.date): The first date.
+        end_date (datetime.date): The last date.
+
+    Returns:
+        set: The (Data_type, Date) pairs of the LTH site.
+    """
+    from src.utilsDB import pooled_connection
+
+    with pooled_connection() as (connection, _):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                    SELECT DISTINCT "Data_type", "Date"
+                    FROM public."Dates_data"
+                    WHERE "Site" = 'LTH'
+                    AND "Date" BETWEEN %s AND %s
+                """,
+                (start_date, end_date),
+            )
+            rows = cursor.fetchall()
+    return {(data_type, date) for data_type, date in rows}
+
+
+def download_day(data_type: str, date: datetime.date) -> dict:
+    """Download the files of a data type for a day.
+
+    Files with an up-to-date Parquet sidecar are loaded from it, the others are
+    downloaded as Excel to be parsed.
+
+    Args:
+        data_type (str): The backfilled data type, a key of BACKFILL_TYPES.
+        date (datetime.date): The date of the data.
+
+    Returns:
+        dict: By file name, None when the file is missing, else its ETag and
+            either its parsed "frame" or its Excel "content".
+    """
+    from src.utilsAzure import get_Azure_file_bytes, get_blob_etag
+
+    downloads = {}
+    for file in BACKFILL_TYPES[data_type]["files"]:
+        blob_name = extraction_blob_name(date, file)
+        etag = get_blob_etag(blob_name)
+        downloads[file] = None
+        if etag is None:
+            continue
+        df = load_sidecar(blob_name, etag)
+        if df is not None:
+            downloads[file] = {"etag": etag, "frame": df}
+            continue
+        excel_file = get_Azure_file_bytes(blob_name)
+        if excel_file is not None:
+            downloads[file] = {"etag": etag, "content": excel_file.getvalue()}
+    return downloads
+
+
+def parse_day(date: datetime.date, contents: dict) -> dict:
+    """Parse Excel files of a day.
+
+    Runs in a worker process, so it only depends on src.utilsExcel.
+
+    Args:
+        date (datetime.date): The date of the data.
+        contents (dict): The Excel content of each file name.
+
+    Returns:
+        dict: The parsed DataFrame of each file name.
+    """
+    return {
+        file: EXTRACTION_READERS[file](io.BytesIO(content), date)
+        for file, content in contents.items()
+    }
+
+
+def write_day(
+    data_type: str,
+    date: datetime.date,
+    frames: dict,
+    sidecars: dict,
+    opb_sql: bool = False,
+):
+    """Write the parsed files of a data type for a day in the database.
+
+    Args:
+        data_type (str): The backfilled data type, a key of BACKFILL_TYPES.
+        date (datetime.date): The date of the data.
+        frames (dict): The parsed DataFrame of each file name found.
+        sidecars (dict): The source ETag of the files parsed from Excel, whose
+            Parquet sidecar is stored first.
+        opb_sql (bool, optional): Whether the OPB aggregates are left to
+            recompute_opb. Defaults to False.
+    """
+    from view import uploads as app
+    from src.utilsDB import pooled_connection
+
+    # The sidecar uploads and the writes of the day are one ingestion run
+    with app.ingestion_run(data_type, date):
+        for file, etag in sidecars.items():
+            save_sidecar(extraction_blob_name(date, file), frames[file], etag)
+
+        files = BACKFILL_TYPES[data_type]["files"]
+        with pooled_connection() as (connection, engine):
+            if data_type == "OPB":
+                app.run_pipeline("Evt_defauts", date, connection, engine, frames=frames)
+                if not opb_sql:
+                    app.upload_opb(frames[files[0]], connection, engine, date)
+            elif data_type == "Injection":
+                if all(file in frames for file in files):
+                    total = sum(total_injecte(frames[file]) for file in files)
+                    app.write_injection_par_jour(connection, date, total)
+                app.run_pipeline(
+                    "Injections_antennes", date, connection, engine, frames=frames
+                )
+                # The day is only marked done once both writes succeeded
+                for file, coverage in zip(
+                    files, BACKFILL_TYPES[data_type]["data_types"]
+                ):
+                    if file in frames:
+                        app.add_date_data(
+                            connection=connection,
+                            engine=engine,
+                            date=date,
+                            data_type=coverage,
+                            site="LTH",
+                        )
+            else:
+                # The other data types are written by their pipeline as is
+                app.run_pipeline(data_type, date, connection, engine, frames=frames)
+
+
+def backfill(
+    start_date: datetime.date,
+    end_date: datetime.date,
+    data_types: list,
+    workers: int = 4,
+    download_workers: int = 8,
+    opb_sql: bool = False,
+) -> list:
+    """Backfill the daily extractions of a range of dates.
+
+    Args:
+        start_date (datetime.date): The first date.
+        end_date (datetime.date): The last date.
+        data_types (list): The data types to backfill, keys of BACKFILL_TYPES.
+        workers (int, optional): The number of parsing processes and writing
+            threads. Defaults to 4.
+        download_workers (int, optional): The number of download threads. Defaults to 8.
+        opb_sql (bool, optional): Whether to recompute the OPB aggregates of the
+            range in the database once the events are loaded. Defaults to False.
+
+    Returns:
+        list: One (date, data type, status, detail) tuple per day and data type.
+    """
+    from src.utilsDB import POOL_MAX_SIZE
+
+    done = get_done_dates(start_date, end_date)
+    report = []
+    tasks = []
+    for date in date_range(start_date, end_date):
+        for data_type in data_types:
+            coverage = BACKFILL_TYPES[data_type]["data_types"]
+            if all((name, date) in done for name in coverage):
+                report.append((date, data_type, "skipped", "déjà en base"))
+            else:
+                tasks.append((date, data_type))
+
+    # The children only import src.utilsExcel, not the Streamlit app
+    mp_context = multiprocessing.get_context("spawn")
+    with ThreadPoolExecutor(
+        max_workers=download_workers
+    ) as download_pool, ProcessPoolExecutor(
+        max_workers=workers, mp_context=mp_context
+    ) as parse_pool, ThreadPoolExecutor(
+        max_workers=min(workers, POOL_MAX_SIZE)
+    ) as write_pool:
+        pending = {}
+        for date, data_type in tasks:
+            future = download_pool.submit(download_day, data_type, date)
+            pending[future] = ("download", date, data_type, None)
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, date, data_type, payload = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.exception(
+                        f"Backfill of {data_type} {date} failed at {stage}"
+                    )
+                    report.append((date, data_type, "failed", f"{stage}: {e}"))
+                    continue
+
+                if stage == "download":
+                    found = {file: d for file, d in result.items() if d is not None}
+                    if not found:
+                        report.append((date, data_type, "missing", "aucun fichier"))
+                        continue
+                    # Files without an up-to-date sidecar are parsed in a child process
+                    frames = {f: d["frame"] for f, d in found.items() if "frame" in d}
+                    contents = {
+                        f: d["content"] for f, d in found.items() if "content" in d
+                    }
+                    sidecars = {f: found[f]["etag"] for f in contents}
+                    if contents:
+                        next_future = parse_pool.submit(parse_day, date, contents)
+                        pending[next_future] = (
+                            "parse",
+                            date,
+                            data_type,
+                            (frames, sidecars),
+                        )
+                    else:
+                        next_future = write_pool.submit(
+                            write_day, data_type, date, frames, {}, opb_sql
+                        )
+                        pending[next_future] = ("write", date, data_type, None)
+                elif stage == "parse":
+                    frames, sidecars = payload
+                    next_future = write_pool.submit(
+                        write_day,
+                        data_type,
+                        date,
+                        {**frames, **result},
+                        sidecars,
+                        opb_sql,
+                    )
+                    pending[next_future] = ("write", date, data_type, None)
+                else:
+                    logging.info(f"Backfilled {data_type} for {date}")
+                    report.append((date, data_type, "ok", ""))
+
+    if opb_sql and "OPB" in data_types:
+        from src.utilsDB import pooled_connection
+        from src.utilsOPB import recompute_opb
+
+        with pooled_connection() as (connection, _):
+            recompute_opb(connection, start_date, end_date)
+
+    return sorted(report, key=lambda row: (row[0], row[1]))
+
+
+def print_report(report: list):
+    """Print the status of each day and data type.
+
+    Args:
+        report (list): The backfill report, see backfill.
+    """
+    for date, data_type, status, detail in report:
+        print(f"{date}  {data_type:<22} {status:<8} {detail}")
+    counts = {}
+    for _, _, status, _ in report:
+        counts[status] = counts.get(status, 0) + 1
+    print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("start_date", type=datetime.date.fromisoformat)
+    parser.add_argument(
+        "end_date",
+        type=datetime.date.fromisoformat,
+        nargs="?",
+        default=datetime.date.today() - datetime.timedelta(days=1),
+    )
+    parser.add_argument(
+        "--types",
+        nargs="+",
+        choices=list(BACKFILL_TYPES),
+        default=list(BACKFILL_TYPES),
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument(
+        "--opb-sql",
+        action="store_true",
+        help="recompute the OPB aggregates of the range in the database",
+    )
+    parser.add_argument(
+        "--recompute-opb",
+        action="store_true",
+        help="only recompute the OPB aggregates from LTH_Evt_defauts",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile the writes of each day, see src.utilsProfiling",
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        from src.utilsProfiling import set_profiling
+
+        set_profiling(True)
+
+    from src.utilsDB import close_pool
+
+    if args.recompute_opb:
+        from src.utilsDB import pooled_connection
+        from src.utilsOPB import recompute_opb
+
+        try:
+            with pooled_connection() as (connection, _):
+                counts = recompute_opb(connection, args.start_date, args.end_date)
+        finally:
+            close_pool()
+        print(", ".join(f"{table}: {count}" for table, count in counts.items()))
+        return 0
+
+    try:
+        report = backfill(
+            args.start_date,
+            args.end_date,
+            args.types,
+            workers=args.workers,
+            download_workers=args.download_workers,
+            opb_sql=args.opb_sql,
+        )
+    finally:
+        close_pool()
+
+    print_report(report)
+    return 1 if any(status == "failed" for _, _, status, _ in report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Compare the Excel engines of src.utilsExcel.read_excel on each file type.
+
+Example:
+    python -m benchmarks.excel_readers --scale 1 --repeat 3
+"""
+
+import argparse
+import datetime
+import io
+import statistics
+import time
+
+import src.utilsExcel as utilsExcel
+from benchmarks.workbooks import generate_workbook
+
+DATE = datetime.date(2024, 7, 16)
+
+# Reader of each daily extraction file
+READERS = {
+    "Evenementsetdefauts.xlsx": lambda file: utilsExcel.read_evts_defauts(file, DATE),
+    "Injectiondescolisauxantennes_trieur_haut.xlsx": lambda file: utilsExcel.read_injections_antennes(
+        file, DATE
+    ),
+    "Qualité_de_tri.xlsx": lambda file: utilsExcel.read_qualite_tri(file, DATE),
+    "Temps_de_fonctionnement_et_arrêts_machine.xlsx": lambda file: utilsExcel.read_temps_fonctionnement(
+        file, DATE
+    ),
+    "Trafic_par_sortie_trieur_haut.xlsx": lambda file: utilsExcel.read_trafic_sortie(
+        file, DATE
+    ),
+}
+
+
+def time_reader(reader, content: bytes, engine: str, repeat: int):
+    """Time a reader with an Excel engine.
+
+    Args:
+        reader (callable): The reader, see READERS.
+        content (bytes): The content of the workbook.
+        engine (str): The pandas Excel engine.
+        repeat (int): The number of runs.
+
+    Returns:
+        tuple: The median duration in seconds and the DataFrame of the last run.
+    """
+    utilsExcel.EXCEL_ENGINE = engine
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = reader(io.BytesIO(content))
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engines", nargs="+", default=["openpyxl", "calamine"])
+    args = parser.parse_args()
+
+    engines = [e for e in args.engines if utilsExcel.excel_engine_available(e)]
+    for engine in set(args.engines) - set(engines):
+        print(f"Engine {engine} is not installed, skipped")
+
+    print(
+        f"{'File':<48} {'Engine':<10} {'Rows':>7} {'Median (s)':>11} {'Speedup':>8} Same"
+    )
+    for file_name, reader in READERS.items():
+        content = generate_workbook(file_name, DATE, scale=args.scale)
+        reference = None
+        for engine in engines:
+            duration, df = time_reader(reader, content, engine, args.repeat)
+            if reference is None:
+                reference = (duration, df)
+            speedup = reference[0] / duration
+            same = df.reset_index(drop=True).equals(reference[1].reset_index(drop=True))
+            print(
+                f"{file_name:<48} {engine:<10} {len(df):>7} {duration:>11.3f} {speedup:>7.1f}x {same}"
+            )
+
+
+if __name__ == "__main__":
+    main()
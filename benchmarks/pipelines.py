@@ -0,0 +1,275 @@
+"""Run the ingestion pipelines end to end on synthetic workbooks.
+
+Each pipeline of src.pipelines ingests the synthetic workbooks of
+benchmarks.workbooks for a day: the daily files are stored in a fake blob
+container (a temporary directory served by LocalContainerClient) and
+downloaded from it, the uploaded extracts are read as uploaded. The rows are
+written to the PostgreSQL database of the host, port, dbname, user and password
+settings, which must be a disposable local database since the pipelines replace
+rows of the real table names.
+
+The median throughput of the download, read and write stages (the write stage
+being run_pipeline: transforms, keyed replacement and Dates_data) is reported
+with the peak Python memory of each stage, measured by tracemalloc on an extra
+run. With --baseline, the stages slower or using more memory than the saved
+report by more than the tolerance are flagged and the exit code is 1.
+
+Example:
+    python -m benchmarks.pipelines --scale 2 --save baseline.json
+    python -m benchmarks.pipelines --scale 2 --baseline baseline.json
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from dotenv import load_dotenv
+
+from benchmarks.workbooks import generate_workbook
+
+DATE = datetime.date(2024, 7, 16)
+
+# Workbook of the pipelines reading an uploaded extract instead of daily files
+UPLOADED_WORKBOOKS = {
+    "Interventions": "Interventions.xlsx",
+    "Mvt_stock": "Mouvements_de_stock.xlsx",
+    "Etat_stock": "Inventaire.xlsx",
+}
+
+LOCAL_HOSTS = [None, "", "localhost", "127.0.0.1", "::1"]
+
+
+def configure(container_dir: str):
+    """Point the app settings at the fake blob container, before importing src.
+
+    The blob cache and the Parquet sidecars are disabled so that every run
+    downloads and parses the Excel files, and the runs are not stored in
+    Ingestion_runs.
+    """
+    os.environ["url"] = f"file://{container_dir}"
+    os.environ["blob_cache_max_mb"] = "0"
+    os.environ["parquet_sidecars"] = "0"
+    os.environ["ingestion_runs"] = "0"
+
+
+def prepare_database():
+    """Create the tables the pipelines expect but do not create themselves."""
+    from src.utilsDB import pooled_connection
+
+    with pooled_connection() as (connection, _):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS public.french_public_holidays "
+                "(holiday_date date)"
+            )
+        connection.commit()
+
+
+def measured(function, *args, memory: bool = False):
+    """Run a function, timing it and measuring its peak Python memory.
+
+    Returns:
+        tuple: The result, the duration in seconds and the peak memory in bytes
+            above the memory in use before the call (0 without memory).
+    """
+    if memory:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - base if memory else 0
+    return result, seconds, peak
+
+
+def run_once(name: str, contents: dict, memory: bool = False) -> dict:
+    """Ingest the workbooks of a pipeline once.
+
+    Args:
+        name (str): The pipeline, a key of PIPELINES.
+        contents (dict): The content of each workbook, by daily file name, or
+            by uploaded workbook name.
+        memory (bool, optional): Whether to measure the peak memory. Defaults
+            to False.
+
+    Returns:
+        dict: The rows, bytes, seconds and peak memory of each stage.
+    """
+    from src.pipelines import PIPELINES, run_pipeline
+    from src.utilsAzure import get_many
+    from src.utilsDB import pooled_connection
+    from src.utilsExcel import EXTRACTION_READERS, extraction_blob_name
+
+    spec = PIPELINES[name]
+    stages = {}
+    if spec["files"]:
+        blob_names = {extraction_blob_name(DATE, file): file for file in spec["files"]}
+        files, seconds, peak = measured(get_many, list(blob_names), memory=memory)
+        nbytes = sum(len(file.getvalue()) for file in files.values())
+        stages["download"] = {"rows": 0, "bytes": nbytes, "s": seconds, "peak": peak}
+
+        def read():
+            return {
+                blob_names[blob]: EXTRACTION_READERS[blob_names[blob]](file, DATE)
+                for blob, file in files.items()
+            }
+
+    else:
+
+        def read():
+            source = io.BytesIO(next(iter(contents.values())))
+            return dict(enumerate(spec["reader"](source, DATE)))
+
+    frames, seconds, peak = measured(read, memory=memory)
+    rows = sum(len(df) for df in frames.values())
+    stages["read"] = {"rows": rows, "bytes": 0, "s": seconds, "peak": peak}
+
+    with pooled_connection() as (connection, engine):
+        result, seconds, peak = measured(
+            run_pipeline, name, DATE, connection, engine, frames, memory=memory
+        )
+    stages["write"] = {"rows": result["rows"], "bytes": 0, "s": seconds, "peak": peak}
+    return stages
+
+
+def benchmark(name: str, scale: float, repeat: int, container_dir: str) -> dict:
+    """Benchmark a pipeline on synthetic workbooks of a given scale.
+
+    Returns:
+        dict: The rows, bytes, median seconds, rows/s, MB/s and peak memory (MB)
+            of each stage.
+    """
+    from src.pipelines import PIPELINES
+    from src.utilsExcel import extraction_blob_name
+
+    spec = PIPELINES[name]
+    files = spec["files"] or [UPLOADED_WORKBOOKS[name]]
+    contents = {file: generate_workbook(file, DATE, scale=scale) for file in files}
+    for file in spec["files"]:
+        path = os.path.join(container_dir, *extraction_blob_name(DATE, file).split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as blob:
+            blob.write(contents[file])
+
+    runs = [run_once(name, contents) for _ in range(repeat)]
+    tracemalloc.start()
+    try:
+        peaks = run_once(name, contents, memory=True)
+    finally:
+        tracemalloc.stop()
+
+    report = {}
+    for stage in runs[0]:
+        seconds = statistics.median(run[stage]["s"] for run in runs)
+        rows = runs[0][stage]["rows"]
+        nbytes = runs[0][stage]["bytes"]
+        report[stage] = {
+            "rows": rows,
+            "bytes": nbytes,
+            "seconds": seconds,
+            "rows_per_s": rows / seconds if seconds else 0.0,
+            "mb_per_s": nbytes / 1024 / 1024 / seconds if seconds else 0.0,
+            "peak_mb": peaks[stage]["peak"] / 1024 / 1024,
+        }
+    return report
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    """Get the stages slower or using more memory than in a baseline report.
+
+    Returns:
+        list: The (pipeline, stage, description) of each regression.
+    """
+    found = []
+    for name, stages in report.items():
+        for stage, result in stages.items():
+            before = baseline.get(name, {}).get(stage)
+            if before is None:
+                continue
+            if result["seconds"] > before["seconds"] * (1 + tolerance):
+                found.append(
+                    (
+                        name,
+                        stage,
+                        f"{before['seconds']:.3f}s -> {result['seconds']:.3f}s",
+                    )
+                )
+            if result["peak_mb"] > before["peak_mb"] * (1 + tolerance) + 1:
+                found.append(
+                    (
+                        name,
+                        stage,
+                        f"{before['peak_mb']:.1f} MB -> {result['peak_mb']:.1f} MB",
+                    )
+                )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pipelines", nargs="+", help="defaults to all of them")
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="compare with this JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--allow-remote",
+        action="store_true",
+        help="run even if the host setting is not a local database",
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    if os.getenv("host") not in LOCAL_HOSTS and not args.allow_remote:
+        parser.error(
+            f"host={os.getenv('host')} is not a local database, the pipelines "
+            "would replace its rows (use --allow-remote to run anyway)"
+        )
+
+    with tempfile.TemporaryDirectory(prefix="blob_container_") as container_dir:
+        configure(container_dir)
+        from src.pipelines import PIPELINES
+        from src.utilsDB import close_pool
+
+        report = {}
+        print(
+            f"{'Pipeline':<32} {'Stage':<9} {'Rows':>8} {'Median (s)':>11} "
+            f"{'Rows/s':>10} {'MB/s':>7} {'Peak MB':>8}"
+        )
+        try:
+            prepare_database()
+            for name in args.pipelines or list(PIPELINES):
+                report[name] = benchmark(name, args.scale, args.repeat, container_dir)
+                for stage, result in report[name].items():
+                    print(
+                        f"{name:<32} {stage:<9} {result['rows']:>8} "
+                        f"{result['seconds']:>11.3f} {result['rows_per_s']:>10.0f} "
+                        f"{result['mb_per_s']:>7.1f} {result['peak_mb']:>8.1f}"
+                    )
+        finally:
+            close_pool()
+
+    if args.save:
+        with open(args.save, "w", encoding="UTF-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="UTF-8") as file:
+            baseline = json.load(file)
+        found = regressions(report, baseline, args.tolerance)
+        for name, stage, description in found:
+            print(f"Regression of {name} {stage}: {description}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Measure the cold start of each page of the Streamlit app.
+
+Each page is imported in a fresh interpreter, as by a new Streamlit worker,
+with python -X importtime. Streamlit is imported before the page is timed,
+since the Streamlit server has already imported it when it runs a page. The
+median import time of each page is reported with the heavy packages it loaded
+and its slowest imports.
+
+Example:
+    python -m benchmarks.startup --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules imported to show each page
+PAGES = {
+    "SPTGD": ["main_file_upload"],
+    "Chargements": ["main_file_upload", "view.uploads"],
+}
+
+# Packages that only the pages using them should load
+HEAVY_PACKAGES = [
+    "pandas",
+    "numpy",
+    "sqlalchemy",
+    "azure.storage.blob",
+    "openpyxl",
+    "pyarrow",
+]
+
+MARKER = "-- page imports --"
+
+CHILD = f"""
+import json, sys, time
+import streamlit
+sys.stderr.write({MARKER!r} + "\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+seconds = time.perf_counter() - start
+heavy = [package for package in {HEAVY_PACKAGES!r} if package in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> list:
+    """Get the imports done by the page modules from the -X importtime output.
+
+    Returns:
+        list: The (module, cumulative seconds) of each import done by the
+            modules of the page themselves, not by the modules they import.
+    """
+    imports = []
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1 :]
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # The name is indented by two spaces by import level, 0 being the page
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if not cumulative.strip().isdigit() or level != 1:
+            continue
+        imports.append((name.strip(), int(cumulative) / 1e6))
+    return imports
+
+
+def import_page(modules: list) -> dict:
+    """Import the modules of a page in a fresh interpreter.
+
+    Returns:
+        dict: The import "seconds", the "heavy" packages loaded and the
+            "imports" of its modules with their cumulative seconds.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")]))
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, *modules],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Could not import {modules}:\n{process.stderr[-2000:]}")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(process.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", nargs="+", help="defaults to all of them")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports shown")
+    args = parser.parse_args()
+
+    runs = {}
+    for page in args.pages or list(PAGES):
+        runs[page] = [import_page(PAGES[page]) for _ in range(args.repeat)]
+
+    print(f"{'Page':<12} {'Median (s)':>11} {'Min (s)':>8} Heavy packages")
+    for page, results in runs.items():
+        seconds = [result["seconds"] for result in results]
+        print(
+            f"{page:<12} {statistics.median(seconds):>11.3f} {min(seconds):>8.3f} "
+            f"{', '.join(results[-1]['heavy']) or '-'}"
+        )
+    for page, results in runs.items():
+        print(f"\nSlowest imports of {page}:")
+        imports = sorted(results[-1]["imports"], key=lambda item: -item[1])
+        for module, seconds in imports[: args.top]:
+            print(f"  {module:<40} {seconds:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
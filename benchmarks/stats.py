@@ -0,0 +1,91 @@
+"""Compare utils_folder.stats with the former pure-Python correlation and R².
+
+The defect counts and injected volumes of many equipments over a number of
+days are correlated pair by pair with the former functions, and all at once
+with the vectorized ones.
+
+Example:
+    python -m benchmarks.stats --series 200 --days 365
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from utils_folder import stats
+
+
+def former_corr_score(x, y):
+    mX = sum(x) / len(x)
+    mY = sum(y) / len(y)
+    cov = sum((a - mX) * (b - mY) for (a, b) in zip(x, y)) / len(x)
+    stdevX = (sum((a - mX) ** 2 for a in x) / len(x)) ** 0.5
+    stdevY = (sum((b - mY) ** 2 for b in y) / len(y)) ** 0.5
+    return round(cov / (stdevX * stdevY), 3)
+
+
+def former_R2_score(y, y_pred):
+    mean_y = np.mean(y)
+    ss_t = 0
+    ss_r = 0
+    for i in range(len(y)):
+        ss_t += (y[i] - mean_y) ** 2
+        ss_r += (y_pred[i] - y[i]) ** 2
+    return 1 - (ss_r / ss_t)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--series", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    injected = rng.integers(1000, 50000, size=(args.days, args.series)).astype(float)
+    defects = np.round(injected * rng.uniform(0.001, 0.01, size=args.series))
+    defects += rng.poisson(5, size=defects.shape)
+
+    former_corr, corr_before = timed(
+        lambda: [
+            former_corr_score(list(defects[:, i]), list(injected[:, i]))
+            for i in range(args.series)
+        ]
+    )
+    vectorized_corr, matrix = timed(stats.corr_matrix, np.hstack([defects, injected]))
+    corr_after = np.round(np.diag(matrix[: args.series, args.series :]), 3)
+
+    predicted = injected * np.polyfit(injected.ravel(), defects.ravel(), 1)[0]
+    former_r2, r2_before = timed(
+        lambda: [
+            former_R2_score(defects[:, i], predicted[:, i]) for i in range(args.series)
+        ]
+    )
+    vectorized_r2, r2_after = timed(stats.r2_scores, defects, predicted)
+
+    print(f"{args.series} series of {args.days} days")
+    print(f"{'':<20} {'Former (s)':>11} {'Vectorized (s)':>15} {'Speedup':>8} Same")
+    print(
+        f"{'Pearson':<20} {former_corr:>11.3f} {vectorized_corr:>15.3f}"
+        f" {former_corr / vectorized_corr:>7.1f}x"
+        f" {np.allclose(corr_before, corr_after, atol=1e-3)}"
+    )
+    print(
+        f"{'R²':<20} {former_r2:>11.3f} {vectorized_r2:>15.3f}"
+        f" {former_r2 / vectorized_r2:>7.1f}x {np.allclose(r2_before, r2_after)}"
+    )
+    print(
+        f"The vectorized Pearson also computed the {2 * args.series}x"
+        f"{2 * args.series} matrix of all the pairs"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""Synthetic daily extraction workbooks, laid out like the real exports.
+
+Each generator returns the bytes of an .xlsx file that the matching
+src.utilsExcel reader or src.pipelines pipeline can parse, with a size
+controlled by its arguments.
+"""
+
+import datetime
+import io
+import random
+from functools import partial
+
+import pandas as pd
+
+# Messages of the events, with the Bourrage and Erreur IOB messages of OPB and
+# the messages of each type of utils_folder.utils.EVT_TYPE_PATTERNS
+EVTS_MESSAGES = [
+    "Bourrage convoyeur {}",
+    "Erreur IOB module {}",
+    "Arrêt d'urgence zone {}",
+    "Défaut variateur {}",
+    "Saturation sortie {}",
+    "Défaut Item-On-Cover plateau {} IOC{}",
+    "Défaut de déchargement plateau {} ilot {} sortie {}",
+    "Défaut de déclenchement plateau {} ilot {} sortie {}",
+    "Défaut plateau {} non aligné NAT{}",
+    "Défaut plateau {} manquant détecté sur cellule MTS{}",
+    "Défaut plateau {} basculé sur TTS{}",
+    "Défaut de bourrage injecteur {} cellule C{}",
+    "Défaut disparition sur la bande injecteur {}",
+    "Défaut apparition sur la bande injecteur {}",
+    "Défaut apparition sur plateau {} SPS {}",
+]
+
+
+def to_xlsx(rows: list) -> bytes:
+    """Write rows of cells to the first sheet of an .xlsx file.
+
+    Args:
+        rows (list): The rows, lists of cell values.
+
+    Returns:
+        bytes: The content of the .xlsx file.
+    """
+    buffer = io.BytesIO()
+    pd.DataFrame(rows).to_excel(buffer, index=False, header=False, engine="openpyxl")
+    return buffer.getvalue()
+
+
+def format_duration(seconds: int) -> str:
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+
+
+def evts_defauts_workbook(
+    date: datetime.date, n_events: int = 20000, seed: int = 0
+) -> bytes:
+    """Evenementsetdefauts.xlsx: 5 title rows, then one row per event start or end."""
+    rng = random.Random(seed)
+    rows = [["Evènements et défauts", None, None, None, None, None, None]]
+    rows += [[None] * 7 for _ in range(3)]
+    rows += [
+        [f"Du {date:%d/%m/%Y} au {date:%d/%m/%Y}", None, None, None, None, None, None]
+    ]
+    rows.append(
+        [
+            "N°",
+            "Date heure de début",
+            "Site",
+            "Zone",
+            "Date heure de fin",
+            "Machine",
+            "Message",
+        ]
+    )
+    start = datetime.datetime.combine(date, datetime.time(5))
+    for i in range(n_events):
+        begin = start + datetime.timedelta(seconds=rng.randrange(16 * 3600))
+        end = begin + datetime.timedelta(seconds=rng.randrange(5, 900))
+        message = rng.choice(EVTS_MESSAGES)
+        message = message.format(
+            *(rng.randrange(1, 40) for _ in range(message.count("{}")))
+        )
+        if i % 2:
+            message = f"Fin : {message}"
+        rows.append(
+            [
+                i,
+                begin.strftime("%d/%m/%Y %H:%M:%S"),
+                "LTH",
+                f"Zone {rng.randrange(1, 9)}",
+                end.strftime("%d/%m/%Y %H:%M:%S"),
+                f"Machine {rng.randrange(1, 25)}",
+                message,
+            ]
+        )
+    return to_xlsx(rows)
+
+
+def injections_workbook(
+    date: datetime.date, n_antennes: int = 120, seed: int = 0, trieur: str = "haut"
+) -> bytes:
+    """Injectiondescolisauxantennes_trieur_*.xlsx: one row per antenne and a Total row."""
+    rng = random.Random(seed)
+    header = [
+        "Trieur",
+        "Antenne",
+        "Colis codés",
+        "Colis poussés",
+        "Flashage pistolet",
+        "Colis inadmis",
+        "Rejets\nnon lu",
+        "Pourcentage\nRejets non lu",
+        "Multilabels",
+        "Pourcentage Multilabel",
+        "Total injecté",
+        "Temps d'utilisation",
+        "Cadence en fonctionnement",
+    ]
+    rows = [header]
+    total = 0
+    for antenne in range(1, n_antennes + 1):
+        injected = rng.randrange(500, 5000)
+        total += injected
+        rejects = rng.randrange(0, 50)
+        multilabels = rng.randrange(0, 20)
+        rows.append(
+            [
+                f"Trieur {trieur}",
+                f"Antenne {antenne}",
+                injected - rejects,
+                rng.randrange(0, 100),
+                rng.randrange(0, 30),
+                rng.randrange(0, 10),
+                rejects,
+                round(rejects / injected * 100, 2),
+                multilabels,
+                round(multilabels / injected * 100, 2),
+                injected,
+                format_duration(rng.randrange(3600, 16 * 3600)),
+                rng.randrange(500, 1500),
+            ]
+        )
+    rows.append(["Total", None] + [None] * 8 + [total, None, None])
+    return to_xlsx(rows)
+
+
+def qualite_tri_workbook(
+    date: datetime.date, n_details: int = 400, seed: int = 0
+) -> bytes:
+    """Qualité_de_tri.xlsx: 3 title rows, then tri details with merged-like group cells."""
+    rng = random.Random(seed)
+    rows = [["Qualité de tri", None, None, None, None, None, None]]
+    rows += [[f"{date:%d/%m/%Y}", None, None, None, None, None, None], [None] * 7]
+    rows.append(
+        [
+            "Trieur",
+            "Tri/contrôle ou rejet",
+            "Type de tri/contrôle/rejet",
+            "Détail de tri/rejet",
+            "Nb total colis",
+            "Nb de colis en bac",
+            "En pourcentage",
+        ]
+    )
+    for i in range(n_details):
+        first_of_trieur = i % (n_details // 2) == 0
+        first_of_type = i % 10 == 0
+        total = rng.randrange(1000, 100000)
+        in_bac = rng.randrange(0, total)
+        rows.append(
+            [
+                (
+                    ("Trieur haut" if i < n_details // 2 else "Trieur bas")
+                    if first_of_trieur
+                    else None
+                ),
+                rng.choice(["Tri", "Rejet"]) if first_of_type else None,
+                f"Type {i // 10}" if first_of_type else None,
+                f"Détail {i}",
+                total,
+                in_bac,
+                round(in_bac / total * 100, 2),
+            ]
+        )
+    return to_xlsx(rows)
+
+
+def temps_fonctionnement_workbook(
+    date: datetime.date, n_systemes: int = 40, seed: int = 0
+) -> bytes:
+    """Temps_de_fonctionnement_et_arrêts_machine.xlsx: 3 title rows, systèmes, Total, footer."""
+    rng = random.Random(seed)
+    rows = [["Temps de fonctionnement et arrêts machine", None]]
+    rows += [
+        [f"{date:%d/%m/%Y}", None],
+        [None, None],
+        ["Système", "Temps de fonctionnement"],
+    ]
+    for systeme in range(1, n_systemes + 1):
+        rows.append(
+            [f"Système {systeme}", format_duration(rng.randrange(0, 20 * 3600))]
+        )
+    rows.append(["Total", format_duration(rng.randrange(20 * 3600, 40 * 3600))])
+    rows += [[None, None], ["Arrêts machine", None]]
+    return to_xlsx(rows)
+
+
+def trafic_sortie_workbook(
+    date: datetime.date, n_sorties: int = 300, seed: int = 0, trieur: str = None
+) -> bytes:
+    """Trafic_par_sortie_trieur_*.xlsx: 6 title rows, then one row per trieur and sortie.
+
+    The rows are of the given trieur, of a random one for each row when None.
+    """
+    rng = random.Random(seed)
+    header = [
+        "Trieur",
+        "Sortie",
+        "Nb total de colis",
+        "Nb de colis en bac",
+        "Type de sortie",
+        "Rejet Saturation/CP Absent/Mal positionné",
+        "Rejet sortie inhibée/fermée",
+        "Nb Saturation",
+        "Tps Saturation",
+        "Nb Bourrage",
+        "Tps Bourrage",
+    ]
+    rows = [["Trafic par sortie"] + [None] * 10]
+    rows += [[None] * 11 for _ in range(4)]
+    rows += [[f"{date:%d/%m/%Y}"] + [None] * 10, header]
+    for sortie in range(1, n_sorties + 1):
+        total = rng.randrange(0, 3000)
+        rows.append(
+            [
+                f"Trieur {trieur or rng.choice(['haut', 'bas'])}",
+                f"Sortie {sortie}",
+                total,
+                rng.randrange(0, total + 1),
+                rng.choice(["Normale", "Rejet"]),
+                rng.randrange(0, 20),
+                rng.randrange(0, 20),
+                rng.randrange(0, 10),
+                format_duration(rng.randrange(0, 3600)),
+                rng.randrange(0, 10),
+                format_duration(rng.randrange(0, 3600)),
+            ]
+        )
+    return to_xlsx(rows)
+
+
+def interventions_workbook(
+    date: datetime.date, n_interventions: int = 5000, seed: int = 0
+) -> bytes:
+    """Interventions extract: one row per intervention, with its dates and planned load."""
+    rng = random.Random(seed)
+    rows = [
+        [
+            "Code de l'intervention",
+            "Libellé de l'intervention",
+            "Équipement",
+            "Type d'intervention",
+            "Statut",
+            "Date initiale de début",
+            "Date/heure de début de l'intervention",
+            "Date/heure de fin de l'intervention",
+            "Date de dernière modification",
+            "Charge prévue",
+        ]
+    ]
+    end = datetime.datetime.combine(date, datetime.time(22))
+    for i in range(n_interventions):
+        begin = end - datetime.timedelta(minutes=rng.randrange(365 * 24 * 60))
+        finish = begin + datetime.timedelta(minutes=rng.randrange(15, 8 * 60))
+        rows.append(
+            [
+                f"INT{i:07d}",
+                f"Intervention {rng.choice(['préventive', 'corrective'])} {i}",
+                f"Équipement {rng.randrange(1, 500)}",
+                rng.choice(["Préventif", "Correctif", "Amélioratif"]),
+                rng.choice(["Terminée", "En cours", "Planifiée"]),
+                begin.strftime("%d/%m/%Y %H:%M"),
+                begin.strftime("%d/%m/%Y %H:%M"),
+                finish.strftime("%d/%m/%Y %H:%M"),
+                finish.strftime("%d/%m/%Y %H:%M"),
+                format_duration(rng.randrange(15, 8 * 60) * 60),
+            ]
+        )
+    return to_xlsx(rows)
+
+
+def mvt_stock_workbook(
+    date: datetime.date, n_mouvements: int = 50000, seed: int = 0
+) -> bytes:
+    """Mouvements de stock extract: one row per movement of an article in a magasin."""
+    rng = random.Random(seed)
+    rows = [
+        [
+            "Date et heure du mouvement de stock",
+            "Date et heure de valorisation stock",
+            "Article",
+            "Libellé article",
+            "Type de mouvement",
+            "Quantité du mouvement",
+            "Magasin de stockage",
+        ]
+    ]
+    end = datetime.datetime.combine(date, datetime.time(22))
+    for _ in range(n_mouvements):
+        moment = end - datetime.timedelta(seconds=rng.randrange(90 * 24 * 3600))
+        article = rng.randrange(1, 5000)
+        rows.append(
+            [
+                moment.strftime("%d/%m/%Y %H:%M:%S"),
+                (moment + datetime.timedelta(minutes=5)).strftime("%d/%m/%Y %H:%M:%S"),
+                f"ART{article:06d}",
+                f"Article {article}",
+                rng.choice(["Entrée", "Sortie", "Transfert"]),
+                rng.choice([-1, 1]) * rng.randrange(1, 50),
+                f"MAG{rng.randrange(1, 6)}",
+            ]
+        )
+    return to_xlsx(rows)
+
+
+def inventaire_workbook(
+    date: datetime.date, n_articles: int = 20000, seed: int = 0
+) -> bytes:
+    """Inventaire extract: the stock of each article in each magasin."""
+    rng = random.Random(seed)
+    rows = [
+        [
+            "Article",
+            "Libellé article",
+            "Magasin de stockage",
+            "Quantité en stock",
+            "Valeur du stock",
+        ]
+    ]
+    for article in range(n_articles):
+        quantity = rng.randrange(0, 200)
+        rows.append(
+            [
+                f"ART{article // 4:06d}",
+                f"Article {article // 4}",
+                f"MAG{article % 4 + 1}",
+                quantity,
+                round(quantity * rng.uniform(0.5, 500), 2),
+            ]
+        )
+    return to_xlsx(rows)
+
+
+# Generator and default size of each daily extraction file, and of the extracts
+# uploaded as is (interventions, movements of stock and inventaire)
+WORKBOOKS = {
+    "Evenementsetdefauts.xlsx": (evts_defauts_workbook, 20000),
+    **{
+        f"Injectiondescolisauxantennes_trieur_{trieur}.xlsx": (
+            partial(injections_workbook, trieur=trieur),
+            120,
+        )
+        for trieur in ["haut", "bas"]
+    },
+    "Qualité_de_tri.xlsx": (qualite_tri_workbook, 400),
+    "Temps_de_fonctionnement_et_arrêts_machine.xlsx": (
+        temps_fonctionnement_workbook,
+        40,
+    ),
+    **{
+        f"Trafic_par_sortie_trieur_{trieur}.xlsx": (
+            partial(trafic_sortie_workbook, trieur=trieur),
+            300,
+        )
+        for trieur in ["haut", "bas"]
+    },
+    "Interventions.xlsx": (interventions_workbook, 5000),
+    "Mouvements_de_stock.xlsx": (mvt_stock_workbook, 50000),
+    "Inventaire.xlsx": (inventaire_workbook, 20000),
+}
+
+
+def generate_workbook(
+    file_name: str, date: datetime.date, scale: float = 1.0, seed: int = 0
+) -> bytes:
+    """Generate the synthetic workbook of a daily extraction file.
+
+    Args:
+        file_name (str): The extraction file name, a key of WORKBOOKS.
+        date (datetime.date): The date of the extraction.
+        scale (float, optional): The size relative to a typical day. Defaults to 1.0.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        bytes: The content of the .xlsx file.
+    """
+    generator, size = WORKBOOKS[file_name]
+    return generator(date, max(1, int(size * scale)), seed)
@@ -0,0 +1,37 @@
+"""Create or refresh the coverage schema of the ingestion status.
+
+Gives Dates_data its unique (Site, Data_type, Date) key, after removing the
+duplicates it accumulated, and its indexes, and precomputes the Jours_ouvrables
+calendar until the end of next year. The upload pages work without it, but
+Dates_data is then not deduplicated and the calendar is generated on every
+status query. Run it once, then again every year to extend the calendar.
+
+Example:
+    python migrate_coverage.py --schema public
+"""
+
+import argparse
+import logging
+import sys
+
+from src.utilsDB import close_pool, pooled_connection
+from src.utilsStatus import ensure_coverage_schema
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--schema", default="public")
+    args = parser.parse_args()
+
+    try:
+        with pooled_connection() as (connection, _):
+            ensure_coverage_schema(connection, args.schema)
+    finally:
+        close_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+from src.utilsDB import ensure_key_index, replace_keyed_batches
+from src.utilsExcel import (
+    EXTRACTION_READERS,
+    injections_antennes,
+    read_excel_batches,
+    read_extraction,
+    times_to_seconds,
+)
+from src.utilsMetrics import bind_ingestion_run, ingestion_run, record_stage
+from src.utilsStatus import add_date_data
+
+# Batches read ahead of the database writes by each pipeline
+PIPELINE_PREFETCH = int(os.getenv("pipeline_prefetch", 2))
+
+# Stages timed by run_pipeline, "wait" being the time the writes waited for rows
+PIPELINE_STAGES = ["fetch", "read", "transform", "write", "wait", "coverage"]
+
+# Columns identifying the rows of each table that a new file replaces.
+TABLE_KEYS = {
+    "LTH_Evt_defauts": ["Date"],
+    "LTH_Injections_Antennes": ["Date", "Antenne"],
+    "LTH_Trafic_par_sortie": ["Date", "Trieur", "Sortie"],
+    "LTH_Qualite_de_tri": [
+        "Date",
+        "Trieur",
+        "Tri/contrôle ou rejet",
+        "Type de tri/contrôle/rejet",
+        "Détail de tri/rejet",
+    ],
+    "LTH_Tmps_fonctionnement": ["Date", "Système"],
+    "Interventions_LTH": ["Code de l'intervention"],
+    "OPB_LTH": ["Date"],
+    "OPB_Bourrage_LTH": ["Date", "Type"],
+    "LTH_MVT_Stock": [
+        "Date et heure du mouvement de stock",
+        "Article",
+        "Quantité du mouvement",
+        "Magasin de stockage",
+    ],
+    "LTH_Inventaire": ["Article", "Magasin de stockage"],
+}
+
+TRAFIC_SORTIE_COLUMNS = [
+    "Trieur",
+    "Sortie",
+    "Nb total de colis",
+    "Nb de colis en bac",
+    "Type de sortie",
+    "Rejet Saturation/CP Absent/Mal positionné",
+    "Rejet sortie inhibée/fermée",
+    "Nb Saturation",
+    "Tps Saturation",
+    "Nb Bourrage",
+    "Tps Bourrage",
+    "Date",
+]
+
+
+def read_batches(excel_file, date):
+    """Read an uploaded extract in batches when it is large, see read_excel_batches."""
+    return read_excel_batches(excel_file)
+
+
+def prepare_interventions(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the dates and planned durations of rows of the interventions file.
+
+    Args:
+        df (pd.DataFrame): Rows of the interventions file.
+
+    Returns:
+        pd.DataFrame: The rows, with the planned durations in seconds.
+    """
+    for date_col in [
+        "Date/heure de fin de l'intervention",
+        "Date initiale de début",
+        "Date/heure de début de l'intervention",
+        "Date de dernière modification",
+    ]:
+        df[date_col] = pd.to_datetime(df[date_col], dayfirst=True)
+    df["Charge prévue"] = times_to_seconds(df["Charge prévue"])
+    return df
+
+
+def prepare_mvt_stock(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the dates of rows of the movements of stock file.
+
+    Args:
+        df (pd.DataFrame): Rows of the movements of stock file.
+
+    Returns:
+        pd.DataFrame: The rows.
+    """
+    date_columns = [
+        "Date et heure du mouvement de stock",
+        "Date et heure de valorisation stock",
+    ]
+    for col in date_columns:
+        df[col] = pd.to_datetime(df[col], dayfirst=True)
+    return df
+
+
+def select_trieur(df: pd.DataFrame, trieur: str) -> pd.DataFrame:
+    """Keep the rows of a trieur (haut or bas)."""
+    return df.loc[df.Trieur == f"Trieur {trieur}"]
+
+
+# Ingestion pipeline of each data type:
+# - files: the daily extraction files read from Azure Blob Storage, see
+#   extraction_blob_name
+# - reader: reads an uploaded Excel file and its date into a DataFrame or an
+#   iterable of DataFrames, defaults to the reader of the first file
+# - transforms: functions applied in turn to each DataFrame
+# - columns: the columns written, those missing from the file being skipped
+# - table, key: the target table and its natural key, defaults to TABLE_KEYS
+# - keep_last: whether only the last new row of each key is written
+# - index: whether the key is indexed before writing, for large tables
+# - coverage: the Dates_data type recorded when rows are written
+PIPELINES = {
+    "Evt_defauts": {
+        "files": ["Evenementsetdefauts.xlsx"],
+        "table": "LTH_Evt_defauts",
+    },
+    "Injections_antennes": {
+        "files": [
+            "Injectiondescolisauxantennes_trieur_haut.xlsx",
+            "Injectiondescolisauxantennes_trieur_bas.xlsx",
+        ],
+        "transforms": [injections_antennes],
+        "table": "LTH_Injections_Antennes",
+    },
+    "Trafic_par_sortie": {
+        "files": [
+            "Trafic_par_sortie_trieur_haut.xlsx",
+            "Trafic_par_sortie_trieur_bas.xlsx",
+        ],
+        "table": "LTH_Trafic_par_sortie",
+        "coverage": "Trafic_par_sortie",
+    },
+    **{
+        f"Trafic_par_sortie_trieur_{trieur}": {
+            "files": [f"Trafic_par_sortie_trieur_{trieur}.xlsx"],
+            "transforms": [partial(select_trieur, trieur=trieur)],
+            "columns": TRAFIC_SORTIE_COLUMNS,
+            "table": "LTH_Trafic_par_sortie",
+            "coverage": f"Trafic_par_sortie_trieur_{trieur}",
+        }
+        for trieur in ["haut", "bas"]
+    },
+    "Qualité_de_tri": {
+        "files": ["Qualité_de_tri.xlsx"],
+        "table": "LTH_Qualite_de_tri",
+        "coverage": "Qualité_de_tri",
+    },
+    "Temps_fonctionnement": {
+        "files": ["Temps_de_fonctionnement_et_arrêts_machine.xlsx"],
+        "table": "LTH_Tmps_fonctionnement",
+        "coverage": "Temps_fonctionnement",
+    },
+    "Interventions": {
+        "files": [],
+        "reader": read_batches,
+        "transforms": [prepare_interventions],
+        "table": "Interventions_LTH",
+        "coverage": "Interventions",
+    },
+    "Mvt_stock": {
+        "files": [],
+        "reader": read_batches,
+        "transforms": [prepare_mvt_stock],
+        "table": "LTH_MVT_Stock",
+        # Like the previous full-table dedup of the duplicated movements
+        "keep_last": True,
+        "index": True,
+        "coverage": "Mvt_stock",
+    },
+    "Etat_stock": {
+        "files": [],
+        "reader": read_batches,
+        "table": "LTH_Inventaire",
+        "keep_last": True,
+        "index": True,
+        "coverage": "Etat_stock",
+    },
+}
+
+
+def fetch_extractions(date, files: list) -> dict:
+    """Read daily extraction files in parallel, see read_extraction.
+
+    Args:
+        date (datetime.date): The date of the extractions.
+        files (list): The extraction file names.
+
+    Returns:
+        dict: The parsed DataFrame of each file name, None when it is missing.
+    """
+    if len(files) <= 1:
+        return {file: read_extraction(date, file) for file in files}
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        frames = executor.map(bind_ingestion_run(partial(read_extraction, date)), files)
+        return dict(zip(files, frames))
+
+
+def _as_batches(result) -> list:
+    """Get the DataFrames returned by a reader, one DataFrame or an iterable."""
+    return [result] if isinstance(result, pd.DataFrame) else result
+
+
+_END = object()
+
+
+def _timed(iterable, timings: dict, stage: str):
+    """Iterate, adding the time spent getting each item to a stage."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        item = next(iterator, _END)
+        timings[stage] += time.perf_counter() - start
+        if item is _END:
+            return
+        yield item
+
+
+def _transformed(batches, spec: dict, timings: dict):
+    """Apply the transforms and the column selection of a pipeline to each batch."""
+    for df in batches:
+        start = time.perf_counter()
+        for transform in spec.get("transforms", []):
+            df = transform(df)
+        if "columns" in spec:
+            df = df[[column for column in spec["columns"] if column in df.columns]]
+        timings["transform"] += time.perf_counter() - start
+        yield df
+
+
+def _prefetched(batches, timings: dict, depth: int = PIPELINE_PREFETCH):
+    """Produce the batches in a background thread, up to depth batches ahead.
+
+    The next batches are read and transformed while the current one is written.
+    """
+    if depth <= 0:
+        yield from batches
+        return
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for batch in batches:
+                if not put(("batch", batch)):
+                    return
+            put(("done", None))
+        except Exception as e:
+            put(("error", e))
+
+    producer = threading.Thread(
+        target=bind_ingestion_run(produce), name="pipeline-prefetch", daemon=True
+    )
+    producer.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            kind, item = buffer.get()
+            timings["wait"] += time.perf_counter() - start
+            if kind == "done":
+                return
+            if kind == "error":
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # The producer ends within the run, so that its profile is part of it
+        producer.join()
+
+
+def run_pipeline(
+    name: str, date, connection, engine, frames: dict = None, sources: list = None
+) -> dict:
+    """Run the ingestion pipeline of a data type for a date.
+
+    The rows are fetched (the daily extraction files, read in parallel, unless
+    frames or sources are given), read and transformed batch by batch ahead of
+    the writes, written in one transaction replacing the rows sharing their key,
+    then the date is recorded in Dates_data. Each stage is timed and recorded in
+    the ingestion run of the data type and date, see ingestion_run.
+
+    Args:
+        name (str): The data type, a key of PIPELINES.
+        date (datetime.date): The date of the data.
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        frames (dict, optional): The already parsed DataFrame of each file name,
+            None for the missing files. Defaults to reading the daily files.
+        sources (list, optional): Uploaded Excel files, read with the reader of
+            the pipeline. Defaults to reading the daily files.
+
+    Returns:
+        dict: The number of "rows" written, the "frames" read by file name and
+            the "timings" of each stage in seconds.
+    """
+    with ingestion_run(name, date):
+        return _run_pipeline(name, date, connection, engine, frames, sources)
+
+
+def _run_pipeline(name: str, date, connection, engine, frames, sources) -> dict:
+    spec = PIPELINES[name]
+    table = spec["table"]
+    key = spec.get("key", TABLE_KEYS[table])
+    timings = dict.fromkeys(PIPELINE_STAGES, 0.0)
+
+    if sources is None:
+        if frames is None:
+            start = time.perf_counter()
+            frames = fetch_extractions(date, spec["files"])
+            timings["fetch"] = time.perf_counter() - start
+        frames = {file: df for file, df in frames.items() if df is not None}
+        batches = frames.values()
+    else:
+        frames = {}
+        reader = spec.get("reader") or EXTRACTION_READERS[spec["files"][0]]
+        batches = itertools.chain.from_iterable(
+            _as_batches(reader(source, date)) for source in sources
+        )
+
+    batches = _prefetched(
+        _transformed(_timed(batches, timings, "read"), spec, timings), timings
+    )
+    start = time.perf_counter()
+    if spec.get("index"):
+        ensure_key_index(connection, table, key)
+    rows = replace_keyed_batches(
+        connection, engine, batches, table, key, keep_last=spec.get("keep_last", False)
+    )
+    timings["write"] = time.perf_counter() - start - timings["wait"]
+
+    if rows:
+        start = time.perf_counter()
+        if spec.get("coverage"):
+            add_date_data(connection, engine, date=date, data_type=spec["coverage"])
+        timings["coverage"] = time.perf_counter() - start
+
+    for stage, seconds in timings.items():
+        record_stage(stage, seconds)
+    logging.info(
+        f"Pipeline {name} of {date}: {rows} rows, "
+        + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    )
+    return {"rows": rows, "frames": frames, "timings": timings}
@@ -1,34 +1,338 @@
+import hashlib
 import io
+import logging
 import os
-from azure.storage.blob import ContainerClient
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+    ResourceNotModifiedError,
+)
 from io import StringIO, BytesIO
 import pickle
 from dotenv import load_dotenv
 
+from src.utilsMetrics import bind_ingestion_run, timed_stage
+
 load_dotenv()
 container_url_with_sas = os.getenv("url")
 
-# Create ContainerClient using SAS URL
-container_client = ContainerClient.from_container_url(container_url_with_sas)
+# Local blob cache, keyed by blob name and ETag (0 disables it)
+BLOB_CACHE_DIR = os.getenv(
+    "blob_cache_dir", os.path.join(tempfile.gettempdir(), "insertion_blob_cache")
+)
+BLOB_CACHE_MAX_BYTES = int(os.getenv("blob_cache_max_mb", "512")) * 1024 * 1024
+BLOB_FETCH_WORKERS = int(os.getenv("blob_fetch_workers", "8"))
 
+_cache_lock = threading.Lock()
+_client_lock = threading.Lock()
+_container_client = None
 
-def get_Azure_file_csv(blob_name):
-    downloaded_blob = container_client.download_blob(blob_name)
 
-    return StringIO(downloaded_blob.content_as_text())
+class LocalContainerClient:
+    """Filesystem stand-in for an Azure ContainerClient.
 
+    Blobs are the files under a root directory and their ETag is derived from
+    the file modification time and size. Used when the "url" setting is a
+    file:// URL, e.g. to run the app or the backfill against a local copy.
+    """
 
-def get_Azure_file_bytes(blob_name):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, blob_name: str) -> str:
+        return os.path.join(self.root, *blob_name.split("/"))
+
+    def _etag(self, path: str) -> str:
+        stat = os.stat(path)
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    def download_blob(self, blob, etag=None, match_condition=None, **kwargs):
+        path = self._path(blob)
+        if not os.path.isfile(path):
+            raise ResourceNotFoundError(f"The specified blob does not exist: {blob}")
+        current_etag = self._etag(path)
+        if match_condition == MatchConditions.IfModified and etag == current_etag:
+            raise ResourceNotModifiedError(f"The blob was not modified: {blob}")
+        if match_condition == MatchConditions.IfNotModified and etag != current_etag:
+            raise ResourceModifiedError(f"The blob was modified: {blob}")
+        with open(path, "rb") as file:
+            content = file.read()
+        return SimpleNamespace(
+            properties=SimpleNamespace(name=blob, etag=current_etag, size=len(content)),
+            content_as_bytes=lambda: content,
+            content_as_text=lambda encoding="UTF-8": content.decode(encoding),
+            readall=lambda: content,
+        )
+
+    def get_blob_client(self, blob):
+        path = self._path(blob)
+
+        def get_blob_properties(**kwargs):
+            if not os.path.isfile(path):
+                raise ResourceNotFoundError(f"The specified blob does not exist: {blob}")
+            return SimpleNamespace(
+                name=blob, etag=self._etag(path), size=os.path.getsize(path)
+            )
+
+        return SimpleNamespace(get_blob_properties=get_blob_properties)
+
+    def upload_blob(self, name, data, overwrite=False, **kwargs):
+        path = self._path(name)
+        if os.path.exists(path) and not overwrite:
+            raise ResourceExistsError(f"The specified blob already exists: {name}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode("UTF-8")
+        with open(path, "wb") as file:
+            file.write(data)
+        return {"etag": self._etag(path)}
+
+
+def create_container_client(url: str):
+    """Create the container client of a container URL.
+
+    Args:
+        url (str): The container URL with its SAS token, or a file:// URL of a
+            local directory.
+
+    Returns:
+        ContainerClient | LocalContainerClient: The container client.
+    """
+    if url is not None and url.startswith("file://"):
+        return LocalContainerClient(url[len("file://") :])
+    from azure.storage.blob import ContainerClient
+
+    return ContainerClient.from_container_url(url)
+
+
+def get_container_client():
+    """Get the shared container client of the "url" setting, creating it on first use.
+
+    The Azure Storage SDK is only imported then, so that the pages which do not
+    use Azure Blob Storage do not load it.
+
+    Returns:
+        ContainerClient | LocalContainerClient: The shared container client.
+    """
+    global _container_client
+    if _container_client is None:
+        with _client_lock:
+            if _container_client is None:
+                # Create ContainerClient using SAS URL
+                _container_client = create_container_client(container_url_with_sas)
+    return _container_client
+
+
+def _cache_paths(blob_name: str):
+    key = hashlib.sha256(blob_name.encode("UTF-8")).hexdigest()
+    path = os.path.join(BLOB_CACHE_DIR, key)
+    return path + ".bin", path + ".etag"
+
+
+def _read_cache(blob_name: str):
+    """Get the cached ETag and content of a blob, (None, None) when not cached."""
+    data_path, etag_path = _cache_paths(blob_name)
+    try:
+        with _cache_lock:
+            with open(etag_path, encoding="UTF-8") as file:
+                etag = file.read()
+            with open(data_path, "rb") as file:
+                content = file.read()
+    except OSError:
+        return None, None
+    return etag, content
+
+
+def _touch_cache(blob_name: str):
+    """Mark a cached blob as recently used."""
+    try:
+        os.utime(_cache_paths(blob_name)[0])
+    except OSError:
+        pass
+
+
+def _write_cache(blob_name: str, etag: str, content: bytes):
+    if BLOB_CACHE_MAX_BYTES <= 0 or etag is None or len(content) > BLOB_CACHE_MAX_BYTES:
+        return
+    data_path, etag_path = _cache_paths(blob_name)
+    # Write to temporary files first so readers never see a partial entry
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(BLOB_CACHE_DIR, exist_ok=True)
+        with open(data_path + suffix, "wb") as file:
+            file.write(content)
+        with open(etag_path + suffix, "w", encoding="UTF-8") as file:
+            file.write(etag)
+        with _cache_lock:
+            os.replace(data_path + suffix, data_path)
+            os.replace(etag_path + suffix, etag_path)
+            _evict_cache()
+    except OSError as e:
+        # The cache is an optimization, a full disk must not fail the download
+        logging.warning(f"Could not cache {blob_name}: {e}")
+
+
+def _evict_cache():
+    """Remove the least recently used blobs until the cache fits its size limit."""
+    entries = []
+    for entry in os.scandir(BLOB_CACHE_DIR):
+        if entry.name.endswith(".bin"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= BLOB_CACHE_MAX_BYTES:
+            break
+        for cache_path in (path, path[: -len(".bin")] + ".etag"):
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+        total -= size
+
+
+def invalidate_cached_blob(blob_name: str):
+    """Remove a blob from the local cache.
+
+    Args:
+        blob_name (str): The blob name.
+    """
+    with _cache_lock:
+        for cache_path in _cache_paths(blob_name):
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+
+def clear_blob_cache():
+    """Remove all the blobs from the local cache."""
+    with _cache_lock:
+        if os.path.isdir(BLOB_CACHE_DIR):
+            for entry in os.scandir(BLOB_CACHE_DIR):
+                os.remove(entry.path)
+
+
+def fetch_blob(blob_name: str) -> bytes:
+    """Download a blob, served from the local cache when its ETag has not changed.
+
+    A cached blob is revalidated with a conditional download, so an unchanged
+    blob costs one round trip without any content transfer.
+
+    Args:
+        blob_name (str): The blob name.
+
+    Returns:
+        bytes: The content of the blob.
+
+    Raises:
+        ResourceNotFoundError: If the blob does not exist.
+    """
+    etag, content = (None, None)
+    if BLOB_CACHE_MAX_BYTES > 0:
+        etag, content = _read_cache(blob_name)
+    # Only the content actually transferred is counted, not the cache hits
+    with timed_stage("download") as counts:
+        if etag is not None:
+            try:
+                downloaded_blob = get_container_client().download_blob(
+                    blob_name, etag=etag, match_condition=MatchConditions.IfModified
+                )
+            except ResourceNotModifiedError:
+                _touch_cache(blob_name)
+                return content
+            except ResourceNotFoundError:
+                invalidate_cached_blob(blob_name)
+                raise
+        else:
+            downloaded_blob = get_container_client().download_blob(blob_name)
+
+        content = downloaded_blob.content_as_bytes()
+        counts["bytes"] = len(content)
+    _write_cache(blob_name, downloaded_blob.properties.etag, content)
+    return content
+
+
+def get_blob_etag(blob_name: str):
+    """Get the current ETag of a blob without downloading it.
+
+    Args:
+        blob_name (str): The blob name.
+
+    Returns:
+        str | None: The ETag, None if the blob does not exist.
+    """
     try:
-        downloaded_blob = container_client.download_blob(blob_name)
+        blob_client = get_container_client().get_blob_client(blob_name)
+        return blob_client.get_blob_properties().etag
+    except ResourceNotFoundError:
+        return None
 
-        return BytesIO(downloaded_blob.content_as_bytes())
-    except:
+
+def get_Azure_file_csv(blob_name):
+    return StringIO(fetch_blob(blob_name).decode("UTF-8"))
+
+
+def get_Azure_file_bytes(blob_name):
+    """Download a blob, see fetch_blob.
+
+    Args:
+        blob_name (str): The blob name.
+
+    Returns:
+        BytesIO | None: The content of the blob, None if it does not exist.
+            Any other error (authentication, network...) is raised.
+    """
+    try:
+        return BytesIO(fetch_blob(blob_name))
+    except ResourceNotFoundError:
         return None
 
 
-def upload_Azure_file_bytes(blob_name, data, overwrite):
-    return container_client.upload_blob(name=blob_name, data=data, overwrite=overwrite)
+def get_many(blob_names, max_workers: int = BLOB_FETCH_WORKERS) -> dict:
+    """Download several blobs concurrently.
+
+    Args:
+        blob_names (list): The blob names.
+        max_workers (int, optional): The number of download threads. Defaults to
+            BLOB_FETCH_WORKERS.
+
+    Returns:
+        dict: The content of each blob as a BytesIO, None when it does not exist.
+    """
+    blob_names = list(dict.fromkeys(blob_names))
+    if len(blob_names) <= 1:
+        return {blob_name: get_Azure_file_bytes(blob_name) for blob_name in blob_names}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(blob_names))) as executor:
+        download = bind_ingestion_run(get_Azure_file_bytes)
+        return dict(zip(blob_names, executor.map(download, blob_names)))
+
+
+def upload_Azure_file_bytes(blob_name, data, overwrite, metadata=None):
+    if hasattr(data, "read"):
+        data = data.read()
+    with timed_stage("upload", nbytes=len(data)):
+        result = get_container_client().upload_blob(
+            name=blob_name, data=data, overwrite=overwrite, metadata=metadata
+        )
+    # Keep the cache in sync so the next read of this blob is a cache hit
+    etag = result.get("etag") if isinstance(result, dict) else None
+    if etag is None and hasattr(result, "get_blob_properties"):
+        etag = result.get_blob_properties().etag
+    if isinstance(data, str):
+        data = data.encode("UTF-8")
+    invalidate_cached_blob(blob_name)
+    _write_cache(blob_name, etag, bytes(data))
+    return etag
 
 
 def upload_Azure_file(data, file_path: str, overwrite=True):
@@ -46,7 +350,29 @@ def upload_Azure_file(data, file_path: str, overwrite=True):
 
 def upload_Azure_blob(file_content, file_path: str, overwrite=True):
 
-    container_client.upload_blob(name=file_path, data=file_content, overwrite=overwrite)
+    upload_Azure_file_bytes(file_path, file_content, overwrite=overwrite)
+
+
+def upload_Azure_extraction(file_content, file_path: str, date, overwrite=True):
+    """Upload an extraction file as is, with its date as blob metadata.
+
+    Args:
+        file_content (bytes | UploadedFile): The content of the uploaded file.
+        file_path (str): The blob name, in the folder of the extraction date.
+        date (datetime.date): The date of the extraction.
+        overwrite (bool, optional): Whether to replace an existing blob. Defaults to True.
+
+    Returns:
+        str: The ETag of the uploaded blob.
+    """
+    if hasattr(file_content, "getvalue"):
+        file_content = file_content.getvalue()
+    return upload_Azure_file_bytes(
+        file_path,
+        file_content,
+        overwrite=overwrite,
+        metadata={"extraction_date": date.isoformat()},
+    )
 
 
 def rename_file_Azure(old_file_name, new_file_name):
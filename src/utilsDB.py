@@ -0,0 +1,579 @@
+from __future__ import annotations
+
+import io
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+import psycopg2
+from psycopg2 import errors, pool, sql
+from dotenv import load_dotenv
+
+# pandas, numpy and SQLAlchemy are imported on first use, so that the pages
+# only borrowing connections do not load them
+if TYPE_CHECKING:
+    import pandas as pd
+
+from src.utilsMetrics import save_pending_runs, timed_stage
+
+load_dotenv()
+
+# Sizing of the shared psycopg2 pool and of the SQLAlchemy engine pool.
+# Every Streamlit session of the process borrows from the same pools.
+POOL_MIN_SIZE = int(os.getenv("db_pool_min", 1))
+POOL_MAX_SIZE = int(os.getenv("db_pool_max", 10))
+ENGINE_POOL_SIZE = int(os.getenv("db_engine_pool_size", 5))
+ENGINE_MAX_OVERFLOW = int(os.getenv("db_engine_max_overflow", 5))
+ENGINE_POOL_RECYCLE = int(os.getenv("db_engine_pool_recycle", 1800))
+CHECKOUT_TIMEOUT = float(os.getenv("db_checkout_timeout", 30))
+# Table writes go through COPY FROM STDIN unless db_bulk_copy=0, in which case
+# the previous DataFrame.to_sql behaviour is used.
+BULK_LOAD_WITH_COPY = os.getenv("db_bulk_copy", "1") == "1"
+COPY_NULL = "\\N"
+
+_lock = threading.Lock()
+_pool = None
+_engine = None
+# Bounds the number of borrowed connections so that a saturated pool makes
+# callers wait instead of raising psycopg2.pool.PoolError.
+_slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+_stats = {
+    "checkouts": 0,
+    "in_use": 0,
+    "max_in_use": 0,
+    "waits": 0,
+    "timeouts": 0,
+    "reconnects": 0,
+    "total_wait_s": 0.0,
+    "max_wait_s": 0.0,
+}
+
+
+def _connection_params() -> dict:
+    return {
+        "host": os.getenv("host"),
+        "port": os.getenv("port"),
+        "dbname": os.getenv("dbname"),
+        "user": os.getenv("user"),
+        "password": os.getenv("password"),
+        "sslmode": os.getenv("sslmode"),
+    }
+
+
+def get_pool() -> pool.ThreadedConnectionPool:
+    """Get the process-wide psycopg2 connection pool, creating it on first use.
+
+    Returns:
+        psycopg2.pool.ThreadedConnectionPool: The shared connection pool.
+    """
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                logging.info(
+                    f"Creating PostgreSQL connection pool ({POOL_MIN_SIZE}-{POOL_MAX_SIZE})"
+                )
+                _pool = pool.ThreadedConnectionPool(
+                    POOL_MIN_SIZE, POOL_MAX_SIZE, **_connection_params()
+                )
+    return _pool
+
+
+def get_engine():
+    """Get the process-wide SQLAlchemy engine, creating it on first use.
+
+    Returns:
+        sqlalchemy.engine.base.Engine: The shared database engine.
+    """
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+
+                params = _connection_params()
+                connect_args = {}
+                if params["sslmode"]:
+                    connect_args["sslmode"] = params["sslmode"]
+                _engine = create_engine(
+                    f"postgresql+psycopg2://{params['user']}:{params['password']}@{params['host']}:{params['port']}/{params['dbname']}",
+                    pool_size=ENGINE_POOL_SIZE,
+                    max_overflow=ENGINE_MAX_OVERFLOW,
+                    pool_recycle=ENGINE_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                    connect_args=connect_args,
+                )
+    return _engine
+
+
+def _is_alive(connection) -> bool:
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout():
+    start = time.perf_counter()
+    if not _slots.acquire(blocking=False):
+        with _lock:
+            _stats["waits"] += 1
+        if not _slots.acquire(timeout=CHECKOUT_TIMEOUT):
+            with _lock:
+                _stats["timeouts"] += 1
+            raise pool.PoolError(
+                f"No database connection available after {CHECKOUT_TIMEOUT}s"
+            )
+    try:
+        connection_pool = get_pool()
+        connection = connection_pool.getconn()
+        # Pre-ping: connections dropped by the server (idle timeout, failover)
+        # are discarded and replaced before being handed out.
+        if not _is_alive(connection):
+            connection_pool.putconn(connection, close=True)
+            connection = connection_pool.getconn()
+            with _lock:
+                _stats["reconnects"] += 1
+    except Exception:
+        _slots.release()
+        raise
+
+    wait = time.perf_counter() - start
+    with _lock:
+        _stats["checkouts"] += 1
+        _stats["in_use"] += 1
+        _stats["max_in_use"] = max(_stats["max_in_use"], _stats["in_use"])
+        _stats["total_wait_s"] += wait
+        _stats["max_wait_s"] = max(_stats["max_wait_s"], wait)
+    return connection
+
+
+def _checkin(connection):
+    try:
+        get_pool().putconn(connection, close=bool(connection.closed))
+    finally:
+        with _lock:
+            _stats["in_use"] -= 1
+        _slots.release()
+
+
+# Number of pooled connections borrowed by the current thread
+_held = threading.local()
+
+
+def holds_pooled_connection() -> bool:
+    """Whether the current thread has borrowed a connection from the pool."""
+    return getattr(_held, "count", 0) > 0
+
+
+@contextmanager
+def pooled_connection(with_engine: bool = True):
+    """Borrow a connection from the shared pool together with the shared engine.
+
+    The connection is returned to the pool (and any open transaction rolled back)
+    when the block exits. Callers must not close the connection nor dispose the engine.
+    The ingestion runs ended in the block are stored once the thread has returned
+    all its connections, see save_pending_runs.
+
+    Args:
+        with_engine (bool, optional): Whether to also get the engine, which
+            imports SQLAlchemy on first use. Defaults to True.
+
+    Yields:
+        tuple: (psycopg2.extensions.connection, sqlalchemy.engine.base.Engine),
+            the engine being None without with_engine.
+    """
+    connection = _checkout()
+    _held.count = getattr(_held, "count", 0) + 1
+    try:
+        yield connection, get_engine() if with_engine else None
+    finally:
+        _checkin(connection)
+        _held.count -= 1
+        if _held.count == 0:
+            save_pending_runs()
+
+
+def get_pool_stats() -> dict:
+    """Get usage statistics of the shared connection pools.
+
+    Returns:
+        dict: Checkout counts, checkout latency and saturation of the psycopg2 pool,
+        and the status of the SQLAlchemy engine pool.
+    """
+    with _lock:
+        stats = dict(_stats)
+    stats["max_size"] = POOL_MAX_SIZE
+    stats["avg_wait_ms"] = (
+        1000 * stats["total_wait_s"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    )
+    stats["max_wait_ms"] = 1000 * stats.pop("max_wait_s")
+    stats.pop("total_wait_s")
+    stats["saturation"] = stats["in_use"] / POOL_MAX_SIZE
+    if _engine is not None:
+        engine_pool = _engine.pool
+        stats["engine_checked_out"] = engine_pool.checkedout()
+        stats["engine_overflow"] = engine_pool.overflow()
+        stats["engine_size"] = engine_pool.size()
+    return stats
+
+
+def close_pool():
+    """Close every pooled connection and dispose the shared engine."""
+    global _pool, _engine
+    with _lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def _prepare_copy_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the columns of a DataFrame to values PostgreSQL COPY accepts.
+
+    The conversions mirror the column types DataFrame.to_sql creates, so both
+    loaders can write into the same tables:
+    - timedelta columns are written as integer nanoseconds (BIGINT),
+    - float columns holding only whole numbers (integers with missing values)
+      are written without decimal part so they load into integer columns,
+    - datetime and date columns are written in ISO format.
+
+    Args:
+        df (pd.DataFrame): The data to load.
+
+    Returns:
+        pd.DataFrame: A copy of the data ready to be serialised as CSV.
+    """
+    import numpy as np
+    import pandas as pd
+
+    frame = df.copy()
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_timedelta64_dtype(series):
+            nanoseconds = pd.Series(
+                series.astype("timedelta64[ns]").to_numpy().astype("int64"),
+                index=series.index,
+            )
+            frame[column] = nanoseconds.astype("Int64").mask(series.isna())
+        elif pd.api.types.is_float_dtype(series):
+            values = series.dropna()
+            if (
+                len(values)
+                and np.isfinite(values).all()
+                and (values.abs() < 2**53).all()
+                and (values % 1 == 0).all()
+            ):
+                frame[column] = series.astype("Int64")
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            frame[column] = series.dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+        elif series.dtype == object:
+            frame[column] = series.map(
+                lambda x: x.isoformat() if hasattr(x, "isoformat") else x
+            )
+    return frame
+
+
+def _copy_into(connection, df: pd.DataFrame, target):
+    buffer = io.StringIO()
+    _prepare_copy_frame(df).to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    nbytes = buffer.tell()
+    buffer.seek(0)
+    query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(
+        target,
+        sql.SQL(", ").join(sql.Identifier(str(c)) for c in df.columns),
+        sql.Literal(COPY_NULL),
+    )
+    with timed_stage("copy", rows=len(df), nbytes=nbytes):
+        with connection.cursor() as cursor:
+            cursor.copy_expert(query, buffer)
+
+
+def copy_dataframe(connection, df: pd.DataFrame, table: str, schema: str = "public"):
+    """Stream a DataFrame into an existing table with COPY FROM STDIN.
+
+    The data is serialised to an in-memory CSV buffer, no temporary file is written.
+    The transaction is left open: the caller commits.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        df (pd.DataFrame): The data to load.
+        table (str): The name of the target table.
+        schema (str, optional): The schema. Defaults to "public".
+    """
+    _copy_into(
+        connection,
+        df,
+        sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(table)),
+    )
+
+
+def write_dataframe(connection, engine, df: pd.DataFrame, table: str, schema: str = "public"):
+    """Append a DataFrame to a table, with COPY when BULK_LOAD_WITH_COPY is set.
+
+    When the table does not exist yet, it is created from the DataFrame columns
+    like DataFrame.to_sql would do before loading the rows.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        df (pd.DataFrame): The data to load.
+        table (str): The name of the target table.
+        schema (str, optional): The schema. Defaults to "public".
+    """
+    if not BULK_LOAD_WITH_COPY:
+        with timed_stage("to_sql", rows=len(df)):
+            df.to_sql(table, engine, schema=schema, if_exists="append", index=False)
+        return
+    if len(df) == 0:
+        return
+    try:
+        copy_dataframe(connection, df, table, schema=schema)
+    except errors.UndefinedTable:
+        _create_table_from_frame(connection, engine, df, table, schema)
+        copy_dataframe(connection, df, table, schema=schema)
+
+
+def _create_table_from_frame(connection, engine, df: pd.DataFrame, table: str, schema: str):
+    connection.rollback()
+    logging.info(f"Creating table {schema}.{table} before bulk loading")
+    df.head(0).to_sql(table, engine, schema=schema, if_exists="append", index=False)
+
+
+def _create_staging_table(connection, engine, df: pd.DataFrame, table: str, schema: str):
+    """Create the temporary staging table of a table, dropped on commit.
+
+    The table itself is created from the DataFrame columns when it does not exist.
+    """
+    target = sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(table))
+    staging = sql.Identifier(f"staging_{table}")
+    for attempt in range(2):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL(
+                        "CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP"
+                    ).format(staging, target)
+                )
+            break
+        except errors.UndefinedTable:
+            if attempt:
+                raise
+            _create_table_from_frame(connection, engine, df, table, schema)
+    return target, staging
+
+
+def _replace_from_staging(
+    connection, target, staging, columns, key_columns: list, keep_last: bool = False
+) -> int:
+    """Move the staged rows into a table, replacing the rows sharing their key.
+
+    With keep_last, only the last staged row of each key is inserted, in the order
+    of the staging_row column of the staging table.
+
+    Returns:
+        int: The number of deleted rows.
+    """
+    columns = sql.SQL(", ").join(sql.Identifier(str(c)) for c in columns)
+    keys = sql.SQL(", ").join(sql.Identifier(k) for k in key_columns)
+    match = sql.SQL(" AND ").join(
+        sql.SQL("t.{0} = s.{0}").format(sql.Identifier(k)) for k in key_columns
+    )
+    if keep_last:
+        staged = sql.SQL(
+            "SELECT DISTINCT ON ({keys}) {columns} FROM {staging} "
+            "ORDER BY {keys}, staging_row DESC"
+        ).format(keys=keys, columns=columns, staging=staging)
+    else:
+        staged = sql.SQL("SELECT {} FROM {}").format(columns, staging)
+    with connection.cursor() as cursor:
+        with timed_stage("delete") as counts:
+            cursor.execute(
+                sql.SQL(
+                    "DELETE FROM {} t USING (SELECT DISTINCT {} FROM {}) s WHERE {}"
+                ).format(target, keys, staging, match)
+            )
+            deleted = counts["rows"] = cursor.rowcount
+        with timed_stage("insert") as counts:
+            cursor.execute(
+                sql.SQL("INSERT INTO {} ({}) {}").format(target, columns, staged)
+            )
+            counts["rows"] = cursor.rowcount
+    return deleted
+
+
+def replace_keyed_rows(
+    connection,
+    engine,
+    df: pd.DataFrame,
+    table: str,
+    key_columns: list,
+    schema: str = "public",
+):
+    """Replace the rows of a table sharing their key with the rows of a DataFrame.
+
+    The rows are copied into a temporary staging table, then the existing rows with
+    the same key are deleted and the staged rows inserted in a single transaction,
+    so the cost in round trips does not depend on the number of rows and a failure
+    leaves the table untouched. The transaction is committed on success and rolled
+    back on failure.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        df (pd.DataFrame): The new rows. Must contain the key columns.
+        table (str): The name of the target table.
+        key_columns (list): The columns identifying the rows to replace.
+        schema (str, optional): The schema. Defaults to "public".
+    """
+    if len(df) == 0:
+        return
+    target, staging = _create_staging_table(connection, engine, df, table, schema)
+    try:
+        _copy_into(connection, df, staging)
+        deleted = _replace_from_staging(
+            connection, target, staging, df.columns, key_columns
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    logging.info(
+        f"Replaced {deleted} rows of {schema}.{table} with {len(df)} new rows"
+    )
+
+
+def replace_keyed_batches(
+    connection,
+    engine,
+    batches,
+    table: str,
+    key_columns: list,
+    schema: str = "public",
+    keep_last: bool = False,
+) -> int:
+    """Replace the rows of a table sharing their key with the rows of DataFrame batches.
+
+    Like replace_keyed_rows, but each batch is copied into the staging table as soon
+    as it is produced, so only one batch is held in memory whatever the number of
+    rows. The batches must have the same columns.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        batches (iterable): The DataFrames of new rows. Must contain the key columns.
+        table (str): The name of the target table.
+        key_columns (list): The columns identifying the rows to replace.
+        schema (str, optional): The schema. Defaults to "public".
+        keep_last (bool, optional): Whether to insert only the last new row of each
+            key, like DataFrame.drop_duplicates(keep="last"). Defaults to False.
+
+    Returns:
+        int: The number of new rows read from the batches.
+    """
+    batches = (batch for batch in batches if len(batch))
+    first = next(batches, None)
+    if first is None:
+        return 0
+    target, staging = _create_staging_table(connection, engine, first, table, schema)
+    rows = 0
+    try:
+        if keep_last:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    sql.SQL("ALTER TABLE {} ADD COLUMN staging_row bigserial").format(
+                        staging
+                    )
+                )
+        for batch in itertools.chain([first], batches):
+            _copy_into(connection, batch, staging)
+            rows += len(batch)
+            logging.info(f"Staged {rows} rows for {schema}.{table}")
+        deleted = _replace_from_staging(
+            connection, target, staging, first.columns, key_columns, keep_last
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    logging.info(f"Replaced {deleted} rows of {schema}.{table} with {rows} new rows")
+    return rows
+
+
+_indexed_keys = set()
+
+
+def ensure_key_index(connection, table: str, key_columns: list, schema: str = "public"):
+    """Create the index on the key columns of a table if it does not exist yet.
+
+    With this index, replace_keyed_rows only looks up the rows sharing a key with
+    the new rows instead of scanning the whole table.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        table (str): The name of the table.
+        key_columns (list): The key columns to index.
+        schema (str, optional): The schema. Defaults to "public".
+    """
+    if (schema, table) in _indexed_keys:
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {}.{} ({})").format(
+                    sql.Identifier(f"ix_{table}_key"),
+                    sql.Identifier(schema),
+                    sql.Identifier(table),
+                    sql.SQL(", ").join(sql.Identifier(k) for k in key_columns),
+                )
+            )
+    except errors.UndefinedTable:
+        # The table is created by the first load, the index by the next one
+        connection.rollback()
+        return
+    connection.commit()
+    _indexed_keys.add((schema, table))
+
+
+def remove_duplicate_rows(connection, table: str, key_columns: list, schema: str = "public"):
+    """Keep only the last inserted row of each key in a table.
+
+    This is a one-off maintenance operation for tables which accumulated duplicates,
+    it sorts the table once instead of running a correlated subquery per row.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        table (str): The name of the table.
+        key_columns (list): The columns identifying duplicates.
+        schema (str, optional): The schema. Defaults to "public".
+    """
+    keys = sql.SQL(", ").join(sql.Identifier(k) for k in key_columns)
+    target = sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(table))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql.SQL(
+                """
+                DELETE FROM {target}
+                WHERE ctid IN (
+                    SELECT ctid FROM (
+                        SELECT ctid, row_number() OVER (PARTITION BY {keys} ORDER BY ctid DESC) AS rn
+                        FROM {target}
+                    ) ranked
+                    WHERE rn > 1
+                )
+                """
+            ).format(target=target, keys=keys)
+        )
+        logging.info(f"Removed {cursor.rowcount} duplicate rows from {schema}.{table}")
+    connection.commit()
@@ -0,0 +1,602 @@
+import importlib.util
+import io
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.utilsMetrics import timed_stage
+
+# Excel engine of read_excel, falls back to openpyxl when unavailable
+EXCEL_ENGINE = os.getenv("excel_engine", "calamine")
+
+# Parsed extractions are stored as Parquet next to their Excel blob
+PARQUET_SIDECARS = os.getenv("parquet_sidecars", "1") == "1"
+
+EXCEL_ENGINE_PACKAGES = {"calamine": "python_calamine", "openpyxl": "openpyxl"}
+
+# Excel files from this size on are read in batches of EXCEL_BATCH_ROWS rows
+EXCEL_STREAMING_MIN_BYTES = int(os.getenv("excel_streaming_min_mb", 20)) * 1024 * 1024
+EXCEL_BATCH_ROWS = int(os.getenv("excel_batch_rows", 20000))
+
+EXTRACTIONS_PATH = "PFC_LTH/0_raw_data/Extractions_quoti"
+
+INJECTIONS_COLUMNS = [
+    "Antenne",
+    "Colis codés",
+    "Colis poussés",
+    "Flashage pistolet",
+    "Colis inadmis",
+    "Rejets\nnon lu",
+    "Pourcentage\nRejets non lu",
+    "Multilabels",
+    "Pourcentage Multilabel",
+    "Total injecté",
+    "Temps d'utilisation",
+    "Cadence en fonctionnement",
+]
+
+EVTS_COLUMNS = ["Date heure de début", "Date heure de fin", "Machine", "Message"]
+
+# Durations parsed by times_to_seconds: a time of day, as strptime("%H:%M:%S.%f")
+# accepts it, or a number of days and a time, as the str() of a Timedelta or of
+# a timedelta, or in French ("2 jours 01:30:00")
+CLOCK_DURATION = (
+    r"^(?P<hours>2[0-3]|[01]?\d):(?P<minutes>[0-5]?\d):(?P<seconds>[0-5]?\d)"
+    r"(?:\.(?P<fraction>\d{1,6}))?$"
+)
+DAYS_NUMBER = r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)"
+DAYS_DURATION = (
+    rf"^(?P<days>[+-]?\d+)(?: days | day, | jours? )(?P<hours>{DAYS_NUMBER})"
+    rf":(?P<minutes>{DAYS_NUMBER}):(?P<seconds>{DAYS_NUMBER})$"
+)
+
+QUALITE_TRI_COLUMNS = [
+    "Trieur",
+    "Tri/contrôle ou rejet",
+    "Type de tri/contrôle/rejet",
+    "Détail de tri/rejet",
+    "Nb total colis",
+    "Nb de colis en bac",
+    "En pourcentage",
+    "Date",
+]
+
+
+def extraction_blob_name(date, file_name: str) -> str:
+    """Get the path of a daily extraction file in Azure Blob Storage.
+
+    Args:
+        date (datetime.date): The date of the extraction.
+        file_name (str): The name of the extraction file.
+
+    Returns:
+        str: The blob name.
+    """
+    return f"{EXTRACTIONS_PATH}/{date.strftime('%Y%m%d')}/{file_name}"
+
+
+def excel_engine_available(engine: str) -> bool:
+    """Check whether the package of an Excel engine is installed.
+
+    Args:
+        engine (str): The pandas Excel engine.
+
+    Returns:
+        bool: True if the engine can be used.
+    """
+    package = EXCEL_ENGINE_PACKAGES.get(engine, engine)
+    return importlib.util.find_spec(package) is not None
+
+
+def read_excel(excel_file, **kwargs) -> pd.DataFrame:
+    """Read an Excel file with the EXCEL_ENGINE engine, falling back to openpyxl.
+
+    The keyword arguments (usecols, skiprows, nrows...) are passed to
+    pd.read_excel, so the engine only materializes the selected cells.
+
+    Args:
+        excel_file (BytesIO | str): The Excel file.
+
+    Returns:
+        pd.DataFrame: The first sheet of the file.
+    """
+    engine = EXCEL_ENGINE
+    with timed_stage("read_excel") as counts:
+        df = None
+        if engine != "openpyxl" and excel_engine_available(engine):
+            try:
+                df = pd.read_excel(excel_file, engine=engine, **kwargs)
+            except Exception as e:
+                logging.warning(f"Excel engine {engine} failed, using openpyxl: {e}")
+                if hasattr(excel_file, "seek"):
+                    excel_file.seek(0)
+        if df is None:
+            df = pd.read_excel(excel_file, engine="openpyxl", **kwargs)
+        counts["rows"] = len(df)
+    return df
+
+
+def _header_names(header: tuple) -> list:
+    """Name the columns of a header row like pd.read_excel does."""
+    names = []
+    counts = {}
+    for i, name in enumerate(header):
+        name = f"Unnamed: {i}" if name is None else name
+        if name in counts:
+            counts[name] += 1
+            name = f"{name}.{counts[name]}"
+        else:
+            counts[name] = 0
+        names.append(name)
+    return names
+
+
+def iter_excel_batches(excel_file, batch_size: int = EXCEL_BATCH_ROWS):
+    """Read the first sheet of an Excel file as DataFrames of batch_size rows.
+
+    The workbook is read with openpyxl in read-only mode, which parses the rows as
+    they are iterated, so only one batch is held in memory. The empty rows are
+    skipped.
+
+    Args:
+        excel_file (BytesIO | str): The Excel file.
+        batch_size (int, optional): The number of rows of each DataFrame.
+            Defaults to EXCEL_BATCH_ROWS.
+
+    Yields:
+        pd.DataFrame: The next rows, with the first row of the sheet as header.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _header_names(header)
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def read_excel_batches(excel_file):
+    """Read the first sheet of an Excel file, in batches when it is large.
+
+    Files smaller than EXCEL_STREAMING_MIN_BYTES are read at once by read_excel,
+    larger ones by iter_excel_batches.
+
+    Args:
+        excel_file (BytesIO | str): The Excel file.
+
+    Returns:
+        iterable: The DataFrames of the rows of the sheet.
+    """
+    if isinstance(excel_file, str):
+        size = os.path.getsize(excel_file)
+    else:
+        size = excel_file.seek(0, io.SEEK_END)
+        excel_file.seek(0)
+    if size >= EXCEL_STREAMING_MIN_BYTES:
+        logging.info(f"Reading the {size} bytes Excel file in batches")
+        return iter_excel_batches(excel_file)
+    return iter([read_excel(excel_file)])
+
+
+def times_to_seconds(times: pd.Series, default_value=86400) -> pd.Series:
+    """Convert a column of durations to seconds.
+
+    Args:
+        times (pd.Series): The durations, as times, Timedeltas or strings.
+        default_value (float, optional): The seconds of the values that are not
+            durations. Defaults to 86400.
+
+    Returns:
+        pd.Series: The durations in seconds, as floats.
+    """
+    text = times.astype(str)
+
+    clock = text.str.extract(CLOCK_DURATION)
+    fraction = clock["fraction"].str.ljust(6, "0").astype(float).fillna(0)
+    clock_seconds = (
+        clock["hours"].astype(float) * 3600
+        + clock["minutes"].astype(float) * 60
+        + clock["seconds"].astype(float)
+        + fraction / 1e6
+    )
+
+    days = text.str.extract(DAYS_DURATION).astype(float)
+    # The fraction of second is rounded to the microsecond like datetime.timedelta
+    whole_seconds = np.trunc(days["seconds"])
+    microseconds = ((days["seconds"] - whole_seconds) * 1e6).round()
+    days_seconds = (
+        days["days"] * 86400
+        + days["hours"] * 3600
+        + days["minutes"] * 60
+        + whole_seconds
+        + microseconds / 1e6
+    )
+
+    return clock_seconds.fillna(days_seconds).fillna(default_value).astype(float)
+
+
+def remove_from_first_empty_row(df: pd.DataFrame) -> pd.DataFrame:
+    """Supprimer toutes les lignes d'un Dataframe après la première ligne vide
+
+    Args:
+        df (pd.DataFrame)
+
+    Returns:
+        pd.DataFrame: résultat
+    """
+
+    # Find the index of the first empty row
+    first_empty_row_index = df.index[df.isnull().all(axis=1)].min()
+    # If there is no empty row, set it to the last row + 1
+    if pd.isna(first_empty_row_index):
+        first_empty_row_index = len(df)
+    # Create a new DataFrame with rows up to the first empty row
+    new_df = df.iloc[:first_empty_row_index]
+    return new_df
+
+
+def read_injections(injections_file, date) -> pd.DataFrame:
+    """Read the antennes and Total rows of an injections file.
+
+    Args:
+        injections_file (BytesIO): The injections file of a trieur.
+        date (datetime.date): The date of the injections aux antennes data.
+
+    Returns:
+        pd.DataFrame: One row per antenne and the "Total" row.
+    """
+    df_origine = read_excel(injections_file, usecols=["Trieur"] + INJECTIONS_COLUMNS)
+    df_origine = df_origine.loc[
+        df_origine["Antenne"].notna() | (df_origine["Trieur"] == "Total")
+    ]
+    df_origine = df_origine.rename(
+        columns={
+            "Rejets\nnon lu": "Rejets non lu",
+            "Pourcentage\nRejets non lu": "Pourcentage Rejets non lu",
+        }
+    )
+    return df_origine.assign(Date=date)
+
+
+def injections_antennes(injections_df: pd.DataFrame) -> pd.DataFrame:
+    """Get the injections aux antennes of a parsed injections file.
+
+    Args:
+        injections_df (pd.DataFrame): The injections file, see read_injections.
+
+    Returns:
+        pd.DataFrame: One row per antenne.
+    """
+    return injections_df.dropna(subset=["Antenne"]).drop(columns=["Trieur"])
+
+
+def total_injecte(injections_df: pd.DataFrame) -> int:
+    """Get the total number of injected parcels of a parsed injections file.
+
+    Args:
+        injections_df (pd.DataFrame): The injections file, with at least the
+            "Trieur" and "Total injecté" columns.
+
+    Returns:
+        int: The "Total injecté" of the "Total" row.
+
+    Raises:
+        ValueError: If the file has no "Total" row.
+    """
+    total = injections_df.loc[injections_df.Trieur == "Total"]["Total injecté"]
+    if len(total) == 0:
+        raise ValueError("No Total row in the injections file")
+    return int(total.iloc[0])
+
+
+def read_injections_antennes(injections_file, date) -> pd.DataFrame:
+    """Read the injections aux antennes of an injections file.
+
+    Args:
+        injections_file (BytesIO): The injections file of a trieur.
+        date (datetime.date): The date of the injections aux antennes data.
+
+    Returns:
+        pd.DataFrame: One row per antenne.
+    """
+    return injections_antennes(read_injections(injections_file, date))
+
+
+def read_total_injecte(injections_file) -> int:
+    """Read the total number of injected parcels of an injections file.
+
+    Args:
+        injections_file (BytesIO): The injections file of a trieur.
+
+    Returns:
+        int: The "Total injecté" of the "Total" row.
+
+    Raises:
+        ValueError: If the file has no "Total" row.
+    """
+    return total_injecte(
+        read_excel(injections_file, usecols=["Trieur", "Total injecté"])
+    )
+
+
+def read_evts_defauts(OPB_file, date) -> pd.DataFrame:
+    """Read the events and defaults of an events file, without the "Fin :" events.
+
+    Args:
+        OPB_file (BytesIO): The events and defaults file.
+        date (datetime.date): The date of the events and defaults data.
+
+    Returns:
+        pd.DataFrame: The events with their date.
+    """
+    df_origine = read_excel(OPB_file, skiprows=5, usecols=EVTS_COLUMNS)
+    df = df_origine.loc[~df_origine["Message"].str.startswith("Fin :")]
+    return df.assign(Date=date)
+
+
+def read_qualite_tri(qualite_tri_file, date) -> pd.DataFrame:
+    """Read the quality of sorting file.
+
+    Args:
+        qualite_tri_file (BytesIO): The quality of sorting file.
+        date (datetime.date): The date of the quality of sorting data.
+
+    Returns:
+        pd.DataFrame: One row per tri/rejet detail.
+    """
+    qualite_tri_df = read_excel(qualite_tri_file, skiprows=3)
+    # Drop columns with names containing 'Unnamed'
+    qualite_tri_df = qualite_tri_df.filter(regex="^(?!.*Unnamed)")
+    for column in ["Trieur", "Tri/contrôle ou rejet", "Type de tri/contrôle/rejet"]:
+        qualite_tri_df[column] = qualite_tri_df[column].ffill()
+    qualite_tri_df.dropna(subset=["Détail de tri/rejet"], inplace=True)
+    qualite_tri_df["Date"] = date
+    return qualite_tri_df[QUALITE_TRI_COLUMNS]
+
+
+def read_temps_fonctionnement(tmp_fonctionnement_file, date) -> pd.DataFrame:
+    """Read the temps de fonctionnement et arrêts machine file.
+
+    Args:
+        tmp_fonctionnement_file (BytesIO): The temps de fonctionnement file.
+        date (datetime.date): The date of the temps de fonctionnement data.
+
+    Returns:
+        pd.DataFrame: One row per système, with the running time in seconds.
+    """
+    tmp_fonctionnement_arret_df = read_excel(tmp_fonctionnement_file, skiprows=3)
+    # Drop columns with names containing 'Unnamed'
+    # Keep the first two columns, files re-written by older uploads have an extra
+    # date column
+    tmp_fonctionnement_arret_df = tmp_fonctionnement_arret_df.filter(
+        regex="^(?!.*Unnamed)"
+    ).iloc[:, :2]
+    tmp_fonctionnement_arret_df.columns = [
+        "Système",
+        "Temps de fonctionnement (s)",
+    ]
+    tmp_fonctionnement_arret_df = remove_from_first_empty_row(
+        tmp_fonctionnement_arret_df
+    )
+    tmp_fonctionnement_arret_df = tmp_fonctionnement_arret_df.loc[
+        tmp_fonctionnement_arret_df["Système"] != "Total"
+    ].copy()
+    tmp_fonctionnement_arret_df["Temps de fonctionnement (s)"] = times_to_seconds(
+        tmp_fonctionnement_arret_df["Temps de fonctionnement (s)"]
+    )
+    tmp_fonctionnement_arret_df["Date"] = date
+    return tmp_fonctionnement_arret_df
+
+
+def read_trafic_sortie(trafic_sortie_file, date) -> pd.DataFrame:
+    """Read the trafic par sortie file.
+
+    Args:
+        trafic_sortie_file (BytesIO): The trafic par sortie file of a trieur.
+        date (datetime.date): The date of the trafic par sortie data.
+
+    Returns:
+        pd.DataFrame: One row per trieur and sortie.
+    """
+    trafic_sortie_df = read_excel(trafic_sortie_file, skiprows=6)
+    # Drop columns with names containing 'Unnamed'
+    trafic_sortie_df = trafic_sortie_df.filter(regex="^(?!.*Unnamed)")
+
+    if "Tps Bourrage" in trafic_sortie_df.columns:
+        trafic_sortie_df["Tps Bourrage"] = times_to_seconds(
+            trafic_sortie_df["Tps Bourrage"], default_value=0
+        )
+    trafic_sortie_df["Date"] = date
+    return trafic_sortie_df
+
+
+# Reader of each daily extraction file, all taking the file and its date
+EXTRACTION_READERS = {
+    "Evenementsetdefauts.xlsx": read_evts_defauts,
+    "Injectiondescolisauxantennes_trieur_haut.xlsx": read_injections,
+    "Injectiondescolisauxantennes_trieur_bas.xlsx": read_injections,
+    "Qualité_de_tri.xlsx": read_qualite_tri,
+    "Temps_de_fonctionnement_et_arrêts_machine.xlsx": read_temps_fonctionnement,
+    "Trafic_par_sortie_trieur_haut.xlsx": read_trafic_sortie,
+    "Trafic_par_sortie_trieur_bas.xlsx": read_trafic_sortie,
+}
+
+
+def sidecar_blob_name(blob_name: str) -> str:
+    """Get the name of the Parquet sidecar of an Excel blob.
+
+    Args:
+        blob_name (str): The Excel blob name.
+
+    Returns:
+        str: The sidecar blob name, next to the Excel blob.
+    """
+    return os.path.splitext(blob_name)[0] + ".parquet"
+
+
+def sidecars_enabled() -> bool:
+    return PARQUET_SIDECARS and importlib.util.find_spec("pyarrow") is not None
+
+
+def frame_to_parquet(df: pd.DataFrame, source_etag: str):
+    """Serialize a parsed extraction to Parquet, stamped with the ETag of its source.
+
+    Args:
+        df (pd.DataFrame): The parsed extraction.
+        source_etag (str): The ETag of the Excel blob it was parsed from.
+
+    Returns:
+        bytes | None: The Parquet file, None if the frame cannot be stored.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        logging.warning(f"Could not convert the extraction to Parquet: {e}")
+        return None
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"source_etag"] = source_etag.encode("UTF-8")
+    buffer = io.BytesIO()
+    pq.write_table(table.replace_schema_metadata(metadata), buffer)
+    return buffer.getvalue()
+
+
+def frame_from_parquet(content: bytes, source_etag: str, columns=None):
+    """Load a Parquet sidecar if it was parsed from the current source blob.
+
+    Args:
+        content (bytes): The Parquet file.
+        source_etag (str): The current ETag of the Excel blob.
+        columns (list, optional): The columns to load. Defaults to all.
+
+    Returns:
+        pd.DataFrame | None: The parsed extraction, None if the sidecar is stale.
+    """
+    import pyarrow.parquet as pq
+
+    try:
+        parquet_file = pq.ParquetFile(io.BytesIO(content))
+        metadata = parquet_file.schema_arrow.metadata or {}
+        if metadata.get(b"source_etag", b"").decode("UTF-8") != source_etag:
+            return None
+        return parquet_file.read(columns=columns).to_pandas()
+    except Exception as e:
+        logging.warning(f"Could not read the Parquet sidecar: {e}")
+        return None
+
+
+def load_sidecar(blob_name: str, source_etag: str, columns=None):
+    """Load the Parquet sidecar of an Excel blob if it is up to date.
+
+    Args:
+        blob_name (str): The Excel blob name.
+        source_etag (str): The current ETag of the Excel blob.
+        columns (list, optional): The columns to load. Defaults to all.
+
+    Returns:
+        pd.DataFrame | None: The parsed extraction, None if there is no
+            up-to-date sidecar.
+    """
+    from src.utilsAzure import get_Azure_file_bytes
+
+    if not sidecars_enabled():
+        return None
+    sidecar = get_Azure_file_bytes(sidecar_blob_name(blob_name))
+    if sidecar is None:
+        return None
+    return frame_from_parquet(sidecar.getvalue(), source_etag, columns)
+
+
+def save_sidecar(blob_name: str, df: pd.DataFrame, source_etag: str):
+    """Store a parsed extraction as the Parquet sidecar of its Excel blob.
+
+    Args:
+        blob_name (str): The Excel blob name.
+        df (pd.DataFrame): The parsed extraction.
+        source_etag (str): The ETag of the Excel blob it was parsed from.
+    """
+    from src.utilsAzure import upload_Azure_file_bytes
+
+    if not sidecars_enabled() or source_etag is None:
+        return
+    content = frame_to_parquet(df, source_etag)
+    if content is not None:
+        upload_Azure_file_bytes(sidecar_blob_name(blob_name), content, overwrite=True)
+
+
+def read_extraction(date, file_name: str, columns=None):
+    """Read a daily extraction file, through its Parquet sidecar when it is up to date.
+
+    The first read parses the Excel blob and uploads the parsed frame as a
+    Parquet sidecar stamped with the ETag of the blob. The next reads only load
+    the sidecar, until the Excel blob is replaced.
+
+    Args:
+        date (datetime.date): The date of the extraction.
+        file_name (str): The extraction file name, a key of EXTRACTION_READERS.
+        columns (list, optional): The columns to load. Defaults to all.
+
+    Returns:
+        pd.DataFrame | None: The parsed extraction, None if the file is missing.
+    """
+    from src.utilsAzure import get_Azure_file_bytes, get_blob_etag
+
+    blob_name = extraction_blob_name(date, file_name)
+    source_etag = get_blob_etag(blob_name)
+    if source_etag is None:
+        return None
+
+    df = load_sidecar(blob_name, source_etag, columns)
+    if df is not None:
+        return df
+
+    excel_file = get_Azure_file_bytes(blob_name)
+    if excel_file is None:
+        return None
+    df = EXTRACTION_READERS[file_name](excel_file, date)
+    save_sidecar(blob_name, df, source_etag)
+    return df if columns is None else df[columns]
+
+
+def store_extraction(date, file_name: str, content: bytes) -> pd.DataFrame:
+    """Store an uploaded extraction file as is and parse it once.
+
+    The file is parsed first, so a workbook that cannot be parsed does not
+    replace the extraction stored for the day. The Excel file is then uploaded to
+    its daily folder and the parsed frame is stored as its Parquet sidecar,
+    stamped with the ETag of the new blob, so the next reads do not parse it
+    again.
+
+    Args:
+        date (datetime.date): The date of the extraction.
+        file_name (str): The extraction file name, a key of EXTRACTION_READERS.
+        content (bytes): The content of the uploaded file.
+
+    Returns:
+        pd.DataFrame: The parsed extraction.
+    """
+    from src.utilsAzure import upload_Azure_extraction
+
+    df = EXTRACTION_READERS[file_name](io.BytesIO(content), date)
+    blob_name = extraction_blob_name(date, file_name)
+    source_etag = upload_Azure_extraction(content, blob_name, date)
+    save_sidecar(blob_name, df, source_etag)
+    return df
@@ -0,0 +1,241 @@
+import datetime
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Local SQLite table of the upload jobs, kept across restarts of the app
+JOBS_DATABASE = os.getenv(
+    "jobs_database", os.path.join(tempfile.gettempdir(), "insertion_jobs.sqlite")
+)
+# Number of uploads processed at the same time
+JOB_WORKERS = int(os.getenv("upload_workers", 4))
+
+JOB_STATUSES = ["En attente", "En cours", "Terminé", "Échec", "Interrompu"]
+QUEUED, RUNNING, DONE, FAILED, INTERRUPTED = JOB_STATUSES
+
+CREATE_JOBS_QUERY = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        label TEXT NOT NULL,
+        status TEXT NOT NULL,
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT,
+        owner INTEGER
+    )
+"""
+
+_jobs_lock = threading.Lock()
+_executor = None
+# Jobs with the same lock key run one at a time, e.g. the writes of a same table.
+# The keys with a submitted job, and the jobs waiting behind it in order
+_key_queues = {}
+# Id of the job run by the current worker thread
+_current = threading.local()
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _connect() -> sqlite3.Connection:
+    connection = sqlite3.connect(JOBS_DATABASE, timeout=30)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def _update_job(job_id: str, **fields):
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    with _connect() as connection:
+        connection.execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id]
+        )
+    connection.close()
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _interrupt_stale_jobs(connection: sqlite3.Connection):
+    """Mark the jobs left queued or running by an ended process as interrupted.
+
+    The jobs table is shared by the processes of the app, so the jobs of the
+    processes still running, e.g. during an overlapping restart, are kept.
+    """
+    columns = [row["name"] for row in connection.execute("PRAGMA table_info(jobs)")]
+    if "owner" not in columns:
+        connection.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+    owners = connection.execute(
+        "SELECT DISTINCT owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+    ).fetchall()
+    for (owner,) in owners:
+        # This process has no job yet, so its pid can only be a reused one
+        if owner is None or owner == os.getpid() or not _process_alive(owner):
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? "
+                "WHERE status IN (?, ?) AND owner IS ?",
+                (INTERRUPTED, _now(), QUEUED, RUNNING, owner),
+            )
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the worker threads, creating the jobs table on first use.
+
+    The jobs left queued or running by an ended process are marked as
+    interrupted, since their worker threads are gone.
+    """
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            os.makedirs(os.path.dirname(JOBS_DATABASE) or ".", exist_ok=True)
+            with _connect() as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute(CREATE_JOBS_QUERY)
+                _interrupt_stale_jobs(connection)
+            connection.close()
+            _executor = ThreadPoolExecutor(
+                max_workers=JOB_WORKERS, thread_name_prefix="upload"
+            )
+        return _executor
+
+
+def _run_job(job_id: str, lock_key, failure_message, function, args, kwargs):
+    _current.job_id = job_id
+    try:
+        _update_job(job_id, status=RUNNING, started_at=_now())
+        message = function(*args, **kwargs)
+        _update_job(
+            job_id,
+            status=DONE,
+            progress=1.0,
+            message=message or DONE,
+            finished_at=_now(),
+        )
+    except Exception as e:
+        logging.exception(f"Upload job {job_id} failed")
+        _update_job(
+            job_id,
+            status=FAILED,
+            message=failure_message or str(e),
+            finished_at=_now(),
+        )
+    finally:
+        _current.job_id = None
+        if lock_key is not None:
+            _submit_next(lock_key)
+
+
+def _submit_next(lock_key):
+    """Submit the next job waiting for a lock key, once the running one ended."""
+    with _jobs_lock:
+        waiting = _key_queues[lock_key]
+        if not waiting:
+            del _key_queues[lock_key]
+            return
+        job = waiting.popleft()
+    _executor.submit(_run_job, *job)
+
+
+def submit_job(
+    label: str,
+    function,
+    *args,
+    lock_key=None,
+    failure_message: str = None,
+    **kwargs,
+) -> str:
+    """Queue a function to be run by a worker thread, and return immediately.
+
+    Args:
+        label (str): The description of the job shown to the user.
+        function (callable): The function, returning the message shown when it
+            succeeds. It can report its progress with set_job_progress.
+        *args: The positional arguments of the function.
+        lock_key (hashable, optional): Jobs with the same key are not run at the
+            same time, but one after the other in the order they were
+            submitted. Defaults to None.
+        failure_message (str, optional): The message shown when the function
+            raises an exception. Defaults to the exception message.
+        **kwargs: The keyword arguments of the function.
+
+    Returns:
+        str: The id of the job, see get_jobs.
+    """
+    executor = _get_executor()
+    job_id = uuid.uuid4().hex
+    with _connect() as connection:
+        connection.execute(
+            "INSERT INTO jobs (id, label, status, created_at, owner) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (job_id, label, QUEUED, _now(), os.getpid()),
+        )
+    connection.close()
+    job = (job_id, lock_key, failure_message, function, args, kwargs)
+    if lock_key is not None:
+        # The jobs of a busy key wait here rather than in a worker thread, so
+        # they do not hold the workers needed by the other uploads
+        with _jobs_lock:
+            if lock_key in _key_queues:
+                _key_queues[lock_key].append(job)
+                job = None
+            else:
+                _key_queues[lock_key] = deque()
+    if job is not None:
+        executor.submit(_run_job, *job)
+    logging.info(f"Queued upload job {job_id}: {label}")
+    return job_id
+
+
+def set_job_progress(progress: float, message: str = None):
+    """Report the progress of the job run by the current thread.
+
+    Does nothing outside of a job, so the job functions can also be called
+    directly, e.g. by the backfill.
+
+    Args:
+        progress (float): The fraction of the job done, between 0 and 1.
+        message (str, optional): The current step. Defaults to None.
+    """
+    job_id = getattr(_current, "job_id", None)
+    if job_id is not None:
+        _update_job(job_id, progress=progress, message=message)
+
+
+def get_jobs(job_ids: list) -> list:
+    """Get the state of some jobs.
+
+    Args:
+        job_ids (list): The ids of the jobs, see submit_job.
+
+    Returns:
+        list: A dict by job with the columns of the jobs table, in the order of
+            job_ids, without the unknown ids.
+    """
+    if not job_ids:
+        return []
+    _get_executor()
+    with _connect() as connection:
+        rows = connection.execute(
+            f"SELECT * FROM jobs WHERE id IN ({', '.join('?' * len(job_ids))})",
+            list(job_ids),
+        ).fetchall()
+    connection.close()
+    jobs = {row["id"]: dict(row) for row in rows}
+    return [jobs[job_id] for job_id in job_ids if job_id in jobs]
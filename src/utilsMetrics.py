@@ -0,0 +1,387 @@
+import contextvars
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.utilsProfiling import bind_profile, profiled
+
+# Local endpoint of the Prometheus metrics of the ingestions (0 disables it)
+METRICS_HOST = os.getenv("metrics_host", "127.0.0.1")
+METRICS_PORT = int(os.getenv("metrics_port", 9108))
+
+# Each ingestion run is stored in Ingestion_runs for trend analysis, unless
+# ingestion_runs=0
+RECORD_INGESTION_RUNS = os.getenv("ingestion_runs", "1") == "1"
+
+# Operations timed where they happen. The stages of run_pipeline (fetch, read,
+# transform, write, wait, coverage) include them, so both must not be summed.
+# - download, upload: transfers of blobs, with their bytes
+# - read_excel: parsing of a whole Excel sheet, with its rows
+# - copy, to_sql: loading of rows into a table, with the bytes sent by COPY
+# - delete, insert: replacement of the keyed rows from the staging table
+# - add_date_data: recording of a date in Dates_data
+OPERATIONS = [
+    "download",
+    "upload",
+    "read_excel",
+    "copy",
+    "to_sql",
+    "delete",
+    "insert",
+    "add_date_data",
+]
+
+# Stages whose rows are the rows written by a run
+WRITE_STAGES = ["copy", "to_sql"]
+
+# Label of the operations done outside of any ingestion run
+NO_RUN = "none"
+
+CREATE_INGESTION_RUNS_QUERY = """
+    CREATE TABLE IF NOT EXISTS public."Ingestion_runs" (
+        "Id" bigserial PRIMARY KEY,
+        "Data_type" text NOT NULL,
+        "Date" date,
+        "Started_at" timestamp NOT NULL,
+        "Duration" double precision NOT NULL,
+        "Status" text NOT NULL,
+        "Rows" bigint NOT NULL,
+        "Bytes" bigint NOT NULL,
+        "Stages" jsonb NOT NULL,
+        "Error" text,
+        "Profile" text
+    );
+    ALTER TABLE public."Ingestion_runs" ADD COLUMN IF NOT EXISTS "Profile" text;
+    CREATE INDEX IF NOT EXISTS "ix_Ingestion_runs_type_date"
+    ON public."Ingestion_runs" ("Data_type", "Date");
+"""
+
+INSERT_INGESTION_RUN_QUERY = """
+    INSERT INTO public."Ingestion_runs" (
+        "Data_type", "Date", "Started_at", "Duration", "Status", "Rows", "Bytes",
+        "Stages", "Error", "Profile"
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s)
+"""
+
+# Ingestion run of the current thread, see ingestion_run
+_run = contextvars.ContextVar("ingestion_run", default=None)
+
+_metrics_lock = threading.Lock()
+# Totals by (data type, stage), by (data type, status), and last run by data type
+_stage_totals = {}
+_run_totals = {}
+_last_runs = {}
+_runs_table_ready = False
+# Runs ended by the current thread while it held a pooled connection
+_pending = threading.local()
+_server = None
+
+
+def _new_totals() -> dict:
+    return {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0}
+
+
+def _add_totals(totals: dict, seconds: float, rows: int, nbytes: int):
+    totals["seconds"] += seconds
+    totals["calls"] += 1
+    totals["rows"] += rows
+    totals["bytes"] += nbytes
+
+
+def record_stage(stage: str, seconds: float, rows: int = 0, nbytes: int = 0):
+    """Add the duration, rows and bytes of a stage to the metrics and current run.
+
+    Args:
+        stage (str): The stage, see OPERATIONS and PIPELINE_STAGES.
+        seconds (float): The time spent in the stage.
+        rows (int, optional): The rows read or written. Defaults to 0.
+        nbytes (int, optional): The bytes transferred. Defaults to 0.
+    """
+    run = _run.get()
+    data_type = NO_RUN if run is None else run["data_type"]
+    with _metrics_lock:
+        totals = _stage_totals.setdefault((data_type, stage), _new_totals())
+        _add_totals(totals, seconds, rows, nbytes)
+        if run is not None:
+            totals = run["stages"].setdefault(stage, _new_totals())
+            _add_totals(totals, seconds, rows, nbytes)
+
+
+@contextmanager
+def timed_stage(stage: str, rows: int = 0, nbytes: int = 0):
+    """Time a block as a stage, see record_stage.
+
+    The counts yielded can be updated by the block once its rows or bytes are
+    known.
+
+    Example:
+        with timed_stage("read_excel") as counts:
+            df = pd.read_excel(file)
+            counts["rows"] = len(df)
+    """
+    counts = {"rows": rows, "bytes": nbytes}
+    start = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        record_stage(
+            stage, time.perf_counter() - start, counts["rows"], counts["bytes"]
+        )
+
+
+def bind_ingestion_run(function):
+    """Make a function run in the ingestion run of the caller from another thread.
+
+    Args:
+        function (callable): The function, e.g. submitted to a thread pool.
+
+    Returns:
+        callable: The function, recording its stages in the current run, and
+            profiled with it when the run is profiled.
+    """
+    run = _run.get()
+
+    def bound(*args, **kwargs):
+        token = _run.set(run)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _run.reset(token)
+
+    return bind_profile(bound)
+
+
+def _run_summary(run: dict) -> tuple:
+    """Get the rows written and the bytes transferred by a run."""
+    stages = run["stages"]
+    rows = sum(stages[stage]["rows"] for stage in WRITE_STAGES if stage in stages)
+    nbytes = sum(totals["bytes"] for totals in stages.values())
+    return rows, nbytes
+
+
+@contextmanager
+def ingestion_run(data_type: str, date=None):
+    """Record the stages of an ingestion of a data type and day as one run.
+
+    When the run ends, its totals are added to the metrics and it is stored in
+    the Ingestion_runs table. A run started inside another one is part of it.
+    When profiling is enabled, the run is profiled and the path of its profile
+    is stored with it, see profiled.
+
+    Args:
+        data_type (str): The data type ingested.
+        date (datetime.date, optional): The date of the data. Defaults to None.
+
+    Yields:
+        dict: The run, with the totals of each stage under "stages".
+    """
+    if _run.get() is not None:
+        yield _run.get()
+        return
+
+    run = {
+        "data_type": data_type,
+        "date": date,
+        "started_at": datetime.datetime.now(),
+        "stages": {},
+        "profile": None,
+    }
+    token = _run.set(run)
+    start = time.perf_counter()
+    status, error, profile = "ok", None, None
+    try:
+        with profiled(data_type, date) as profile:
+            yield run
+    except Exception as e:
+        status, error = "error", str(e)
+        raise
+    finally:
+        _run.reset(token)
+        if profile is not None:
+            run["profile"] = profile["path"]
+        duration = time.perf_counter() - start
+        rows, nbytes = _run_summary(run)
+        with _metrics_lock:
+            _run_totals[(data_type, status)] = (
+                _run_totals.get((data_type, status), 0) + 1
+            )
+            _last_runs[data_type] = {
+                "timestamp": time.time(),
+                "duration": duration,
+                "rows": rows,
+            }
+        logging.info(
+            f"Ingestion run {data_type} of {date}: {status} in {duration:.2f}s, "
+            f"{rows} rows, {nbytes} bytes"
+        )
+        if RECORD_INGESTION_RUNS:
+            _record_run(run, status, duration, rows, nbytes, error)
+
+
+def _record_run(*args):
+    """Store a run now, or once the current thread returned its pooled connections.
+
+    Borrowing another connection for the run while the thread holds one would wait
+    for itself whenever all the connections of the pool are borrowed.
+    """
+    from src.utilsDB import holds_pooled_connection
+
+    if holds_pooled_connection():
+        _pending.__dict__.setdefault("runs", []).append(args)
+    else:
+        _save_run(*args)
+
+
+def save_pending_runs():
+    """Store the runs ended while the current thread held a pooled connection."""
+    runs = getattr(_pending, "runs", [])
+    _pending.runs = []
+    for args in runs:
+        _save_run(*args)
+
+
+def _save_run(run: dict, status: str, duration: float, rows, nbytes, error):
+    """Insert a run into Ingestion_runs, with a connection of its own."""
+    global _runs_table_ready
+    from src.utilsDB import pooled_connection
+
+    stages = {
+        stage: {**totals, "seconds": round(totals["seconds"], 6)}
+        for stage, totals in run["stages"].items()
+    }
+    try:
+        with pooled_connection() as (connection, _):
+            with connection.cursor() as cursor:
+                if not _runs_table_ready:
+                    cursor.execute(CREATE_INGESTION_RUNS_QUERY)
+                cursor.execute(
+                    INSERT_INGESTION_RUN_QUERY,
+                    (
+                        run["data_type"],
+                        run["date"],
+                        run["started_at"],
+                        duration,
+                        status,
+                        rows,
+                        nbytes,
+                        json.dumps(stages),
+                        error,
+                        run["profile"],
+                    ),
+                )
+            connection.commit()
+        _runs_table_ready = True
+    except Exception as e:
+        # The metrics must never fail an ingestion
+        logging.warning(f"Could not store the ingestion run {run['data_type']}: {e}")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _samples(name: str, kind: str, description: str, samples: list) -> list:
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape(v)}"' for key, v in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}")
+    return lines
+
+
+def render_metrics() -> str:
+    """Get the ingestion metrics in the Prometheus text format.
+
+    Returns:
+        str: The metrics of each data type and stage since the start of the process.
+    """
+    with _metrics_lock:
+        stage_totals = {key: dict(totals) for key, totals in _stage_totals.items()}
+        run_totals = dict(_run_totals)
+        last_runs = {key: dict(last) for key, last in _last_runs.items()}
+
+    lines = []
+    for field, description in [
+        ("seconds", "Time spent in each ingestion stage."),
+        ("calls", "Number of times each ingestion stage ran."),
+        ("rows", "Rows read or written by each ingestion stage."),
+        ("bytes", "Bytes transferred by each ingestion stage."),
+    ]:
+        lines += _samples(
+            f"ingestion_stage_{field}_total",
+            "counter",
+            description,
+            [
+                ({"data_type": data_type, "stage": stage}, totals[field])
+                for (data_type, stage), totals in sorted(stage_totals.items())
+            ],
+        )
+    lines += _samples(
+        "ingestion_runs_total",
+        "counter",
+        "Number of ingestion runs by status.",
+        [
+            ({"data_type": data_type, "status": status}, count)
+            for (data_type, status), count in sorted(run_totals.items())
+        ],
+    )
+    for field, name, description in [
+        ("timestamp", "timestamp_seconds", "End time of the last ingestion run."),
+        ("duration", "duration_seconds", "Duration of the last ingestion run."),
+        ("rows", "rows", "Rows written by the last ingestion run."),
+    ]:
+        lines += _samples(
+            f"ingestion_last_run_{name}",
+            "gauge",
+            description,
+            [
+                ({"data_type": data_type}, last[field])
+                for data_type, last in sorted(last_runs.items())
+            ],
+        )
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serve the ingestion metrics on http://host:port/metrics, once per process.
+
+    Args:
+        host (str, optional): The address to listen on. Defaults to METRICS_HOST.
+        port (int, optional): The port, 0 to disable the endpoint. Defaults to
+            METRICS_PORT.
+    """
+    global _server
+    with _metrics_lock:
+        if _server is not None or port <= 0:
+            return
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            # E.g. another process of the app already serves the port
+            logging.warning(f"Could not serve the metrics on {host}:{port}: {e}")
+            _server = False
+            return
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Serving the ingestion metrics on http://{host}:{port}/metrics")
@@ -0,0 +1,270 @@
+import datetime
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from src.utilsDB import ensure_key_index
+from src.utilsStatus import add_coverage_date, invalidate_ingestion_status
+
+# Compute the OPB aggregates of the uploaded days in the database from
+# LTH_Evt_defauts instead of in pandas
+OPB_IN_DATABASE = os.getenv("opb_in_database", "0") == "1"
+
+# Seconds during which the Bourrage weights are reused without checking the table
+OPB_WEIGHTS_TTL = float(os.getenv("opb_weights_ttl", 300))
+
+WEIGHTS_QUERY = (
+    'SELECT "COEFF", "CLE_BOURRAGE" FROM public."Ponderations_Bourrages_LTH"'
+)
+
+# Changes whenever a weight is added, removed or modified
+WEIGHTS_SIGNATURE_QUERY = """
+    SELECT count(*), md5(string_agg(
+        concat_ws('=', "CLE_BOURRAGE", "COEFF"), ','
+        ORDER BY "CLE_BOURRAGE", "COEFF"
+    ))
+    FROM public."Ponderations_Bourrages_LTH"
+"""
+
+# Time of an event as a timestamp, whatever the type of its column: the events
+# files give either text, e.g. 16/07/2024 05:12:00, or datetime cells, loaded as
+# ISO text by COPY or as a timestamp column by to_sql
+EVENT_TIME_SQL = """
+    CASE WHEN "{column}"::text ~ '^[0-9]{{4}}-' THEN "{column}"::text::timestamp
+    ELSE to_timestamp("{column}"::text, 'DD/MM/YYYY HH24:MI:SS')::timestamp END
+"""
+
+# Events of a range of dates of LTH_Evt_defauts, as parsed by compute_opb, their
+# times being compared as local times. The Date column is a date, or the ISO text
+# to_sql creates from dates, so the range is given as ISO text
+OPB_EVENTS_QUERY = """
+    SELECT "File_date", "Message", "Debut",
+        EXTRACT(EPOCH FROM "Fin" - "Debut") / 3600 AS "Duree"
+    FROM (
+        SELECT "Date"::date AS "File_date", "Message",
+            {start} AS "Debut",
+            {end} AS "Fin"
+        FROM public."LTH_Evt_defauts"
+        WHERE "Date" BETWEEN %(start_date)s AND %(end_date)s
+    ) times
+""".format(
+    start=EVENT_TIME_SQL.format(column="Date heure de début"),
+    end=EVENT_TIME_SQL.format(column="Date heure de fin"),
+)
+
+# Set-based recompute of the OPB tables for a range of dates of LTH_Evt_defauts,
+# by table. As in compute_opb, the rows of an events file are dated by the start
+# of its earliest weighted (or Bourrage and Erreur IOB) event, and replace the
+# rows of the same date, compared as ISO text like the Date columns created by
+# to_sql. The row count is the number of rows written.
+RECOMPUTE_OPB_QUERIES = {
+    "OPB_LTH": f"""
+        WITH evts AS ({OPB_EVENTS_QUERY}),
+        opb AS (
+            SELECT min(evts."Debut")::date AS "Date",
+                COALESCE(SUM(evts."Duree" * w."COEFF"), 0) AS "Duree_ponderee"
+            FROM evts
+            JOIN public."Ponderations_Bourrages_LTH" w
+                ON w."CLE_BOURRAGE" = evts."Message"
+            GROUP BY evts."File_date"
+        ),
+        deleted AS (
+            DELETE FROM public."OPB_LTH"
+            WHERE "Date"::text IN (SELECT "Date"::text FROM opb)
+        )
+        INSERT INTO public."OPB_LTH" ("Date", "Duree_ponderee")
+        SELECT "Date", "Duree_ponderee" FROM opb
+    """,
+    "OPB_Bourrage_LTH": f"""
+        WITH evts AS ({OPB_EVENTS_QUERY}),
+        selected AS (
+            SELECT "File_date", "Duree",
+                min("Debut") OVER (PARTITION BY "File_date")::date AS "Date",
+                CASE WHEN strpos("Message", 'Erreur IOB') > 0 THEN 'IOB'
+                    ELSE 'Bourrage' END AS "Type"
+            FROM evts
+            WHERE strpos("Message", 'Bourrage') > 0
+            OR strpos("Message", 'Erreur IOB') > 0
+        ),
+        bourrage_iob AS (
+            SELECT "Date", "Type", COALESCE(SUM("Duree"), 0) AS "Duree",
+                COUNT("Duree") AS "Nombre de défauts"
+            FROM selected
+            GROUP BY "File_date", "Date", "Type"
+        ),
+        deleted AS (
+            DELETE FROM public."OPB_Bourrage_LTH"
+            WHERE "Date"::text IN (SELECT "Date"::text FROM bourrage_iob)
+        )
+        INSERT INTO public."OPB_Bourrage_LTH"
+            ("Date", "Type", "Duree", "Nombre de défauts")
+        SELECT "Date", "Type", "Duree", "Nombre de défauts" FROM bourrage_iob
+    """,
+}
+
+# Date recorded in Dates_data for each events file, as by upload_opb: the date
+# of its OPB_LTH row, or the date of the file when no event is weighted
+OPB_DATES_QUERY = f"""
+    WITH evts AS ({OPB_EVENTS_QUERY})
+    SELECT DISTINCT COALESCE(
+        min(evts."Debut") FILTER (WHERE w."CLE_BOURRAGE" IS NOT NULL)::date,
+        evts."File_date"
+    )
+    FROM evts
+    LEFT JOIN public."Ponderations_Bourrages_LTH" w
+        ON w."CLE_BOURRAGE" = evts."Message"
+    GROUP BY evts."File_date"
+"""
+
+_weights_lock = threading.Lock()
+_weights = {"frame": None, "signature": None, "checked_at": 0.0}
+
+
+def get_bourrage_weights(connection) -> pd.DataFrame:
+    """Get the weight of each Bourrage message, from Ponderations_Bourrages_LTH.
+
+    The table is read again only when its signature changed, and its signature
+    is checked at most once per OPB_WEIGHTS_TTL seconds.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+
+    Returns:
+        pd.DataFrame: The COEFF and CLE_BOURRAGE columns.
+    """
+    now = time.monotonic()
+    with _weights_lock:
+        if (
+            _weights["frame"] is not None
+            and now - _weights["checked_at"] < OPB_WEIGHTS_TTL
+        ):
+            return _weights["frame"]
+
+    with connection.cursor() as cursor:
+        cursor.execute(WEIGHTS_SIGNATURE_QUERY)
+        signature = cursor.fetchone()
+    with _weights_lock:
+        if _weights["frame"] is not None and _weights["signature"] == signature:
+            _weights["checked_at"] = now
+            return _weights["frame"]
+
+    df_weights = pd.read_sql_query(WEIGHTS_QUERY, connection)
+    logging.info(f"Loaded {len(df_weights)} Bourrage weights")
+    with _weights_lock:
+        _weights.update(frame=df_weights, signature=signature, checked_at=now)
+    return df_weights
+
+
+def invalidate_bourrage_weights():
+    """Forget the cached Bourrage weights, e.g. after editing the table."""
+    with _weights_lock:
+        _weights.update(frame=None, signature=None, checked_at=0.0)
+
+
+def compute_opb(df_evts: pd.DataFrame, df_weights: pd.DataFrame) -> tuple:
+    """Compute the OPB aggregates of a day of events.
+
+    Args:
+        df_evts (pd.DataFrame): The events and defaults of the day, see
+            read_evts_defauts.
+        df_weights (pd.DataFrame): The weights, see get_bourrage_weights.
+
+    Returns:
+        tuple: The OPB_LTH rows, the OPB_Bourrage_LTH rows, and the date of the
+            OPB data (the start date of the earliest weighted event, None when
+            no event has a weight).
+    """
+    evts = df_evts.assign(
+        **{
+            column: pd.to_datetime(df_evts[column], dayfirst=True)
+            for column in ["Date heure de début", "Date heure de fin"]
+        }
+    )
+    hours = (evts["Date heure de fin"] - evts["Date heure de début"]).dt.total_seconds()
+    hours = hours / 3600
+
+    # Weighted duration of the messages of the weights table
+    is_weighted = evts["Message"].isin(df_weights["CLE_BOURRAGE"])
+    opb_date = None
+    df_opb = pd.DataFrame(columns=["Date", "Duree_ponderee"])
+    if is_weighted.any():
+        opb_date = evts.loc[is_weighted, "Date heure de début"].min().date()
+        df_tmp = pd.merge(
+            left=evts.loc[is_weighted, ["Message"]].assign(Duree=hours[is_weighted]),
+            right=df_weights,
+            left_on="Message",
+            right_on="CLE_BOURRAGE",
+            how="inner",
+        )
+        df_opb = pd.DataFrame(
+            {
+                "Date": [opb_date],
+                "Duree_ponderee": [(df_tmp["Duree"] * df_tmp["COEFF"]).sum()],
+            }
+        )
+
+    # Duration and number of the Bourrage and Erreur IOB events
+    is_iob = evts["Message"].str.contains("Erreur IOB", na=False)
+    selected = evts["Message"].str.contains("Bourrage", na=False) | is_iob
+    df_bourrage_iob = pd.DataFrame(
+        columns=["Date", "Type", "Duree", "Nombre de défauts"]
+    )
+    if selected.any():
+        df_bourrage_iob = (
+            pd.DataFrame(
+                {
+                    "Date": evts.loc[selected, "Date heure de début"].min().date(),
+                    "Type": is_iob[selected].map({True: "IOB", False: "Bourrage"}),
+                    "Duree": hours[selected],
+                }
+            )
+            .groupby(["Date", "Type"])["Duree"]
+            .agg(["sum", "count"])
+            .rename(columns={"sum": "Duree", "count": "Nombre de défauts"})
+            .reset_index()
+        )
+    return df_opb, df_bourrage_iob, opb_date
+
+
+def recompute_opb(
+    connection, start_date: datetime.date, end_date: datetime.date
+) -> dict:
+    """Recompute OPB_LTH and OPB_Bourrage_LTH from LTH_Evt_defauts in the database.
+
+    One set-based statement per table replaces the aggregates of all the events
+    files dated in the range, without downloading nor parsing any of them. The
+    rows and the dates recorded in Dates_data are dated as by upload_opb.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        start_date (datetime.date): The first date.
+        end_date (datetime.date): The last date.
+
+    Returns:
+        dict: The number of rows written in each table, and of dates added to
+            Dates_data.
+    """
+    # The statements select the events by date, without scanning the table
+    ensure_key_index(connection, "LTH_Evt_defauts", ["Date"])
+    params = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+    counts = {}
+    try:
+        with connection.cursor() as cursor:
+            for table, query in RECOMPUTE_OPB_QUERIES.items():
+                cursor.execute(query, params)
+                counts[table] = cursor.rowcount
+            cursor.execute(OPB_DATES_QUERY, params)
+            dates = [date for (date,) in cursor.fetchall()]
+        counts["Dates_data"] = sum(
+            add_coverage_date(connection, date, data_type="OPB") for date in dates
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    invalidate_ingestion_status()
+    logging.info(f"Recomputed OPB from {start_date} to {end_date}: {counts}")
+    return counts
@@ -0,0 +1,210 @@
+import contextvars
+import cProfile
+import datetime
+import logging
+import os
+import pstats
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Profile the ingestion runs with cProfile, can also be switched from the sidebar
+PROFILE_UPLOADS = os.getenv("profile_uploads", "0") == "1"
+# Local directory of the profiles, by data type and date
+PROFILES_DIR = os.getenv(
+    "profiles_dir", os.path.join(tempfile.gettempdir(), "insertion_profiles")
+)
+# Number of functions of the profile reports
+PROFILE_TOP_FUNCTIONS = int(os.getenv("profile_top_functions", 20))
+
+_enabled = PROFILE_UPLOADS
+# A single profiler can be active at a time, since Python 3.12 in the whole process
+_profiler_lock = threading.Lock()
+# Profiles of the other threads of the block profiled by the current context
+_thread_profiles = contextvars.ContextVar("thread_profiles", default=None)
+
+
+def set_profiling(enabled: bool):
+    """Switch the profiling of the next ingestion runs of the process.
+
+    Args:
+        enabled (bool): Whether to profile them.
+    """
+    global _enabled
+    if enabled != _enabled:
+        logging.info(f"Profiling of the ingestion runs {'on' if enabled else 'off'}")
+    _enabled = enabled
+
+
+def profiling_enabled() -> bool:
+    """Check whether the ingestion runs are profiled."""
+    return _enabled
+
+
+def _safe_name(value) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(value))
+
+
+def _save_profile(profiles: list, data_type: str, date) -> str:
+    """Store profiles merged as pstats, with the report of their top functions next to it.
+
+    Returns:
+        str: The path of the pstats file, None when it could not be written.
+    """
+    directory = os.path.join(PROFILES_DIR, _safe_name(data_type), _safe_name(date))
+    path = os.path.join(directory, f"{datetime.datetime.now():%Y%m%d_%H%M%S_%f}.pstats")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        pstats.Stats(*profiles).dump_stats(path)
+        with open(path[: -len(".pstats")] + ".txt", "w", encoding="UTF-8") as file:
+            stats = pstats.Stats(path, stream=file)
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    except OSError as e:
+        logging.warning(f"Could not store the profile of {data_type}: {e}")
+        return None
+    logging.info(f"Profile of {data_type} {date} stored in {path}")
+    return path
+
+
+@contextmanager
+def profiled(data_type: str, date=None):
+    """Profile a block with cProfile, when profiling is enabled.
+
+    The threads started by the block are profiled too when they run functions
+    wrapped by bind_profile, e.g. by bind_ingestion_run, and their stats are
+    merged into the profile. The profile is stored in
+    PROFILES_DIR/<data type>/<date>/, as pstats (for pstats, snakeviz...) and
+    as a text report of its top functions. Blocks run while another one is
+    profiled are not profiled.
+
+    Args:
+        data_type (str): The data type ingested by the block.
+        date (datetime.date, optional): The date of the data. Defaults to None.
+
+    Yields:
+        dict | None: The "path" of the pstats file, set once the block ends,
+            None when the block is not profiled.
+    """
+    if not _enabled or not _profiler_lock.acquire(blocking=False):
+        yield None
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:
+        # E.g. a debugger or another profiling tool is active
+        _profiler_lock.release()
+        logging.warning(f"Could not profile {data_type}: {e}")
+        yield None
+        return
+
+    result = {"path": None}
+    thread_profiles = []
+    token = _thread_profiles.set(thread_profiles)
+    try:
+        yield result
+    finally:
+        profile.disable()
+        _thread_profiles.reset(token)
+        _profiler_lock.release()
+        result["path"] = _save_profile([profile, *thread_profiles], data_type, date)
+
+
+def bind_profile(function):
+    """Make a function run from another thread be part of the profile of the caller.
+
+    The thread must end before the profiled block does, for its stats to be
+    merged into the profile.
+
+    Args:
+        function (callable): The function, e.g. submitted to a thread pool.
+
+    Returns:
+        callable: The function, profiled when the caller is profiled.
+    """
+    thread_profiles = _thread_profiles.get()
+    if thread_profiles is None:
+        return function
+
+    def bound(*args, **kwargs):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Since Python 3.12 the profiler of the caller covers every thread
+            return function(*args, **kwargs)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            thread_profiles.append(profile)
+
+    return bound
+
+
+def top_functions(
+    path: str, limit: int = PROFILE_TOP_FUNCTIONS, sort: str = "cumulative"
+) -> list:
+    """Get the functions of a profile that took the most time.
+
+    Args:
+        path (str): The pstats file, see profiled.
+        limit (int, optional): The number of functions. Defaults to
+            PROFILE_TOP_FUNCTIONS.
+        sort (str, optional): The pstats sort key. Defaults to "cumulative".
+
+    Returns:
+        list: A dict by function with its "function" name, "location", number
+            of "calls", "own_seconds" and "cumulative_seconds".
+    """
+    stats = pstats.Stats(path).sort_stats(sort)
+    functions = []
+    for function in stats.fcn_list[:limit]:
+        _, calls, own_seconds, cumulative_seconds, _ = stats.stats[function]
+        filename, line, name = function
+        functions.append(
+            {
+                "function": name,
+                "location": f"{filename}:{line}",
+                "calls": calls,
+                "own_seconds": own_seconds,
+                "cumulative_seconds": cumulative_seconds,
+            }
+        )
+    return functions
+
+
+def list_profiles(limit: int = 20) -> list:
+    """Get the last stored profiles.
+
+    Args:
+        limit (int, optional): The number of profiles. Defaults to 20.
+
+    Returns:
+        list: A dict by profile with its "path", "data_type", "date" and
+            "created" datetime, the most recent first.
+    """
+    profiles = []
+    if not os.path.isdir(PROFILES_DIR):
+        return profiles
+    for data_type in os.scandir(PROFILES_DIR):
+        if not data_type.is_dir():
+            continue
+        for date in os.scandir(data_type.path):
+            if not date.is_dir():
+                continue
+            for entry in os.scandir(date.path):
+                if entry.name.endswith(".pstats"):
+                    profiles.append(
+                        {
+                            "path": entry.path,
+                            "data_type": data_type.name,
+                            "date": date.name,
+                            "created": datetime.datetime.fromtimestamp(
+                                entry.stat().st_mtime
+                            ),
+                        }
+                    )
+    profiles.sort(key=lambda profile: profile["created"], reverse=True)
+    return profiles[:limit]
@@ -0,0 +1,335 @@
+import datetime
+import logging
+import os
+import threading
+import time
+
+from psycopg2 import errors, sql
+
+from src.utilsDB import pooled_connection, remove_duplicate_rows
+from src.utilsMetrics import timed_stage
+
+# Seconds during which the ingestion status is reused without querying Dates_data
+STATUS_TTL = float(os.getenv("ingestion_status_ttl", 60))
+
+# Number of missing dates kept by data type in the ingestion status
+MISSING_DATES_SHOWN = 5
+
+# The data types shown by the upload pages, fetched together
+STATUS_DATA_TYPES = [
+    "OPB",
+    "Injection_haut",
+    "Injection_bas",
+    "Trafic_par_sortie_trieur_haut",
+    "Trafic_par_sortie_trieur_bas",
+    "Temps_fonctionnement",
+    "Qualité_de_tri",
+    "Interventions",
+    "Mvt_stock",
+    "Etat_stock",
+    "Poids_carbone",
+]
+
+# Key of Dates_data, a date being recorded once per site and data type
+COVERAGE_KEY = ["Site", "Data_type", "Date"]
+
+# Dates_data is created by the coverage schema on a new database
+CREATE_DATES_DATA_QUERY = """
+    CREATE TABLE IF NOT EXISTS {schema}."Dates_data" (
+        "Site" text, "Data_type" text, "Date" date
+    )
+"""
+
+# Managed schema of the ingestion status, see ensure_coverage_schema: indexes of
+# Dates_data, and the calendar Jours_ouvrables of the Monday to Saturday that are
+# not public holidays, precomputed from 2023 to the end of next year
+COVERAGE_SCHEMA_QUERIES = [
+    # The most recent dates of all the data types, for the expected dates
+    """
+    CREATE INDEX IF NOT EXISTS "ix_Dates_data_site_date"
+    ON {schema}."Dates_data" ("Site", "Date")
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS {schema}."Jours_ouvrables" ("Date" date PRIMARY KEY)
+    """,
+    # Holidays may be added to french_public_holidays after the calendar
+    """
+    DELETE FROM {schema}."Jours_ouvrables"
+    WHERE "Date" IN (SELECT holiday_date::date FROM french_public_holidays)
+    """,
+    """
+    INSERT INTO {schema}."Jours_ouvrables" ("Date")
+    SELECT series.date::date
+    FROM generate_series(
+        '2023-01-01'::date,
+        date_trunc('year', CURRENT_DATE) + '2 years'::interval - '1 day'::interval,
+        '1 day'::interval
+    ) AS series (date)
+    LEFT JOIN french_public_holidays
+        ON series.date = french_public_holidays.holiday_date
+    WHERE extract(dow FROM series.date) BETWEEN 1 AND 6
+    AND french_public_holidays.holiday_date IS NULL
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+# The Monday to Saturday that are not public holidays, from a start date to
+# yesterday
+WORKING_DAYS_QUERY = """
+    SELECT series.date::date
+    FROM generate_series({start}, CURRENT_DATE - 1, '1 day'::interval)
+        AS series (date)
+    LEFT JOIN french_public_holidays
+        ON series.date = french_public_holidays.holiday_date
+    WHERE extract(dow FROM series.date) BETWEEN 1 AND 6
+    AND french_public_holidays.holiday_date IS NULL
+"""
+
+# The working days of Jours_ouvrables, followed by those generated after its last
+# day once the precomputed calendar is over
+CALENDAR_QUERY = """
+    SELECT "Date"
+    FROM public."Jours_ouvrables"
+    WHERE "Date" < CURRENT_DATE
+    UNION
+""" + WORKING_DAYS_QUERY.format(
+    start="""(
+        SELECT COALESCE(max("Date") + 1, '2023-01-01'::date)
+        FROM public."Jours_ouvrables"
+    )"""
+)
+
+# The working days generated on every call, without the coverage schema
+GENERATED_CALENDAR_QUERY = WORKING_DAYS_QUERY.format(start="'2023-01-01'::date")
+
+# Last date and missing dates of several data types in one round trip. The
+# expected dates are those of any data type, of LTH_Reporting, and the days of
+# the calendar, without the Sundays. With the coverage schema, each lookup of
+# Dates_data is a probe of its unique index.
+STATUS_QUERY = """
+    WITH data_types AS (
+        SELECT unnest(%(data_types)s::text[]) AS "Data_type"
+    ),
+    expected AS (
+        SELECT DISTINCT "Date"
+        FROM public."Dates_data"
+        WHERE "Site" = 'LTH'
+        UNION
+        SELECT "Date"::date
+        FROM public."LTH_Reporting"
+        UNION
+        {calendar}
+    ),
+    missing AS (
+        SELECT data_types."Data_type", expected."Date", row_number() OVER (
+            PARTITION BY data_types."Data_type" ORDER BY expected."Date" DESC
+        ) AS rank
+        FROM data_types
+        CROSS JOIN expected
+        WHERE expected."Date" >= '2023-01-01'
+        AND extract(dow FROM expected."Date") <> 0
+        AND NOT EXISTS (
+            SELECT 1 FROM public."Dates_data"
+            WHERE "Site" = 'LTH'
+            AND "Data_type" = data_types."Data_type"
+            AND "Date" = expected."Date"
+        )
+    )
+    SELECT 'last', "Data_type", (
+        SELECT max("Date") FROM public."Dates_data"
+        WHERE "Site" = 'LTH' AND "Data_type" = data_types."Data_type"
+    )
+    FROM data_types
+    UNION ALL
+    SELECT 'missing', "Data_type", "Date"
+    FROM missing
+    WHERE %(limit)s::int IS NULL OR rank <= %(limit)s::int
+"""
+
+
+def ensure_coverage_schema(connection, schema: str = "public"):
+    """Create the unique key and the indexes of Dates_data, and the calendar.
+
+    The duplicates that Dates_data accumulated before having a unique key are
+    removed first. This is a migration, run by migrate_coverage.py and not by the
+    upload pages, which work without it.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        schema (str, optional): The schema. Defaults to "public".
+    """
+    target = sql.Identifier(schema)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql.SQL(CREATE_DATES_DATA_QUERY).format(schema=target))
+            cursor.execute(
+                "SELECT to_regclass(%s)", (f'"{schema}"."ux_Dates_data_key"',)
+            )
+            has_key = cursor.fetchone()[0] is not None
+        connection.commit()
+        if not has_key:
+            remove_duplicate_rows(connection, "Dates_data", COVERAGE_KEY, schema)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {}.{} ({})").format(
+                    sql.Identifier("ux_Dates_data_key"),
+                    target,
+                    sql.Identifier("Dates_data"),
+                    sql.SQL(", ").join(sql.Identifier(k) for k in COVERAGE_KEY),
+                )
+            )
+            for query in COVERAGE_SCHEMA_QUERIES:
+                cursor.execute(sql.SQL(query).format(schema=target))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    logging.info(f"Ensured the coverage schema of {schema}.Dates_data")
+
+
+def add_coverage_date(
+    connection, date, data_type: str, site: str = "LTH", schema: str = "public"
+) -> bool:
+    """Record a date of a data type in Dates_data, unless it is already there.
+
+    The date is only deduplicated once Dates_data has its unique key, see
+    ensure_coverage_schema.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        date (datetime.date): The date to add.
+        data_type (str): The type of data.
+        site (str, optional): The site. Defaults to "LTH".
+        schema (str, optional): The schema. Defaults to "public".
+
+    Returns:
+        bool: Whether the date was added.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql.SQL("""
+                INSERT INTO {}.{} ("Site", "Data_type", "Date") VALUES (%s, %s, %s)
+                ON CONFLICT DO NOTHING
+                """).format(sql.Identifier(schema), sql.Identifier("Dates_data")),
+            (site, data_type, date),
+        )
+        return cursor.rowcount > 0
+
+
+_status_lock = threading.Lock()
+_status = {"last": {}, "missing": {}, "data_types": (), "loaded_at": None}
+
+
+def fetch_ingestion_status(connection, data_types: list, limit: int = None) -> dict:
+    """Get the last date and the missing dates of several data types.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        data_types (list): The data types.
+        limit (int, optional): The number of most recent missing dates kept by
+            data type. Defaults to all of them.
+
+    Returns:
+        dict: The last date of each loaded data type under "last", and the
+            missing dates of each data type, most recent first, under "missing".
+    """
+    status = {"last": {}, "missing": {data_type: [] for data_type in data_types}}
+    params = {"data_types": list(data_types), "limit": limit}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(STATUS_QUERY.format(calendar=CALENDAR_QUERY), params)
+            rows = cursor.fetchall()
+    except errors.UndefinedTable:
+        connection.rollback()
+        logging.warning(
+            "Jours_ouvrables is missing, run migrate_coverage.py: "
+            "generating the calendar of the ingestion status"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                STATUS_QUERY.format(calendar=GENERATED_CALENDAR_QUERY), params
+            )
+            rows = cursor.fetchall()
+    for kind, data_type, date in rows:
+        if kind == "last":
+            if date is not None:
+                status["last"][data_type] = date
+        else:
+            status["missing"][data_type].append(date)
+    for dates in status["missing"].values():
+        dates.sort(reverse=True)
+    return status
+
+
+def _copy_status() -> dict:
+    """Copy the cached ingestion status, the caller holding _status_lock."""
+    return {
+        "last": dict(_status["last"]),
+        "missing": {
+            data_type: list(dates) for data_type, dates in _status["missing"].items()
+        },
+    }
+
+
+def get_ingestion_status(data_type: str) -> dict:
+    """Get the ingestion status of the upload pages, cached for STATUS_TTL seconds.
+
+    The status of all the data types of STATUS_DATA_TYPES, and of any other data
+    type asked before, is fetched in one query whenever it expired or was
+    invalidated by a new date in Dates_data.
+
+    Args:
+        data_type (str): The data type needed by the caller.
+
+    Returns:
+        dict: The "last" date and the MISSING_DATES_SHOWN "missing" dates of the
+            data types, see fetch_ingestion_status, copied from the cache.
+    """
+    now = time.monotonic()
+    with _status_lock:
+        if (
+            _status["loaded_at"] is not None
+            and now - _status["loaded_at"] < STATUS_TTL
+            and data_type in _status["data_types"]
+        ):
+            return _copy_status()
+        data_types = tuple(
+            dict.fromkeys([*STATUS_DATA_TYPES, *_status["data_types"], data_type])
+        )
+
+    with pooled_connection() as (connection, _):
+        status = fetch_ingestion_status(connection, data_types, MISSING_DATES_SHOWN)
+    logging.info(f"Loaded the ingestion status of {len(data_types)} data types")
+    with _status_lock:
+        _status.update(status, data_types=data_types, loaded_at=now)
+        return _copy_status()
+
+
+def invalidate_ingestion_status():
+    """Forget the cached ingestion status, e.g. after adding a date to Dates_data."""
+    with _status_lock:
+        _status["loaded_at"] = None
+
+
+def add_date_data(
+    connection,
+    engine,
+    date: datetime.date,
+    data_type: str,
+    site: str = "LTH",
+    schema: str = "public",
+):
+    """Add a new date to the Dates_data table, unless it is already there.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        date (datetime.date): The date to add.
+        data_type (str): The type of data.
+        site (str, optional): The site. Defaults to "LTH".
+        schema (str, optional): The schema. Defaults to "public".
+    """
+    with timed_stage("add_date_data"):
+        add_coverage_date(connection, date, data_type, site=site, schema=schema)
+        connection.commit()
+    invalidate_ingestion_status()
@@ -0,0 +1,29 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def postgres_server(tmp_path_factory):
+    """A throwaway PostgreSQL server, skipping the tests without pgserver."""
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(tmp_path_factory.mktemp("pgdata"), cleanup_mode="stop")
+    yield server
+    server.cleanup()
+
+
+@pytest.fixture
+def database(postgres_server):
+    """A connection and an engine to an empty database of the test server."""
+    psycopg2 = pytest.importorskip("psycopg2")
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+
+    uri = postgres_server.get_uri()
+    connection = psycopg2.connect(uri)
+    with connection.cursor() as cursor:
+        cursor.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    connection.commit()
+    engine = sqlalchemy.create_engine(
+        uri.replace("postgresql://", "postgresql+psycopg2://")
+    )
+    yield connection, engine
+    engine.dispose()
+    connection.close()
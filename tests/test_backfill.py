@@ -0,0 +1,62 @@
+import contextlib
+import datetime
+
+import pytest
+
+import backfill
+import src.utilsDB as utilsDB
+from view import uploads
+
+DAY = datetime.date(2024, 7, 16)
+FILES = backfill.BACKFILL_TYPES["Injection"]["files"]
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    calls = []
+
+    @contextlib.contextmanager
+    def pooled_connection():
+        yield None, None
+
+    def add_date_data(connection, engine, date, data_type, site):
+        calls.append(("coverage", data_type))
+
+    def write_injection_par_jour(connection, date, total):
+        calls.append(("injection_par_jour", total))
+
+    def run_pipeline(name, date, connection, engine, frames=None):
+        calls.append(("pipeline", name))
+
+    monkeypatch.setattr(utilsDB, "pooled_connection", pooled_connection)
+    monkeypatch.setattr(
+        uploads, "ingestion_run", lambda *args: contextlib.nullcontext()
+    )
+    monkeypatch.setattr(uploads, "add_date_data", add_date_data)
+    monkeypatch.setattr(uploads, "write_injection_par_jour", write_injection_par_jour)
+    monkeypatch.setattr(uploads, "run_pipeline", run_pipeline)
+    monkeypatch.setattr(backfill, "total_injecte", lambda df: 5)
+    return calls
+
+
+def test_injection_coverage_is_recorded_after_the_writes(writes):
+    backfill.write_day("Injection", DAY, {file: None for file in FILES}, {})
+
+    assert writes == [
+        ("injection_par_jour", 10),
+        ("pipeline", "Injections_antennes"),
+        ("coverage", "Injection_haut"),
+        ("coverage", "Injection_bas"),
+    ]
+
+
+def test_failed_injection_write_does_not_mark_the_day_done(writes, monkeypatch):
+    def run_pipeline(name, date, connection, engine, frames=None):
+        raise RuntimeError("COPY failed")
+
+    monkeypatch.setattr(uploads, "run_pipeline", run_pipeline)
+    with pytest.raises(RuntimeError):
+        backfill.write_day("Injection", DAY, {file: None for file in FILES}, {})
+
+    assert ("coverage", "Injection_haut") not in writes
+    assert ("coverage", "Injection_bas") not in writes
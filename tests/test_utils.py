@@ -0,0 +1,363 @@
+import datetime
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils_folder import utils
+
+
+def baseline_clean_data(df_evt):
+    """clean_data before its vectorization, kept verbatim as the reference."""
+    data_clean = df_evt.copy()
+    data_clean = data_clean[
+        (data_clean["Machine"] != "354050ZP0005")
+        & (data_clean["Machine"] != "354050ZL0001")
+        & (data_clean["Machine"] != "TPGD-REN-ARC")
+        & (data_clean["Machine"] != "API API Non-Meca")
+        & (data_clean["Machine"] != "TPGD-REN-SUP1")
+        & (data_clean["Machine"] != "TPGD-REN-SUP2")
+        & (data_clean["Machine"] != "PFC-REN-PNM1")
+        & (data_clean["Machine"] != "PFC-REN-PNM2")
+    ]
+    data_clean["Date heure de début"] = data_clean["Date heure de début"].apply(
+        lambda x: (
+            x
+            if (x.time().strftime("%H:%M:%S")) >= "05:00:00"
+            else x - datetime.timedelta(days=1)
+        )
+    )
+    data_clean["Jour_de_la_semaine"] = data_clean["Date heure de début"].apply(
+        lambda x: x.weekday()
+    )
+    data_clean["Heure_debut_defaut"] = data_clean["Date heure de début"].apply(
+        lambda x: x.time().strftime("%H:%M:%S")
+    )
+    data_clean["Heure"] = data_clean["Date heure de début"].apply(lambda x: x.hour)
+    data_clean = data_clean[
+        ~data_clean["Message"].str.contains("Douchette")
+    ].reset_index(drop=True)
+    data_clean = data_clean[~data_clean["Message"].str.contains("connexion")]
+    data_clean = data_clean[~data_clean["Message"].str.contains("tâche")]
+    data_clean = data_clean[~data_clean["Message"].str.lower().str.contains("mode")]
+    data_clean = data_clean[~data_clean["Message"].str.contains("Sql")].reset_index(
+        drop=True
+    )
+    data_clean["Message_clean"] = data_clean["Message"]
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"plateau \d+", "plateau", x).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"sortie \d+ et \d+", "sortie", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"sortie \d+_\d+", "sortie", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"sortie \d+", "sortie", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"glacis \d+", "glacis", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"convoyeur \d+", "convoyeur", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"connecteur \d+", "connecteur", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"flap \d+", "flap", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"quai \d+", "quai", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"caljan \d+", "caljan", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"bf\d+", "bf", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"pic \d+", "pic", x.lower()).strip()
+    )
+    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
+        lambda x: re.sub(r"urgence au\d+", "urgence au", x.lower()).strip()
+    )
+
+    data_clean["Temps_def"] = (
+        data_clean["Date heure de fin"] - data_clean["Date heure de début"]
+    )
+    data_clean["Temps_def"] = data_clean["Temps_def"].dt.seconds
+    # unit="S" of the former function, removed from recent pandas versions
+    data_clean["Temps_def_delta"] = pd.to_timedelta(data_clean["Temps_def"], unit="s")
+
+    data_clean["Equipe"] = "Temp"
+
+    data_clean.loc[
+        (
+            (data_clean["Jour_de_la_semaine"] > 0)
+            & (data_clean["Heure_debut_defaut"] < "12:30:00")
+        )
+        & (
+            (data_clean["Jour_de_la_semaine"] > 0)
+            & (data_clean["Heure_debut_defaut"] > "05:00:00")
+        ),
+        "Equipe",
+    ] = "Matin"
+
+    data_clean.loc[
+        (
+            (data_clean["Jour_de_la_semaine"] < 5)
+            & (data_clean["Heure_debut_defaut"] < "19:30:00")
+        )
+        & (
+            (data_clean["Jour_de_la_semaine"] < 5)
+            & (data_clean["Heure_debut_defaut"] > "12:30:00")
+        ),
+        "Equipe",
+    ] = "Apres-midi"
+
+    data_clean.loc[
+        (
+            (data_clean["Jour_de_la_semaine"] == 5)
+            & (data_clean["Heure_debut_defaut"] < "20:30:00")
+        )
+        & (
+            (data_clean["Jour_de_la_semaine"] == 5)
+            & (data_clean["Heure_debut_defaut"] > "12:30:00")
+        ),
+        "Equipe",
+    ] = "Apres-midi"
+
+    data_clean.loc[
+        (
+            (data_clean["Jour_de_la_semaine"] < 5)
+            & (data_clean["Heure_debut_defaut"] > "19:30:00")
+        )
+        | (
+            (data_clean["Jour_de_la_semaine"] > 0)
+            & (data_clean["Heure_debut_defaut"] < "05:00:00")
+        ),
+        "Equipe",
+    ] = "Soir"
+
+    data_clean.loc[
+        (data_clean["Jour_de_la_semaine"] == 0)
+        & (data_clean["Heure_debut_defaut"] < "12:30:00"),
+        "Equipe",
+    ] = "Normalement pas de défaut"
+    data_clean = data_clean.loc[
+        ~data_clean["Message"].str.contains("Fin :")
+    ].reset_index(drop=True)
+    return data_clean, len(data_clean)
+
+
+MESSAGES = [
+    # The 13 rewrites of numbered equipments
+    "Défaut plateau 12 sur Plateau 7",
+    "Saturation sortie 3 et 4",
+    "Bourrage sortie 12_3",
+    "Sortie 45 pleine",
+    "Glacis 2 bloqué",
+    "Arrêt convoyeur 17",
+    "Défaut connecteur 3",
+    "Flap 8 en défaut",
+    "Quai 4 fermé",
+    "Caljan 2 hors service",
+    "Défaut BF12",
+    "PIC 3 en défaut",
+    "Arrêt d'urgence AU12",
+    # Several numbers of the same equipment, as the successive rewrites saw them
+    "Sortie 1 et 2 3_4 5 saturée",
+    "sortie 3_4 et 5",
+    "Sortie 1 et 2_3",
+    "  Glacis 1 et convoyeur 2 et bf3  ",
+    # Excluded messages
+    "Douchette 3 déconnectée",
+    "Perte de connexion",
+    "Fin de tâche",
+    "Passage en MODE manuel",
+    "Erreur Sql",
+    "Fin : défaut plateau",
+]
+
+START_TIMES = [
+    "05:00:00",
+    "04:59:59",
+    "13:00:00",
+    "21:00:00",
+    "23:59:59",
+    "00:00:00",
+    "12:30:00",
+    "19:30:00",
+    "20:30:00",
+    "12:29:59",
+]
+
+MACHINES = ["TRIEUR HAUT", "354050ZP0005", "TRIEUR BAS", "PFC-REN-PNM2"]
+
+
+def opb_events() -> pd.DataFrame:
+    """Events of every message at every shift boundary, over a whole week."""
+    rows = []
+    monday = datetime.date(2024, 7, 15)
+    for day in range(8):
+        for i, start_time in enumerate(START_TIMES):
+            debut = datetime.datetime.combine(
+                monday + datetime.timedelta(days=day),
+                datetime.time.fromisoformat(start_time),
+            )
+            for j, message in enumerate(MESSAGES):
+                rows.append(
+                    {
+                        "Machine": MACHINES[(i + j + day) % len(MACHINES)],
+                        "Message": message,
+                        "Date heure de début": debut,
+                        "Date heure de fin": debut
+                        + datetime.timedelta(seconds=30 * (i + j + 1)),
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+def test_clean_data_matches_the_former_implementation():
+    df_evt = opb_events()
+
+    expected, expected_count = baseline_clean_data(df_evt)
+    result, count = utils.clean_data(df_evt)
+
+    assert count == expected_count
+    assert set(result["Machine"]).isdisjoint(utils.EXCLUDED_MACHINES)
+    assert set(result["Equipe"]) == {
+        "Normalement pas de défaut",
+        "Soir",
+        "Apres-midi",
+        "Matin",
+        "Temp",
+    }
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_clean_data_normalises_the_equipment_numbers():
+    df_evt = opb_events()
+    result, _ = utils.clean_data(df_evt)
+    messages = dict(zip(result["Message"], result["Message_clean"]))
+
+    assert messages["Défaut plateau 12 sur Plateau 7"] == "défaut plateau sur plateau 7"
+    assert messages["Saturation sortie 3 et 4"] == "saturation sortie"
+    assert messages["Bourrage sortie 12_3"] == "bourrage sortie"
+    assert messages["Sortie 45 pleine"] == "sortie pleine"
+    assert messages["Sortie 1 et 2 3_4 5 saturée"] == "sortie saturée"
+    assert messages["Défaut BF12"] == "défaut bf"
+    assert messages["Arrêt d'urgence AU12"] == "arrêt d'urgence au"
+    assert messages["  Glacis 1 et convoyeur 2 et bf3  "] == "glacis et convoyeur et bf"
+
+
+EVT_MESSAGES = {
+    "Défaut Item-On-Cover plateau 12 IOC3": {
+        "IOC": {"Plateau": "12", "Ilot": 3},
+    },
+    "Défaut de déchargement plateau 4 ilot 2 sortie 17": {
+        "Déchargement_plateau": {"Plateau": "4", "Ilot": 2, "Sortie": "17"},
+    },
+    "Défaut de déclenchement plateau 5 Ilot 6": {
+        "Déclenchement_plateau": {"Plateau": "5", "Ilot": 6, "Sortie": ValueError},
+    },
+    # Of the three types sharing the "défaut plateau" prefix
+    "Défaut plateau 7 non aligné NAT1 manquant détecté sur cellule MTS2 basculé sur TTS3": {
+        "NAT": {"Plateau": "7", "Ilot": 1},
+        "MTS": {"Plateau": "7", "Ilot": 2},
+        "TTS": {"Plateau": "7", "Ilot": 3},
+    },
+    # Also an appearance on a plateau, found anywhere in the message
+    "Défaut de bourrage injecteur 8 cellule C2B apparition sur plateau 9 SPS 4": {
+        "Bourrage": {"Injecteur": 8, "Cellule": "c2b"},
+        "Apparition_plateau": {"Plateau": "9", "SPS": 4},
+    },
+    "Défaut disparition sur la bande injecteur 11": {
+        "Disparition_bande": {"Injecteur": 11},
+    },
+    "Défaut apparition sur la bande Injecteur 12": {
+        "Apparition_bande": {"Injecteur": 12},
+    },
+    "Info apparition sur plateau sps 5": {
+        "Apparition_plateau": {"Plateau": ValueError, "SPS": 5},
+    },
+    # Case sensitive like the former startswith on the message
+    "défaut item-on-cover plateau 1 IOC1": {},
+    "Arrêt d'urgence AU2": {},
+}
+
+
+def test_evts_are_classified_in_every_type_they_match():
+    df_evt = pd.DataFrame({"Message": list(EVT_MESSAGES)})
+
+    evt_types = utils.classify_evts(df_evt)
+
+    assert list(evt_types.columns) == list(utils.EVT_TYPE_PATTERNS)
+    for (message, expected), (_, row) in zip(
+        EVT_MESSAGES.items(), evt_types.iterrows()
+    ):
+        assert set(row.index[row]) == set(expected), message
+
+
+def test_evt_fields_are_extracted_by_type(monkeypatch):
+    date = datetime.date(2024, 7, 16)
+    df_evt = pd.DataFrame(
+        {"Date": date, "Message": list(EVT_MESSAGES), "# Occurrences": 1}
+    )
+    no_totals = pd.DataFrame(
+        {"Date": pd.Series(dtype=object), "Total injecté": pd.Series(dtype=float)}
+    )
+    monkeypatch.setattr(
+        utils,
+        "get_injection_totals",
+        lambda: {
+            "SPS": no_totals.assign(SPS=pd.Series(dtype=float)),
+            "Antenne": no_totals.assign(Antenne=pd.Series(dtype=float)),
+        },
+    )
+
+    evts_by_type = utils.get_evts_by_types(df_evt)
+
+    for type_evt in utils.EVT_TYPE_FIELDS:
+        expected = {
+            message: types[type_evt]
+            for message, types in EVT_MESSAGES.items()
+            if type_evt in types
+        }
+        df_result = evts_by_type[type_evt].set_index("Message")
+        assert sorted(df_result.index) == sorted(expected), type_evt
+        for message, fields in expected.items():
+            for field, value in fields.items():
+                assert df_result.loc[message, field] == value, (type_evt, field)
+
+
+def test_injection_days_without_events_count_as_days_without_defects(monkeypatch):
+    days = [datetime.date(2024, 7, day) for day in (15, 16, 17)]
+    df_evt = pd.DataFrame(
+        {
+            "Date": [days[0], days[1], days[1]],
+            "Message": ["Défaut plateau 7 non aligné NAT3"] * 3,
+            "# Occurrences": [2, 1, 3],
+        }
+    )
+    totals = pd.DataFrame(
+        {"Date": days, "SPS": [3.0] * 3, "Total injecté": [100.0, 200.0, 50.0]}
+    )
+    monkeypatch.setattr(
+        utils,
+        "get_injection_totals",
+        lambda: {"SPS": totals, "Antenne": totals.rename(columns={"SPS": "Antenne"})},
+    )
+
+    evts_by_type = utils.get_evts_by_types(df_evt, ["NAT"])
+    corr = utils.get_evts_injection_corr(evts_by_type)["NAT"]
+
+    nat = evts_by_type["NAT"]
+    injection_only = nat.loc[nat["Date"] == days[2]]
+    assert injection_only["Ilot"].tolist() == [3]
+    assert injection_only["Message"].isna().all()
+    expected = np.corrcoef([2, 4, 0], [100, 200, 50])[0, 1]
+    assert corr.loc[(3, "# Occurrences"), "Total injecté"] == pytest.approx(expected)
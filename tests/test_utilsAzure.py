@@ -0,0 +1,106 @@
+import os
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError, ServiceRequestError
+
+import src.utilsAzure as utilsAzure
+
+
+class RecordingContainerClient(utilsAzure.LocalContainerClient):
+    """LocalContainerClient recording whether each download transferred the blob."""
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.downloads = []
+
+    def download_blob(self, blob, etag=None, match_condition=None, **kwargs):
+        try:
+            downloaded = super().download_blob(blob, etag, match_condition, **kwargs)
+        except utilsAzure.ResourceNotModifiedError:
+            self.downloads.append((blob, 304))
+            raise
+        except ResourceNotFoundError:
+            self.downloads.append((blob, 404))
+            raise
+        self.downloads.append((blob, 200))
+        return downloaded
+
+
+@pytest.fixture
+def container(tmp_path, monkeypatch):
+    client = RecordingContainerClient(str(tmp_path / "container"))
+    monkeypatch.setattr(utilsAzure, "_container_client", client)
+    monkeypatch.setattr(utilsAzure, "BLOB_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(utilsAzure, "BLOB_CACHE_MAX_BYTES", 1024)
+    return client
+
+
+def write_blob(client, blob_name: str, content: bytes):
+    path = client._path(blob_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(content)
+
+
+def is_cached(blob_name: str) -> bool:
+    return utilsAzure._read_cache(blob_name) != (None, None)
+
+
+def test_cache_hit_is_revalidated_without_transfer(container):
+    write_blob(container, "2024/07/16/a.xlsx", b"content a")
+
+    assert utilsAzure.fetch_blob("2024/07/16/a.xlsx") == b"content a"
+    assert utilsAzure.fetch_blob("2024/07/16/a.xlsx") == b"content a"
+    assert container.downloads == [
+        ("2024/07/16/a.xlsx", 200),
+        ("2024/07/16/a.xlsx", 304),
+    ]
+
+
+def test_changed_blob_is_downloaded_again(container):
+    write_blob(container, "a.xlsx", b"old")
+    utilsAzure.fetch_blob("a.xlsx")
+    write_blob(container, "a.xlsx", b"new content")
+
+    assert utilsAzure.fetch_blob("a.xlsx") == b"new content"
+    assert utilsAzure._read_cache("a.xlsx")[1] == b"new content"
+    assert container.downloads == [("a.xlsx", 200), ("a.xlsx", 200)]
+
+
+def test_least_recently_used_blobs_are_evicted(container, monkeypatch):
+    monkeypatch.setattr(utilsAzure, "BLOB_CACHE_MAX_BYTES", 25)
+    for name in ["a", "b", "c"]:
+        write_blob(container, name, name.encode() * 10)
+    utilsAzure.fetch_blob("a")
+    utilsAzure.fetch_blob("b")
+    os.utime(utilsAzure._cache_paths("a")[0], (1000, 1000))
+    os.utime(utilsAzure._cache_paths("b")[0], (2000, 2000))
+
+    # Using a makes b the least recently used blob
+    utilsAzure.fetch_blob("a")
+    utilsAzure.fetch_blob("c")
+
+    assert is_cached("a")
+    assert not is_cached("b")
+    assert is_cached("c")
+
+
+def test_deleted_blob_is_removed_from_the_cache(container):
+    write_blob(container, "a.xlsx", b"content a")
+    utilsAzure.fetch_blob("a.xlsx")
+    os.remove(container._path("a.xlsx"))
+
+    with pytest.raises(ResourceNotFoundError):
+        utilsAzure.fetch_blob("a.xlsx")
+    assert not is_cached("a.xlsx")
+    assert utilsAzure.get_Azure_file_bytes("a.xlsx") is None
+
+
+def test_download_errors_are_not_reported_as_missing_blobs(container, monkeypatch):
+    def download_blob(blob, **kwargs):
+        raise ServiceRequestError("Connection refused")
+
+    monkeypatch.setattr(container, "download_blob", download_blob)
+
+    with pytest.raises(ServiceRequestError):
+        utilsAzure.get_Azure_file_bytes("a.xlsx")
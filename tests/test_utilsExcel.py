@@ -0,0 +1,106 @@
+import datetime
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.utilsAzure as utilsAzure
+import src.utilsExcel as utilsExcel
+from src.utilsExcel import times_to_seconds
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [
+        ("01:30:00", 5400.0),
+        ("1:02:03", 3723.0),
+        ("00:00:01.5", 1.5),
+        (datetime.time(1, 2, 3), 3723.0),
+        ("2 jours 01:30:00", 2 * 86400 + 5400.0),
+        ("1 jour 00:00:30", 86430.0),
+        ("3 days 02:00:00", 3 * 86400 + 7200.0),
+        ("1 day, 0:00:10", 86410.0),
+        (pd.Timedelta(days=1, hours=2, seconds=0.25), 93600.25),
+        ("", 86400.0),
+        (None, 86400.0),
+        (np.nan, 86400.0),
+        ("25:00:00", 86400.0),
+        ("12:61:00", 86400.0),
+        ("2 semaines 01:00:00", 86400.0),
+        ("abc", 86400.0),
+    ],
+)
+def test_times_to_seconds(value, seconds):
+    result = times_to_seconds(pd.Series([value], dtype=object))
+
+    assert result.dtype == float
+    assert result.iloc[0] == pytest.approx(seconds)
+
+
+def test_times_to_seconds_default_value():
+    result = times_to_seconds(pd.Series(["00:01:00", "", "n/a"]), default_value=0)
+
+    assert result.tolist() == [60.0, 0.0, 0.0]
+
+
+QUALITE_TRI = "Qualité_de_tri.xlsx"
+DAY = datetime.date(2024, 7, 16)
+
+
+@pytest.fixture
+def container(tmp_path, monkeypatch):
+    client = utilsAzure.LocalContainerClient(str(tmp_path / "container"))
+    monkeypatch.setattr(utilsAzure, "_container_client", client)
+    monkeypatch.setattr(utilsAzure, "BLOB_CACHE_DIR", str(tmp_path / "cache"))
+    return client
+
+
+def qualite_tri_workbook(total: int) -> bytes:
+    rows = pd.DataFrame(
+        {
+            "Trieur": ["Haut"],
+            "Tri/contrôle ou rejet": ["Tri"],
+            "Type de tri/contrôle/rejet": ["Sortie"],
+            "Détail de tri/rejet": ["Trié"],
+            "Nb total colis": [total],
+            "Nb de colis en bac": [total],
+            "En pourcentage": [100.0],
+        }
+    )
+    buffer = io.BytesIO()
+    rows.to_excel(buffer, startrow=3, index=False)
+    return buffer.getvalue()
+
+
+def stored_bytes(client) -> bytes:
+    with open(
+        client._path(utilsExcel.extraction_blob_name(DAY, QUALITE_TRI)), "rb"
+    ) as file:
+        return file.read()
+
+
+def test_malformed_upload_keeps_the_stored_extraction(container):
+    good = qualite_tri_workbook(10)
+    utilsExcel.store_extraction(DAY, QUALITE_TRI, good)
+
+    with pytest.raises(Exception):
+        utilsExcel.store_extraction(DAY, QUALITE_TRI, b"not a workbook")
+
+    assert stored_bytes(container) == good
+    assert utilsExcel.read_extraction(DAY, QUALITE_TRI)["Nb total colis"].tolist() == [
+        10
+    ]
+
+
+def test_stored_extraction_is_read_from_its_sidecar(container, monkeypatch):
+    utilsExcel.store_extraction(DAY, QUALITE_TRI, qualite_tri_workbook(10))
+    utilsExcel.store_extraction(DAY, QUALITE_TRI, qualite_tri_workbook(20))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the sidecar should be up to date")
+
+    monkeypatch.setitem(utilsExcel.EXTRACTION_READERS, QUALITE_TRI, fail)
+    assert utilsExcel.read_extraction(DAY, QUALITE_TRI)["Nb total colis"].tolist() == [
+        20
+    ]
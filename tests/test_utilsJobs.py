@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import src.utilsJobs as utilsJobs
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(utilsJobs, "JOBS_DATABASE", str(tmp_path / "jobs.sqlite"))
+    monkeypatch.setattr(utilsJobs, "JOB_WORKERS", 2)
+    monkeypatch.setattr(utilsJobs, "_executor", None)
+    monkeypatch.setattr(utilsJobs, "_key_queues", {})
+    yield
+    if utilsJobs._executor is not None:
+        utilsJobs._executor.shutdown(wait=True)
+
+
+def wait_for(job_ids: list, statuses=(utilsJobs.DONE,), timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        states = utilsJobs.get_jobs(job_ids)
+        if all(job["status"] in statuses for job in states):
+            return states
+        time.sleep(0.01)
+    raise AssertionError(f"Jobs not finished: {utilsJobs.get_jobs(job_ids)}")
+
+
+def test_queued_same_key_jobs_do_not_hold_the_workers(jobs):
+    release = threading.Event()
+    order = []
+
+    def write(name):
+        if name == "first":
+            assert release.wait(10)
+        order.append(name)
+        return name
+
+    same_key = [
+        utilsJobs.submit_job(name, write, name, lock_key="table")
+        for name in ["first", "second", "third"]
+    ]
+    other = utilsJobs.submit_job("other", write, "other", lock_key="other_table")
+
+    # Two workers: the waiting same-key jobs must leave one for the other upload
+    wait_for([other])
+    assert [job["status"] for job in utilsJobs.get_jobs(same_key)] == [
+        utilsJobs.RUNNING,
+        utilsJobs.QUEUED,
+        utilsJobs.QUEUED,
+    ]
+
+    release.set()
+    wait_for(same_key)
+    assert order == ["other", "first", "second", "third"]
+    assert utilsJobs._key_queues == {}
+
+
+def test_failed_job_releases_its_key(jobs):
+    def fail():
+        raise RuntimeError("COPY failed")
+
+    failed = utilsJobs.submit_job("failed", fail, lock_key="table")
+    done = utilsJobs.submit_job("done", lambda: "ok", lock_key="table")
+
+    assert (
+        wait_for([failed, done], (utilsJobs.DONE, utilsJobs.FAILED))[1]["message"]
+        == "ok"
+    )
+
+
+def test_only_the_jobs_of_ended_processes_are_interrupted(jobs):
+    ended = subprocess.Popen([sys.executable, "-c", "pass"])
+    ended.wait()
+    owners = {"ended": ended.pid, "running": os.getppid(), "unknown": None}
+    with sqlite3.connect(utilsJobs.JOBS_DATABASE) as connection:
+        connection.execute(utilsJobs.CREATE_JOBS_QUERY)
+        connection.executemany(
+            "INSERT INTO jobs (id, label, status, created_at, owner) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (name, name, utilsJobs.RUNNING, utilsJobs._now(), owner)
+                for name, owner in owners.items()
+            ],
+        )
+    connection.close()
+
+    states = utilsJobs.get_jobs(list(owners))
+
+    assert [job["status"] for job in states] == [
+        utilsJobs.INTERRUPTED,
+        utilsJobs.RUNNING,
+        utilsJobs.INTERRUPTED,
+    ]
+
+
+def test_jobs_table_without_owner_is_migrated(jobs):
+    with sqlite3.connect(utilsJobs.JOBS_DATABASE) as connection:
+        connection.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, label TEXT NOT NULL, "
+            "status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT, "
+            "created_at TEXT NOT NULL, started_at TEXT, finished_at TEXT)"
+        )
+        connection.execute(
+            "INSERT INTO jobs (id, label, status, created_at) VALUES (?, ?, ?, ?)",
+            ("old", "old", utilsJobs.QUEUED, utilsJobs._now()),
+        )
+    connection.close()
+
+    job_id = utilsJobs.submit_job("new", lambda: "ok")
+
+    assert utilsJobs.get_jobs(["old"])[0]["status"] == utilsJobs.INTERRUPTED
+    assert wait_for([job_id])[0]["owner"] == os.getpid()
@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+
+import src.utilsDB as utilsDB
+import src.utilsMetrics as utilsMetrics
+
+
+@pytest.fixture
+def saved_runs(monkeypatch):
+    saved = []
+
+    def save_run(run, status, duration, rows, nbytes, error):
+        # The run must not borrow a connection while the thread holds one
+        saved.append((run["data_type"], status, utilsDB.holds_pooled_connection()))
+
+    monkeypatch.setattr(utilsDB, "_checkout", lambda: object())
+    monkeypatch.setattr(utilsDB, "_checkin", lambda connection: None)
+    monkeypatch.setattr(utilsMetrics, "RECORD_INGESTION_RUNS", True)
+    monkeypatch.setattr(utilsMetrics, "_save_run", save_run)
+    return saved
+
+
+def test_run_ended_inside_a_pooled_connection_is_saved_after_it(saved_runs):
+    with utilsDB.pooled_connection(with_engine=False):
+        with utilsMetrics.ingestion_run("Qualité_de_tri", datetime.date(2024, 7, 16)):
+            pass
+        with utilsDB.pooled_connection(with_engine=False):
+            pass
+        assert saved_runs == []
+
+    assert saved_runs == [("Qualité_de_tri", "ok", False)]
+
+
+def test_failed_run_is_saved_after_the_connection(saved_runs):
+    with pytest.raises(ValueError):
+        with utilsDB.pooled_connection(with_engine=False):
+            with utilsMetrics.ingestion_run("Interventions"):
+                raise ValueError("Mauvais format")
+
+    assert saved_runs == [("Interventions", "error", False)]
+
+
+def test_run_outside_a_pooled_connection_is_saved_at_once(saved_runs):
+    with utilsMetrics.ingestion_run("Poids_carbone"):
+        pass
+
+    assert saved_runs == [("Poids_carbone", "ok", False)]
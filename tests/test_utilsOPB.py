@@ -0,0 +1,156 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+import src.utilsDB as utilsDB
+from src.pipelines import TABLE_KEYS
+from src.utilsOPB import compute_opb, recompute_opb
+
+WEIGHTS = pd.DataFrame({"COEFF": [2.0], "CLE_BOURRAGE": ["Bourrage convoyeur 3"]})
+
+
+def events(rows: list) -> pd.DataFrame:
+    return pd.DataFrame(
+        rows, columns=["Message", "Date heure de début", "Date heure de fin"]
+    ).assign(Date=datetime.date(2024, 7, 16))
+
+
+def test_rows_are_dated_by_the_earliest_event():
+    # The events files are not always in chronological order
+    df_opb, df_bourrage_iob, opb_date = compute_opb(
+        events(
+            [
+                ["Bourrage convoyeur 3", "16/07/2024 06:00:00", "16/07/2024 07:30:00"],
+                ["Erreur IOB 12", "16/07/2024 05:00:00", "16/07/2024 05:30:00"],
+                ["Bourrage convoyeur 3", "15/07/2024 23:00:00", "16/07/2024 00:30:00"],
+                ["Arrêt d'urgence", "15/07/2024 22:00:00", "15/07/2024 22:10:00"],
+            ]
+        ),
+        WEIGHTS,
+    )
+
+    assert opb_date == datetime.date(2024, 7, 15)
+    assert df_opb.to_dict("records") == [
+        {"Date": datetime.date(2024, 7, 15), "Duree_ponderee": 6.0}
+    ]
+    assert df_bourrage_iob.to_dict("records") == [
+        {
+            "Date": datetime.date(2024, 7, 15),
+            "Type": "Bourrage",
+            "Duree": 3.0,
+            "Nombre de défauts": 2,
+        },
+        {
+            "Date": datetime.date(2024, 7, 15),
+            "Type": "IOB",
+            "Duree": pytest.approx(0.5),
+            "Nombre de défauts": 1,
+        },
+    ]
+
+
+def test_no_weighted_event():
+    df_opb, df_bourrage_iob, opb_date = compute_opb(
+        events([["Arrêt d'urgence", "16/07/2024 05:00:00", "16/07/2024 05:10:00"]]),
+        WEIGHTS,
+    )
+
+    assert opb_date is None
+    assert df_opb.empty
+    assert df_bourrage_iob.empty
+
+
+# Events of a day whose times are datetime cells, as calamine and openpyxl
+# return them
+DAY = datetime.date(2024, 7, 16)
+DATETIME_EVENTS = pd.DataFrame(
+    {
+        "Date heure de début": pd.to_datetime(
+            ["2024-07-16 06:00:00", "2024-07-16 05:00:00", "2024-07-16 04:00:00"]
+        ),
+        "Date heure de fin": pd.to_datetime(
+            ["2024-07-16 07:30:00", "2024-07-16 05:30:00", "2024-07-16 05:30:00"]
+        ),
+        "Machine": ["C3", "IOB", "C3"],
+        "Message": ["Bourrage convoyeur 3", "Erreur IOB 12", "Bourrage convoyeur 3"],
+        "Date": DAY,
+    }
+)
+
+
+def create_tables(database, text_table: bool):
+    """Create the tables of the OPB, with the aggregates of the day before.
+
+    With text_table, the tables are those of the former loads of events files
+    with text times, created by to_sql with their dates as text.
+    """
+    connection, engine = database
+    WEIGHTS.to_sql("Ponderations_Bourrages_LTH", engine, index=False)
+    date_type = "text" if text_table else "date"
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE TABLE "Dates_data" ("Site" text, "Data_type" text, "Date" date);
+            CREATE TABLE "OPB_LTH" ("Date" {date_type}, "Duree_ponderee" float8);
+            CREATE TABLE "OPB_Bourrage_LTH" (
+                "Date" {date_type}, "Type" text, "Duree" float8,
+                "Nombre de défauts" bigint
+            );
+            INSERT INTO "OPB_LTH" VALUES ('2024-07-15', 1.0), ('2024-07-16', 9.0);
+            INSERT INTO "OPB_Bourrage_LTH" VALUES ('2024-07-16', 'IOB', 9.0, 9)
+            """)
+        if text_table:
+            cursor.execute("""
+                CREATE TABLE "LTH_Evt_defauts" (
+                    "Date heure de début" text, "Date heure de fin" text,
+                    "Machine" text, "Message" text, "Date" text
+                );
+                INSERT INTO "LTH_Evt_defauts" VALUES (
+                    '15/07/2024 10:00:00', '15/07/2024 11:00:00', 'C3',
+                    'Bourrage convoyeur 3', '2024-07-15'
+                )
+                """)
+    connection.commit()
+
+
+def read_rows(database, query: str) -> list:
+    connection, _ = database
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return [
+            tuple(pytest.approx(v) if isinstance(v, float) else v for v in row)
+            for row in cursor.fetchall()
+        ]
+
+
+@pytest.mark.parametrize("text_table", [False, True], ids=["new", "text"])
+def test_recompute_matches_compute_opb_for_datetime_cells(
+    database, monkeypatch, text_table
+):
+    connection, engine = database
+    create_tables(database, text_table)
+    # Loaded by COPY like the Evt_defauts pipeline, the table being created by
+    # to_sql when it does not exist
+    monkeypatch.setattr(utilsDB, "BULK_LOAD_WITH_COPY", True)
+    utilsDB.replace_keyed_rows(
+        connection,
+        engine,
+        DATETIME_EVENTS,
+        "LTH_Evt_defauts",
+        TABLE_KEYS["LTH_Evt_defauts"],
+    )
+
+    counts = recompute_opb(connection, DAY, DAY)
+
+    df_opb, df_bourrage_iob, opb_date = compute_opb(DATETIME_EVENTS, WEIGHTS)
+    assert opb_date == DAY
+    assert counts == {"OPB_LTH": 1, "OPB_Bourrage_LTH": 2, "Dates_data": 1}
+    assert read_rows(
+        database, 'SELECT "Date"::date, "Duree_ponderee" FROM "OPB_LTH" ORDER BY 1'
+    ) == [(datetime.date(2024, 7, 15), 1.0), *df_opb.itertuples(index=False)]
+    assert read_rows(
+        database,
+        'SELECT "Date"::date, "Type", "Duree", "Nombre de défauts" '
+        'FROM "OPB_Bourrage_LTH" ORDER BY 1, 2',
+    ) == list(df_bourrage_iob.itertuples(index=False))
+    assert read_rows(database, 'SELECT * FROM "Dates_data"') == [("LTH", "OPB", DAY)]
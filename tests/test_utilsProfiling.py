@@ -0,0 +1,63 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import src.utilsProfiling as utilsProfiling
+from src.pipelines import _prefetched
+from src.utilsMetrics import bind_ingestion_run
+
+DAY = datetime.date(2024, 7, 16)
+
+
+@pytest.fixture
+def profiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(utilsProfiling, "PROFILES_DIR", str(tmp_path))
+    monkeypatch.setattr(utilsProfiling, "_enabled", True)
+
+
+def profiled_functions(path: str) -> set:
+    return {
+        function["function"]
+        for function in utilsProfiling.top_functions(path, limit=None)
+    }
+
+
+def parse_in_pool(value):
+    return value * 2
+
+
+def read_in_thread():
+    return 1
+
+
+def read_batches():
+    for value in range(3):
+        yield {"value": value}
+
+
+def test_pool_and_thread_functions_are_in_the_profile(profiling):
+    with utilsProfiling.profiled("Qualité_de_tri", DAY) as profile:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parsed = list(executor.map(bind_ingestion_run(parse_in_pool), [1, 2]))
+        thread = threading.Thread(target=bind_ingestion_run(read_in_thread))
+        thread.start()
+        thread.join()
+
+    assert parsed == [2, 4]
+    functions = profiled_functions(profile["path"])
+    assert {"parse_in_pool", "read_in_thread"} <= functions
+
+
+def test_prefetched_batches_are_in_the_profile(profiling):
+    timings = {"wait": 0.0}
+    with utilsProfiling.profiled("Qualité_de_tri", DAY) as profile:
+        batches = list(_prefetched(read_batches(), timings, depth=1))
+
+    assert [batch["value"] for batch in batches] == [0, 1, 2]
+    assert "read_batches" in profiled_functions(profile["path"])
+
+
+def test_functions_are_not_wrapped_outside_a_profile():
+    assert utilsProfiling.bind_profile(read_in_thread) is read_in_thread
@@ -0,0 +1,91 @@
+import contextlib
+import datetime
+
+import pytest
+
+import src.utilsStatus as utilsStatus
+
+
+@pytest.fixture
+def status(monkeypatch):
+    @contextlib.contextmanager
+    def pooled_connection():
+        yield None, None
+
+    def fetch_ingestion_status(connection, data_types, limit=None):
+        return {
+            "last": {"OPB": datetime.date(2024, 7, 16)},
+            "missing": {data_type: [] for data_type in data_types},
+        }
+
+    monkeypatch.setattr(utilsStatus, "pooled_connection", pooled_connection)
+    monkeypatch.setattr(utilsStatus, "fetch_ingestion_status", fetch_ingestion_status)
+    utilsStatus.invalidate_ingestion_status()
+    yield
+    utilsStatus.invalidate_ingestion_status()
+
+
+def test_cached_status_is_not_shared_with_callers(status):
+    fetched = utilsStatus.get_ingestion_status("OPB")
+    fetched["last"]["OPB"] = None
+    fetched["missing"]["OPB"].append(datetime.date(2024, 7, 15))
+
+    cached = utilsStatus.get_ingestion_status("OPB")
+    assert cached["last"] == {"OPB": datetime.date(2024, 7, 16)}
+    assert cached["missing"]["OPB"] == []
+
+
+class FakeConnection:
+    """Connection of a database where Jours_ouvrables was not created."""
+
+    def __init__(self):
+        self.queries = []
+        self.rolled_back = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.queries.append(query)
+        if "Jours_ouvrables" in query:
+            raise utilsStatus.errors.UndefinedTable(
+                'relation "public.Jours_ouvrables" does not exist'
+            )
+
+    def fetchall(self):
+        return [
+            ("last", "OPB", datetime.date(2024, 7, 16)),
+            ("last", "Injection_haut", None),
+            ("missing", "Injection_haut", datetime.date(2024, 7, 15)),
+            ("missing", "Injection_haut", datetime.date(2024, 7, 16)),
+        ]
+
+
+def test_status_without_the_calendar_table():
+    connection = FakeConnection()
+
+    status = utilsStatus.fetch_ingestion_status(connection, ["OPB", "Injection_haut"])
+
+    assert connection.rolled_back
+    assert "generate_series('2023-01-01'::date" in connection.queries[-1]
+    assert status == {
+        "last": {"OPB": datetime.date(2024, 7, 16)},
+        "missing": {
+            "OPB": [],
+            "Injection_haut": [datetime.date(2024, 7, 16), datetime.date(2024, 7, 15)],
+        },
+    }
@@ -0,0 +1,175 @@
+"""Vectorized correlation and R² of many series at once.
+
+Missing values are ignored pair by pair, and a correlation or R² that is not
+defined (fewer than two values, zero variance) is NaN instead of an error.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _as_2d(values) -> np.ndarray:
+    """Get the values as a float array with one column per series."""
+    array = np.asarray(values, dtype=float)
+    return array.reshape(-1, 1) if array.ndim == 1 else array
+
+
+def _rank(values: np.ndarray) -> np.ndarray:
+    """Rank each column, ties getting their average rank and NaN staying NaN."""
+    return pd.DataFrame(values).rank(method="average").to_numpy()
+
+
+def corr_matrix(values, method: str = "pearson") -> np.ndarray:
+    """Compute the correlations between all the columns of a 2-D array.
+
+    Args:
+        values (array-like): The series, one per column.
+        method (str, optional): "pearson", or "spearman" for the rank
+            correlation, the ranks being computed over the values of each
+            column. Defaults to "pearson".
+
+    Returns:
+        np.ndarray: The k x k correlation matrix, NaN where it is not defined.
+    """
+    x = _as_2d(values)
+    if method == "spearman":
+        x = _rank(x)
+    elif method != "pearson":
+        raise ValueError(f"Unknown correlation method: {method}")
+
+    mask = ~np.isnan(x)
+    weights = mask.astype(float)
+    # Centering first keeps the sums of squares accurate for large values
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x = np.where(mask, x - np.nanmean(x, axis=0), 0.0)
+        # Sums over the rows where both series of each pair have a value
+        n = weights.T @ weights
+        sum_x = x.T @ weights
+        sum_xx = (x * x).T @ weights
+        cov = x.T @ x - sum_x * sum_x.T / n
+        var_x = sum_xx - sum_x**2 / n
+        var_y = var_x.T
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def corr_score(x, y, method: str = "pearson") -> float:
+    """Compute the correlation between two series.
+
+    Args:
+        x (array-like): The first series.
+        y (array-like): The second series, of the same length.
+        method (str, optional): "pearson" or "spearman". Defaults to "pearson".
+
+    Returns:
+        float: The correlation, NaN when it is not defined.
+    """
+    return float(corr_matrix(np.column_stack([_as_2d(x), _as_2d(y)]), method)[0, 1])
+
+
+def r2_scores(y, y_pred) -> np.ndarray:
+    """Compute the R² of the predictions of many series at once.
+
+    Args:
+        y (array-like): The observed series, one per column.
+        y_pred (array-like): The predictions, of the same shape.
+
+    Returns:
+        np.ndarray: The R² of each column, NaN when the observations are
+            constant or missing.
+    """
+    y = _as_2d(y)
+    y_pred = _as_2d(y_pred)
+    mask = ~(np.isnan(y) | np.isnan(y_pred))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_y = np.sum(np.where(mask, y, 0.0), axis=0) / mask.sum(axis=0)
+        ss_t = np.sum(np.where(mask, (y - mean_y) ** 2, 0.0), axis=0)
+        ss_r = np.sum(np.where(mask, (y_pred - y) ** 2, 0.0), axis=0)
+        r2 = 1 - ss_r / ss_t
+    r2[~(ss_t > 0)] = np.nan
+    return r2
+
+
+def r2_score(y, y_pred) -> float:
+    """Compute the R² of the predictions of a series.
+
+    Args:
+        y (array-like): The observed values.
+        y_pred (array-like): The predicted values.
+
+    Returns:
+        float: The R², NaN when the observations are constant.
+    """
+    return float(r2_scores(y, y_pred)[0])
+
+
+def grouped_corr(
+    df: pd.DataFrame, by, columns: list = None, method: str = "pearson"
+) -> pd.DataFrame:
+    """Compute the correlation matrix of some columns within each group.
+
+    Equivalent to df.groupby(by)[columns].corr(), but the sums of all the
+    groups and pairs of columns are computed by a single groupby.
+
+    Args:
+        df (pd.DataFrame): The data.
+        by (str | list): The grouping columns.
+        columns (list, optional): The numeric columns to correlate. Defaults to
+            all the other numeric columns.
+        method (str, optional): "pearson", or "spearman" with the values ranked
+            within each group. Defaults to "pearson".
+
+    Returns:
+        pd.DataFrame: The correlation matrices, indexed by group and column,
+            with one column per correlated column.
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    if columns is None:
+        columns = [c for c in df.select_dtypes("number").columns if c not in keys]
+    x = df[columns].astype(float)
+    groups = [df[key] for key in keys]
+    if method == "spearman":
+        x = x.groupby(groups).rank(method="average")
+    elif method != "pearson":
+        raise ValueError(f"Unknown correlation method: {method}")
+
+    x = x - x.groupby(groups).transform("mean")
+    mask = x.notna().astype(float)
+    x = x.fillna(0.0)
+    k = len(columns)
+    pairs = [(i, j) for i in range(k) for j in range(k)]
+    sums = pd.DataFrame(
+        {
+            **{("n", i, j): mask.iloc[:, i] * mask.iloc[:, j] for i, j in pairs},
+            **{("x", i, j): x.iloc[:, i] * mask.iloc[:, j] for i, j in pairs},
+            **{("xx", i, j): x.iloc[:, i] ** 2 * mask.iloc[:, j] for i, j in pairs},
+            **{("xy", i, j): x.iloc[:, i] * x.iloc[:, j] for i, j in pairs},
+        },
+        index=df.index,
+    )
+    sums = sums.groupby(groups, sort=True).sum()
+
+    shape = (len(sums), k, k)
+    n = sums["n"].to_numpy().reshape(shape)
+    sum_x = sums["x"].to_numpy().reshape(shape)
+    sum_xx = sums["xx"].to_numpy().reshape(shape)
+    sum_xy = sums["xy"].to_numpy().reshape(shape)
+    sum_y = sum_x.transpose(0, 2, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x**2 / n
+        var_y = var_x.transpose(0, 2, 1)
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    corr = np.clip(corr, -1.0, 1.0)
+
+    index = pd.MultiIndex.from_tuples(
+        [
+            (*(group if isinstance(group, tuple) else (group,)), column)
+            for group in sums.index
+            for column in columns
+        ],
+        names=keys + [None],
+    )
+    return pd.DataFrame(corr.reshape(-1, k), index=index, columns=columns)
@@ -1,9 +1,12 @@
-import datetime
+import os
 import re
+import threading
+from collections import OrderedDict
+
 import pandas as pd
-import streamlit as st
 import numpy as np
-import pickle
+
+from utils_folder.stats import corr_score, grouped_corr, r2_score
 
 
 types = [
@@ -20,22 +23,11 @@ types = [
 ]
 
 def get_corr_score(x, y):
-    mX = sum(x) / len(x)
-    mY = sum(y) / len(y)
-    cov = sum((a - mX) * (b - mY) for (a, b) in zip(x, y)) / len(x)
-    stdevX = (sum((a - mX) ** 2 for a in x) / len(x)) ** 0.5
-    stdevY = (sum((b - mY) ** 2 for b in y) / len(y)) ** 0.5
-    return round(cov/(stdevX*stdevY),3)
-
-def get_R2_score(y,y_pred):
-    mean_y = np.mean(y)
-    ss_t = 0
-    ss_r = 0
-    for i in range(len(y)):  # val_count represents the no.of input x values
-        ss_t += (y[i] - mean_y) ** 2
-        ss_r += (y_pred[i] - y[i]) ** 2
-    r2 = 1 - (ss_r / ss_t)
-    return r2
+    return round(corr_score(x, y), 3)
+
+
+def get_R2_score(y, y_pred):
+    return r2_score(y, y_pred)
 
 
 def get_number_after_substring(s: str, subs: str):
@@ -50,425 +42,338 @@ def get_word_after_substring(s: str, subs: str):
     return s.split(subs)[1].strip().split(" ")[0]
 
 
-# @st.cache_data()
-def get_evts_by_type(df_evt: pd.DataFrame, type_evt):
-    data_clean = df_evt.copy()
-    df_inj = pd.read_pickle("tmp_files/df_inj.pkl")
-    df_inj = df_inj.fillna(0)
-    # data_clean['Date heure de début'] = data_clean['Date heure de début'].apply(lambda x: x if (x.time().strftime("%H:%M:%S"))>="05:00:00" else x - datetime.timedelta(days = 1))
-    # data_clean['Jour_de_la_semaine'] = data_clean['Date heure de début'].apply(lambda x: x.weekday())
-    # data_clean['Heure_debut_defaut'] = data_clean['Date heure de début'].apply(lambda x: x.time().strftime("%H:%M:%S"))
-    # data_clean['Heure'] = data_clean['Date heure de début'].apply(lambda x: x.hour)
-    # data_clean["Date"] = data_clean['Date heure de début'].dt.date
-    if type_evt == "Apparition_plateau":
-        df_result = data_clean.loc[
-            data_clean["Message"].str.lower().str.contains("apparition sur plateau")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             # df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        #             new_row = {'Date': date, 'Message': error, '# Occurrences': 0}
-        #             df_result = df_result.append(new_row, ignore_index = True)
-        df_result["Plateau"] = df_result["Message"].apply(
-            lambda x: get_number_after_substring(x, "plateau ")
-        )
-        df_result["SPS"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "sps ")), errors="coerce"
-        )
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "SPS"])[["Total injecté"]].sum().reset_index(),
-            on=["Date", "SPS"],
-            how="outer",
-        )
-    elif type_evt == "Déchargement_plateau":
-        df_result = data_clean.loc[
-            data_clean["Message"]
-            .str.lower()
-            .str.startswith("défaut de déchargement plateau")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result["Plateau"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "plateau "))
-        )
-        df_result["Ilot"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "ilot ")), errors="coerce"
-        )
-        df_result["Sortie"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "sortie "))
-        )
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "SPS"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Ilot"],
-            right_on=["Date", "SPS"],
-            how="outer",
-        ).drop(columns=["SPS"])
-    elif type_evt == "Déclenchement_plateau":
-        df_result = data_clean.loc[
-            data_clean["Message"]
-            .str.lower()
-            .str.startswith("défaut de déclenchement plateau")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result["Plateau"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "plateau "))
-        )
-        df_result["Ilot"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "ilot ")), errors="coerce"
-        )
-        df_result["Sortie"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "sortie "))
-        )
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "SPS"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Ilot"],
-            right_on=["Date", "SPS"],
-            how="outer",
-        ).drop(columns=["SPS"])
-    elif type_evt == "IOC":
-        df_result = data_clean.loc[
-            data_clean["Message"].str.startswith("Défaut Item-On-Cover")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result["Plateau"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "plateau "))
-        )
-        df_result["Ilot"] = pd.to_numeric(
-            df_result["Message"].apply(lambda x: get_number_after_substring(x, "IOC")), errors="coerce"
-        )
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "SPS"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Ilot"],
-            right_on=["Date", "SPS"],
-            how="outer",
-        ).drop(columns=["SPS"])
-    elif type_evt == "NAT":
-        df_result = data_clean.loc[
-            data_clean["Message"].str.lower().str.startswith("défaut plateau")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result = df_result.loc[
-            df_result["Message"].str.lower().str.contains("non aligné")
-        ]
-        df_result["Plateau"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "plateau "))
-        )
-        df_result["Ilot"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "nat")), errors="coerce"
-        )
-        # df_result["Ilot"] = df_result
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "SPS"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Ilot"],
-            right_on=["Date", "SPS"],
-            how="outer",
-        ).drop(columns=["SPS"])
-    elif type_evt == "MTS":
-        df_result = data_clean.loc[
-            data_clean["Message"].str.lower().str.startswith("défaut plateau")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result = df_result.loc[
-            df_result["Message"]
-            .str.lower()
-            .str.contains("manquant détecté sur cellule")
-        ]
-        df_result["Plateau"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "plateau "))
-        )
-        df_result["Ilot"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "mts")), errors="coerce"
-        )
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "SPS"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Ilot"],
-            right_on=["Date", "SPS"],
-            how="outer",
-        ).drop(columns=["SPS"])
-    elif type_evt == "TTS":
-        df_result = data_clean.loc[
-            data_clean["Message"].str.lower().str.startswith("défaut plateau")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result = df_result.loc[
-            df_result["Message"].str.lower().str.contains("basculé sur")
+INJECTIONS_PICKLE = "tmp_files/df_inj.pkl"
+
+# Injection totals kept in memory, by source file and version (0 disables them)
+INJECTION_TOTALS_CACHE_MAX_BYTES = (
+    int(os.getenv("injection_totals_cache_max_mb", "64")) * 1024 * 1024
+)
+
+_injection_totals_cache = OrderedDict()
+_injection_totals_lock = threading.Lock()
+
+# Message prefix of each event type. A message can be of several types, e.g. an
+# "apparition sur plateau" anywhere in a message of another type.
+EVT_TYPE_PATTERNS = {
+    "IOC": r"(?-i:Défaut Item-On-Cover)",
+    "Déchargement_plateau": r"défaut de déchargement plateau",
+    "Déclenchement_plateau": r"défaut de déclenchement plateau",
+    "NAT": r"défaut plateau.*non aligné",
+    "MTS": r"défaut plateau.*manquant détecté sur cellule",
+    "TTS": r"défaut plateau.*basculé sur",
+    "Bourrage": r"défaut de bourrage",
+    "Disparition_bande": r"défaut disparition sur la bande",
+    "Apparition_bande": r"défaut apparition sur la bande",
+    "Apparition_plateau": r".*apparition sur plateau",
+}
+# Each type is an optional lookahead, so every type of a message is matched
+EVT_TYPES = re.compile(
+    r"(?is)^"
+    + "".join(
+        f"(?=(?P<{name}>{pattern}))?" for name, pattern in EVT_TYPE_PATTERNS.items()
+    )
+)
+
+
+def fields_regex(*fields: str) -> re.Pattern:
+    """Compile the regex extracting named fields from a message.
+
+    Args:
+        *fields (str): The patterns of the fields, each with a named group,
+            searched independently of the others.
+
+    Returns:
+        re.Pattern: The regex, for Series.str.extract.
+    """
+    return re.compile(r"(?s)^" + "".join(f"(?=.*?{field})?" for field in fields))
+
+
+# Fields extracted from the messages of each event type, the column joined with
+# the injection totals and the key of these totals
+PLATEAU = r"(?i:plateau )(?P<Plateau>\d+)"
+EVT_TYPE_FIELDS = {
+    "Apparition_plateau": (
+        fields_regex(r"plateau (?P<Plateau>\d+)", r"(?i:sps )(?P<SPS>\d+)"),
+        "SPS",
+        "SPS",
+    ),
+    "Déchargement_plateau": (
+        fields_regex(
+            PLATEAU, r"(?i:ilot )(?P<Ilot>\d+)", r"(?i:sortie )(?P<Sortie>\d+)"
+        ),
+        "Ilot",
+        "SPS",
+    ),
+    "Déclenchement_plateau": (
+        fields_regex(
+            PLATEAU, r"(?i:ilot )(?P<Ilot>\d+)", r"(?i:sortie )(?P<Sortie>\d+)"
+        ),
+        "Ilot",
+        "SPS",
+    ),
+    "IOC": (fields_regex(PLATEAU, r"IOC(?P<Ilot>\d+)"), "Ilot", "SPS"),
+    "NAT": (fields_regex(PLATEAU, r"(?i:nat)(?P<Ilot>\d+)"), "Ilot", "SPS"),
+    "MTS": (fields_regex(PLATEAU, r"(?i:mts)(?P<Ilot>\d+)"), "Ilot", "SPS"),
+    "TTS": (fields_regex(PLATEAU, r"(?i:tts)(?P<Ilot>\d+)"), "Ilot", "SPS"),
+    "Bourrage": (
+        fields_regex(
+            r"(?i:injecteur )(?P<Injecteur>\d+)", r"(?i:cellule)\s*(?P<Cellule>\S*)"
+        ),
+        "Injecteur",
+        "Antenne",
+    ),
+    "Disparition_bande": (
+        fields_regex(r"(?i:injecteur )(?P<Injecteur>\d+)"),
+        "Injecteur",
+        "Antenne",
+    ),
+    "Apparition_bande": (
+        fields_regex(r"(?i:injecteur )(?P<Injecteur>\d+)"),
+        "Injecteur",
+        "Antenne",
+    ),
+}
+NUMERIC_EVT_FIELDS = ["SPS", "Ilot", "Injecteur"]
+# Value of the other fields missing from a message, as get_number_after_substring
+MISSING_EVT_FIELD = ValueError
+
+
+def _file_version(path: str) -> tuple:
+    """Get the modification time and size of a file."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _totals_size(totals: dict) -> int:
+    return sum(int(df.memory_usage(deep=True).sum()) for df in totals.values())
+
+
+def get_injection_totals(path: str = INJECTIONS_PICKLE) -> dict:
+    """Get the injected parcels per day and SPS, and per day and antenne.
+
+    The totals are computed once per version of the injections file and kept
+    in memory, the least recently used first evicted.
+
+    Args:
+        path (str, optional): The pickle of the injections. Defaults to
+            INJECTIONS_PICKLE.
+
+    Returns:
+        dict: The "SPS" and "Antenne" totals, DataFrames of the Date, the key and
+            the Total injecté columns.
+    """
+    key = (path, _file_version(path))
+    with _injection_totals_lock:
+        if key in _injection_totals_cache:
+            _injection_totals_cache.move_to_end(key)
+            return dict(_injection_totals_cache[key][0])
+
+    df_inj = pd.read_pickle(path).fillna(0)
+    totals = {
+        column: df_inj.groupby(["Date", column])[["Total injecté"]].sum().reset_index()
+        for column in ("SPS", "Antenne")
+    }
+    size = _totals_size(totals)
+    if size > INJECTION_TOTALS_CACHE_MAX_BYTES:
+        return totals
+
+    with _injection_totals_lock:
+        # Older versions of the same file are never read again
+        for cached_key in [k for k in _injection_totals_cache if k[0] == path]:
+            del _injection_totals_cache[cached_key]
+        _injection_totals_cache[key] = (totals, size)
+        total_size = sum(size for _, size in _injection_totals_cache.values())
+        while total_size > INJECTION_TOTALS_CACHE_MAX_BYTES:
+            _, (_, evicted_size) = _injection_totals_cache.popitem(last=False)
+            total_size -= evicted_size
+    return dict(totals)
+
+
+def classify_evts(df_evt: pd.DataFrame) -> pd.DataFrame:
+    """Tag the events with their types, in a single pass over the messages.
+
+    Args:
+        df_evt (pd.DataFrame): The events, with a Message column.
+
+    Returns:
+        pd.DataFrame: A boolean column by key of EVT_TYPE_PATTERNS, whether the
+            message of each event is of this type.
+    """
+    return df_evt["Message"].str.extract(EVT_TYPES).notna()
+
+
+def get_evts_by_types(df_evt: pd.DataFrame, types_evt: list = types) -> dict:
+    """Get the events of several types, joined with the injected parcels.
+
+    The messages are classified once, the fields of the events of each type
+    are extracted with the regex of the type and the injection totals are
+    computed once for all the types. An event of several types is in the
+    events of each of them.
+
+    Args:
+        df_evt (pd.DataFrame): The events, with the Date, Message and
+            # Occurrences columns.
+        types_evt (list, optional): The event types, keys of EVT_TYPE_FIELDS.
+            Defaults to all the types.
+
+    Returns:
+        dict: The events of each type, with the fields of their message and the
+            Total injecté of their day and equipment, and a row without
+            message by day and equipment with injections but without events.
+    """
+    evt_types = classify_evts(df_evt)
+    totals = get_injection_totals()
+    results = {}
+    for type_evt in types_evt:
+        regex, key, total_key = EVT_TYPE_FIELDS[type_evt]
+        df_result = df_evt.loc[
+            evt_types[type_evt], ["Date", "Message", "# Occurrences"]
         ]
-        df_result["Plateau"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "plateau "))
-        )
-        df_result["Ilot"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "tts")), errors="coerce"
-        )
+        fields = df_result["Message"].str.extract(regex)
+        for column in fields.columns:
+            if column in NUMERIC_EVT_FIELDS:
+                df_result[column] = pd.to_numeric(fields[column], errors="coerce")
+            elif column == "Cellule":
+                df_result[column] = fields[column].str.lower()
+            else:
+                df_result[column] = fields[column].map(
+                    lambda value: MISSING_EVT_FIELD if pd.isna(value) else value
+                )
         df_result = pd.merge(
             df_result,
-            df_inj.groupby(["Date", "SPS"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Ilot"],
-            right_on=["Date", "SPS"],
+            totals[total_key],
+            left_on=["Date", key],
+            right_on=["Date", total_key],
             how="outer",
-        ).drop(columns=["SPS"])
-    elif type_evt == "Bourrage":
-        df_result = data_clean.loc[
-            data_clean["Message"].str.lower().str.startswith("défaut de bourrage")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result["Injecteur"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "injecteur ")), errors="coerce"
-        )
-        df_result["Cellule"] = (
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_word_after_substring(x, "cellule"))
         )
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "Antenne"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Injecteur"],
-            right_on=["Date", "Antenne"],
-            how="outer",
-        ).drop(columns=["Antenne"])
-    elif type_evt == "Disparition_bande":
-        df_result = data_clean.loc[
-            data_clean["Message"]
-            .str.lower()
-            .str.startswith("défaut disparition sur la bande")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result["Injecteur"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "injecteur ")), errors="coerce"
+        if key != total_key:
+            # The days with injections but without events have no key of their own
+            df_result[key] = df_result[key].fillna(df_result[total_key])
+            df_result = df_result.drop(columns=[total_key])
+        results[type_evt] = df_result
+    return results
+
+
+def get_evts_by_type(df_evt: pd.DataFrame, type_evt):
+    # Unknown types are the events of appearance on the belt
+    if type_evt not in EVT_TYPE_FIELDS:
+        type_evt = "Apparition_bande"
+    return get_evts_by_types(df_evt, [type_evt])[type_evt]
+
+
+def get_evts_injection_corr(evts_by_type: dict, method: str = "pearson") -> dict:
+    """Correlate the daily defects of each equipment with its injected parcels.
+
+    Args:
+        evts_by_type (dict): The events of each type, see get_evts_by_types.
+        method (str, optional): "pearson" or "spearman". Defaults to "pearson".
+
+    Returns:
+        dict: The correlation matrix of # Occurrences and Total injecté of each
+            equipment, by event type, see grouped_corr.
+    """
+    results = {}
+    for type_evt, df_result in evts_by_type.items():
+        key = EVT_TYPE_FIELDS[type_evt][1]
+        # Days with injections but without events count as days without defects
+        daily = (
+            df_result.groupby([key, "Date"])
+            .agg({"# Occurrences": "sum", "Total injecté": "first"})
+            .reset_index()
         )
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "Antenne"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Injecteur"],
-            right_on=["Date", "Antenne"],
-            how="outer",
-        ).drop(columns=["Antenne"])
-    else:
-        df_result = data_clean.loc[
-            data_clean["Message"]
-            .str.lower()
-            .str.startswith("défaut apparition sur la bande")
-        ][["Date", "Message", "# Occurrences"]]
-        # for error in df_result.Message.unique():
-        #     for date in data_clean["Date"].unique():
-        #         if len(df_result.loc[(df_result.Message == error) & (df_result["Date"] == date)]) == 0:
-        #             df_result.loc[(df_result.Message == error) & (df_result["Date"] == date), "# Occurrences"] = 0
-        df_result["Injecteur"] = pd.to_numeric(
-            df_result["Message"]
-            .str.lower()
-            .apply(lambda x: get_number_after_substring(x, "injecteur ")), errors="coerce"
+        results[type_evt] = grouped_corr(
+            daily, key, ["# Occurrences", "Total injecté"], method=method
         )
-        df_result = pd.merge(
-            df_result,
-            df_inj.groupby(["Date", "Antenne"])[["Total injecté"]].sum().reset_index(),
-            left_on=["Date", "Injecteur"],
-            right_on=["Date", "Antenne"],
-            how="outer",
-        ).drop(columns=["Antenne"])
+    return results
+
+
+# Machines whose events are not sorter defects
+EXCLUDED_MACHINES = [
+    "354050ZP0005",
+    "354050ZL0001",
+    "TPGD-REN-ARC",
+    "API API Non-Meca",
+    "TPGD-REN-SUP1",
+    "TPGD-REN-SUP2",
+    "PFC-REN-PNM1",
+    "PFC-REN-PNM2",
+]
+
+# Messages that are not defects: scanners, sessions, tasks, modes, SQL and event ends
+EXCLUDED_MESSAGES = re.compile(r"Douchette|connexion|tâche|Sql|Fin :|(?i:mode)")
+
+# Numbered equipments of the lowercased messages, replaced by the equipment name.
+# The sortie alternative also absorbs the numbers that the successive
+# "sortie N et N", "sortie N_N" and "sortie N" substitutions used to remove.
+EQUIPMENT_NUMBERS = re.compile(
+    r"(?P<sortie>sortie)(?: \d+ et \d+)?(?: \d+_\d+)?(?: \d+)?"
+    r"|(?P<equipment>glacis|convoyeur|connecteur|flap|quai|caljan|pic) \d+"
+    r"|(?P<bf>bf)\d+"
+    r"|(?P<urgence>urgence au)\d+"
+)
 
-    return df_result
+# Shift boundaries, in seconds since midnight
+MORNING_START = 5 * 3600
+AFTERNOON_START = 12 * 3600 + 30 * 60
+EVENING_START = 19 * 3600 + 30 * 60
+SATURDAY_EVENING_START = 20 * 3600 + 30 * 60
 
 
 def clean_data(df_evt):
-    data_clean = df_evt.copy()
-    data_clean = data_clean[
-        (data_clean["Machine"] != "354050ZP0005")
-        & (data_clean["Machine"] != "354050ZL0001")
-        & (data_clean["Machine"] != "TPGD-REN-ARC")
-        & (data_clean["Machine"] != "API API Non-Meca")
-        & (data_clean["Machine"] != "TPGD-REN-SUP1")
-        & (data_clean["Machine"] != "TPGD-REN-SUP2")
-        & (data_clean["Machine"] != "PFC-REN-PNM1")
-        & (data_clean["Machine"] != "PFC-REN-PNM2")
-    ]
-    data_clean["Date heure de début"] = data_clean["Date heure de début"].apply(
-        lambda x: x
-        if (x.time().strftime("%H:%M:%S")) >= "05:00:00"
-        else x - datetime.timedelta(days=1)
-    )
-    data_clean["Jour_de_la_semaine"] = data_clean["Date heure de début"].apply(
-        lambda x: x.weekday()
-    )
-    data_clean["Heure_debut_defaut"] = data_clean["Date heure de début"].apply(
-        lambda x: x.time().strftime("%H:%M:%S")
-    )
-    data_clean["Heure"] = data_clean["Date heure de début"].apply(lambda x: x.hour)
-    data_clean = data_clean[
-        ~data_clean["Message"].str.contains("Douchette")
-    ].reset_index(drop=True)
-    data_clean = data_clean[~data_clean["Message"].str.contains("connexion")]
-    data_clean = data_clean[~data_clean["Message"].str.contains("tâche")]
-    data_clean = data_clean[~data_clean["Message"].str.lower().str.contains("mode")]
-    data_clean = data_clean[~data_clean["Message"].str.contains("Sql")].reset_index(
-        drop=True
-    )
-    data_clean["Message_clean"] = data_clean["Message"]
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"plateau \d+", "plateau", x).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"sortie \d+ et \d+", "sortie", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"sortie \d+_\d+", "sortie", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"sortie \d+", "sortie", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"glacis \d+", "glacis", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"convoyeur \d+", "convoyeur", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"connecteur \d+", "connecteur", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"flap \d+", "flap", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"quai \d+", "quai", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"caljan \d+", "caljan", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"bf\d+", "bf", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"pic \d+", "pic", x.lower()).strip()
-    )
-    data_clean["Message_clean"] = data_clean["Message_clean"].apply(
-        lambda x: re.sub(r"urgence au\d+", "urgence au", x.lower()).strip()
+    keep = ~df_evt["Machine"].isin(EXCLUDED_MACHINES)
+    keep &= ~df_evt["Message"].str.contains(EXCLUDED_MESSAGES)
+    data_clean = df_evt.loc[keep].reset_index(drop=True)
+
+    # Events before 5:00 belong to the evening shift of the day before
+    debut = data_clean["Date heure de début"]
+    seconds = debut.dt.hour * 3600 + debut.dt.minute * 60 + debut.dt.second
+    debut = debut.mask(seconds < MORNING_START, debut - pd.Timedelta(days=1))
+    data_clean["Date heure de début"] = debut
+    data_clean["Jour_de_la_semaine"] = debut.dt.weekday.astype("int64")
+    data_clean["Heure_debut_defaut"] = debut.dt.strftime("%H:%M:%S")
+    data_clean["Heure"] = debut.dt.hour.astype("int64")
+
+    # "Plateau N" keeps its number, only the lowercase "plateau N" is replaced
+    data_clean["Message_clean"] = (
+        data_clean["Message"]
+        .str.replace(r"plateau \d+", "plateau", regex=True)
+        .str.lower()
+        .str.replace(
+            EQUIPMENT_NUMBERS,
+            r"\g<sortie>\g<equipment>\g<bf>\g<urgence>",
+            regex=True,
+        )
+        .str.strip()
     )
 
     data_clean["Temps_def"] = (
         data_clean["Date heure de fin"] - data_clean["Date heure de début"]
     )
     data_clean["Temps_def"] = data_clean["Temps_def"].dt.seconds
-    data_clean["Temps_def_delta"] = pd.to_timedelta(data_clean["Temps_def"], unit="S")
-
-    data_clean["Equipe"] = "Temp"
-
-    data_clean.loc[
-        (
-            (data_clean["Jour_de_la_semaine"] > 0)
-            & (data_clean["Heure_debut_defaut"] < "12:30:00")
-        )
-        & (
-            (data_clean["Jour_de_la_semaine"] > 0)
-            & (data_clean["Heure_debut_defaut"] > "05:00:00")
-        ),
-        "Equipe",
-    ] = "Matin"
-
-    data_clean.loc[
-        (
-            (data_clean["Jour_de_la_semaine"] < 5)
-            & (data_clean["Heure_debut_defaut"] < "19:30:00")
-        )
-        & (
-            (data_clean["Jour_de_la_semaine"] < 5)
-            & (data_clean["Heure_debut_defaut"] > "12:30:00")
-        ),
-        "Equipe",
-    ] = "Apres-midi"
-
-    data_clean.loc[
-        (
-            (data_clean["Jour_de_la_semaine"] == 5)
-            & (data_clean["Heure_debut_defaut"] < "20:30:00")
-        )
-        & (
-            (data_clean["Jour_de_la_semaine"] == 5)
-            & (data_clean["Heure_debut_defaut"] > "12:30:00")
-        ),
-        "Equipe",
-    ] = "Apres-midi"
+    data_clean["Temps_def_delta"] = pd.to_timedelta(data_clean["Temps_def"], unit="s")
 
-    data_clean.loc[
-        (
-            (data_clean["Jour_de_la_semaine"] < 5)
-            & (data_clean["Heure_debut_defaut"] > "19:30:00")
-        )
-        | (
-            (data_clean["Jour_de_la_semaine"] > 0)
-            & (data_clean["Heure_debut_defaut"] < "05:00:00")
-        ),
-        "Equipe",
-    ] = "Soir"
-
-    data_clean.loc[
-        (data_clean["Jour_de_la_semaine"] == 0)
-        & (data_clean["Heure_debut_defaut"] < "12:30:00"),
-        "Equipe",
-    ] = "Normalement pas de défaut"
-    data_clean = data_clean.loc[
-        ~data_clean["Message"].str.contains("Fin :")
-    ].reset_index(drop=True)
+    # The first matching shift wins, from the most to the least specific
+    day = data_clean["Jour_de_la_semaine"]
+    data_clean["Equipe"] = np.select(
+        [
+            (day == 0) & (seconds < AFTERNOON_START),
+            ((day < 5) & (seconds > EVENING_START))
+            | ((day > 0) & (seconds < MORNING_START)),
+            (day == 5)
+            & (seconds > AFTERNOON_START)
+            & (seconds < SATURDAY_EVENING_START),
+            (day < 5) & (seconds > AFTERNOON_START) & (seconds < EVENING_START),
+            (day > 0) & (seconds > MORNING_START) & (seconds < AFTERNOON_START),
+        ],
+        [
+            "Normalement pas de défaut",
+            "Soir",
+            "Apres-midi",
+            "Apres-midi",
+            "Matin",
+        ],
+        default="Temp",
+    )
     return data_clean, len(data_clean)
 
 
@@ -0,0 +1,1220 @@
+import datetime
+import io
+import logging
+
+import streamlit as st
+from pandas._config.config import OptionError
+
+from utils_folder.utils import *
+from src.utilsAzure import *
+from src.utilsDB import *
+from src.utilsExcel import *
+from src.utilsOPB import *
+from src.utilsStatus import *
+from src.utilsJobs import *
+from src.utilsMetrics import *
+from src.utilsProfiling import *
+from src.pipelines import *
+
+try:
+    pd.options.mode.copy_on_write = True
+except OptionError:
+    pass
+
+BAD_FORMAT_MESSAGE = (
+    "Le fichier n'est pas en bon format. Veuillez recharger le bon fichier."
+)
+
+
+def increment_key(s: str):
+    try:
+        return (
+            s.rsplit(sep="_", maxsplit=1)[0]
+            + "_"
+            + str(int(s.rsplit(sep="_", maxsplit=1)[-1]) + 1)
+        )
+    except:
+        return s
+
+
+def to_numeric(x: str):
+    if isinstance(x, int):
+        x = str(x)
+    else:
+        x = x.encode("UTF-8")
+        x = str(x, encoding="UTF-8")
+    x = x.replace(",", ".")
+    x = x.replace("\u00a0", "")
+    return x
+
+
+def add_evt_file_job(date, content: bytes) -> str:
+    """Upload the events and defaults file to Azure Blob Storage and update the database.
+
+    Args:
+        date (datetime.date): The date of the events and defaults data.
+        content (bytes): The content of the events and defaults file.
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+    with ingestion_run("OPB", date):
+        set_job_progress(0.1, "Enregistrement du fichier")
+        # Store the uploaded workbook as is and parse it once for the database
+        df = store_extraction(date, "Evenementsetdefauts.xlsx", content)
+        set_job_progress(0.5, "Écriture des évènements et défauts")
+        with pooled_connection() as (connection, engine):
+            run_pipeline(
+                "Evt_defauts",
+                date,
+                connection,
+                engine,
+                frames={"Evenementsetdefauts.xlsx": df},
+            )
+            set_job_progress(0.8, "Calcul de l'OPB")
+            upload_opb(df, connection, engine, date)
+        return "Le fichier des évènements et défauts est ajouté dans la base de données."
+
+
+def add_evt_file_callback(OPB_file, date):
+    """Queue the upload of the events and defaults file, see add_evt_file_job.
+
+    Args:
+        OPB_file (UploadedFile): The uploaded events and defaults file.
+        date (datetime.date): The date of the events and defaults data.
+    """
+    submit_upload(
+        f"Évènements et défauts du {date.strftime('%d/%m/%Y')}",
+        add_evt_file_job,
+        date,
+        OPB_file.getvalue(),
+        lock_key=("OPB", date),
+        failure_message=BAD_FORMAT_MESSAGE,
+    )
+    st.session_state["df_evt_file"] = increment_key(st.session_state["df_evt_file"])
+
+
+def update_injections_antennes(connection, engine, date):
+    """Update the injections aux antennes data in the database.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        date (datetime.date): The date of the injections aux antennes data.
+    """
+
+    run_pipeline("Injections_antennes", date, connection, engine)
+
+
+def update_evts_defauts(connection, engine, date):
+    """Update the events and defaults data in the database.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        date (datetime.date): The date of the events and defaults data.
+    """
+    with ingestion_run("OPB", date):
+        frames = run_pipeline("Evt_defauts", date, connection, engine)["frames"]
+        df = frames.get("Evenementsetdefauts.xlsx")
+        if df is not None:
+            upload_opb(df, connection, engine, date)
+
+
+def add_evt_file():
+    """Add a file uploader for the events and defaults file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing events and defaults data.
+    It will also display the last date of events and defaults data and the list of missing dates.
+    When the user selects a file and a date, and clicks the "Valider" button, the valider_evts function will be called to process the data.
+    """
+    if "df_evt_file" not in st.session_state:
+        st.session_state["df_evt_file"] = f"df_evt_file_key_0"
+
+    df_evt_file = st.file_uploader(
+        "Sélectionner un fichier excel des évènements et défauts",
+        type="xlsx",
+        key=st.session_state.df_evt_file,
+    )
+    dernier_jour_evt = get_last_date("OPB")
+    st.info(
+        f"Dernier jour d'évènements et défauts : {dernier_jour_evt.strftime('%d/%m/%Y')}"
+    )
+    st.info(
+        f"Liste des derniers jours manquant les données OPB : {get_missing_dates('OPB')}"
+    )
+
+    if df_evt_file is not None:
+        date = st.date_input(
+            "Sélectionner la date des données évènements et défauts",
+            value=datetime.date.today() - datetime.timedelta(days=1),
+            max_value=datetime.date.today() - datetime.timedelta(days=1),
+        )
+
+        st.button(
+            "Valider",
+            key="Valider_evts_btn",
+            on_click=add_evt_file_callback,
+            args=(df_evt_file, date),
+        )
+
+
+def add_injection_job(date, content: bytes, haut_bas) -> str:
+    """Upload the injections aux antennes file to Azure Blob Storage and update the database.
+
+    Args:
+        date (datetime.date): The date of the injections aux antennes data.
+        content (bytes): The content of the injections aux antennes file.
+        haut_bas (str): The type of trieur (haut or bas).
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+    with ingestion_run(f"Injection_{haut_bas}", date):
+        set_job_progress(0.1, "Enregistrement du fichier")
+        # Store the uploaded workbook as is, only the other trieur is read back
+        injection_dfs = {
+            haut_bas: store_extraction(
+                date, f"Injectiondescolisauxantennes_trieur_{haut_bas}.xlsx", content
+            )
+        }
+        other = "bas" if haut_bas == "haut" else "haut"
+        injection_dfs[other] = read_extraction(
+            date, f"Injectiondescolisauxantennes_trieur_{other}.xlsx"
+        )
+        df_haut = injection_dfs["haut"]
+        df_bas = injection_dfs["bas"]
+
+        set_job_progress(0.5, "Écriture des injections")
+        with pooled_connection() as (connection, engine):
+            if df_haut is not None:
+                add_date_data(
+                    connection=connection,
+                    engine=engine,
+                    date=date,
+                    data_type="Injection_haut",
+                    site="LTH",
+                )
+            if df_bas is not None:
+                add_date_data(
+                    connection=connection,
+                    engine=engine,
+                    date=date,
+                    data_type="Injection_bas",
+                    site="LTH",
+                )
+
+            if df_haut is not None and df_bas is not None:
+                try:
+                    total_haut = total_injecte(df_haut)
+                except Exception as e:
+                    raise ValueError(
+                        "Le format du fichier d'injection du trieur haut n'est pas bon. Merci de recharger le fichier."
+                    ) from e
+                try:
+                    total_bas = total_injecte(df_bas)
+                except Exception as e:
+                    raise ValueError(
+                        "Le format du fichier d'injection du trieur bas n'est pas bon. Merci de recharger le fichier."
+                    ) from e
+
+                write_injection_par_jour(connection, date, total_haut + total_bas)
+
+                run_pipeline(
+                    "Injections_antennes",
+                    date,
+                    connection,
+                    engine,
+                    frames={
+                        "Injectiondescolisauxantennes_trieur_haut.xlsx": df_haut,
+                        "Injectiondescolisauxantennes_trieur_bas.xlsx": df_bas,
+                    },
+                )
+
+        return (
+            f"Le fichier d'injection du trieur {haut_bas} est ajouté dans la base de données."
+        )
+
+
+def add_injection_callback(date, injection_file, haut_bas):
+    """Queue the upload of the injections aux antennes file, see add_injection_job.
+
+    The uploads of both trieurs of a same day, and their recording from Azure, are
+    written one after the other.
+
+    Args:
+        date (datetime.date): The date of the injections aux antennes data.
+        injection_file (UploadedFile): The uploaded injections aux antennes file.
+        haut_bas (str): The type of trieur (haut or bas).
+    """
+    submit_upload(
+        f"Injections du trieur {haut_bas} du {date.strftime('%d/%m/%Y')}",
+        add_injection_job,
+        date,
+        injection_file.getvalue(),
+        haut_bas,
+        lock_key=("Injection", date),
+    )
+    st.session_state["injection_file"] = increment_key(
+        st.session_state["injection_file"]
+    )
+
+
+def write_injection_par_jour(connection, date, total: int):
+    """Replace the number of injected parcels of a day in the database.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        date (datetime.date): The date of the injections.
+        total (int): The number of injected parcels of both trieurs.
+    """
+    extraction_date = date.strftime("%Y-%m-%d")
+
+    # SQL query to insert a new record into the table
+    query = 'INSERT INTO public."Injection_par_jour_LTH" ("Date", "nombre de colis injectés") VALUES (%s, %s);'
+
+    # Execute the query with the values
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+                DELETE FROM public."Injection_par_jour_LTH"
+                WHERE "Date"='{extraction_date}'
+            """
+        )
+        cursor.execute(query, (extraction_date, total))
+    # Delete and insert are committed together
+    connection.commit()
+
+
+def add_trafic_sortie_job(date, content: bytes, haut_bas) -> str:
+    """Upload the trafic par sortie file to Azure Blob Storage and update the database.
+
+    Args:
+        date (datetime.date): The date of the trafic par sortie data.
+        content (bytes): The content of the trafic par sortie file.
+        haut_bas (str): The type of trieur (haut or bas).
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+    with ingestion_run(f"Trafic_par_sortie_trieur_{haut_bas}", date):
+        file = f"Trafic_par_sortie_trieur_{haut_bas}.xlsx"
+        set_job_progress(0.1, "Enregistrement du fichier")
+        # Store the uploaded workbook as is and parse it once for the database
+        trafic_sortie_df = store_extraction(date, file, content)
+        set_job_progress(0.5, "Écriture du trafic par sortie")
+        with pooled_connection() as (connection, engine):
+            # Replace the rows of the same day, trieur and sorties in one transaction
+            rows = run_pipeline(
+                f"Trafic_par_sortie_trieur_{haut_bas}",
+                date,
+                connection,
+                engine,
+                frames={file: trafic_sortie_df},
+            )["rows"]
+
+        if rows == 0:
+            raise ValueError(
+                "Le fichier de trafic par sortie n'est pas ajouté dans la base de données. Veuillez vérifier le fichier!"
+            )
+        return "Le fichier de trafic par sortie est ajouté dans la base de données."
+
+
+def add_trafic_sortie_callback(date, trafic_sortie_file, haut_bas):
+    """Queue the upload of the trafic par sortie file, see add_trafic_sortie_job.
+
+    Args:
+        date (datetime.date): The date of the trafic par sortie data.
+        trafic_sortie_file (UploadedFile): The uploaded trafic par sortie file.
+        haut_bas (str): The type of trieur (haut or bas).
+    """
+    submit_upload(
+        f"Trafic par sortie du trieur {haut_bas} du {date.strftime('%d/%m/%Y')}",
+        add_trafic_sortie_job,
+        date,
+        trafic_sortie_file.getvalue(),
+        haut_bas,
+        lock_key=(f"Trafic_par_sortie_trieur_{haut_bas}", date),
+    )
+    st.session_state["trafic_sortie_file"] = increment_key(
+        st.session_state["trafic_sortie_file"]
+    )
+
+
+def add_inj_file():
+    """Add a file uploader for the injections file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing injections data.
+    It will also display the last date of injections data and the list of missing dates.
+    When the user selects a file and a date, and clicks the "Valider la date saisie..." button, the valider_injection function will be called to process the data.
+    """
+
+    if "injection_file" not in st.session_state:
+        st.session_state["injection_file"] = "injection_file_key_0"
+
+    df_inj_file = st.file_uploader(
+        "Sélectionner un fichier excel des injections",
+        key=st.session_state["injection_file"],
+        type="xlsx",
+    )
+    trieur_dict = {"Trieur du haut": "haut", "Trieur du bas": "bas"}
+    bas_haut = st.selectbox("Sélectionner le trieur", options=trieur_dict.keys())
+
+    dernier_jour_injection = get_last_date(f"Injection_{trieur_dict[bas_haut]}")
+
+    st.info(
+        f"Dernier jour d'injections du trieur {trieur_dict[bas_haut]} : {dernier_jour_injection.strftime('%d/%m/%Y')}",
+    )
+    if trieur_dict[bas_haut].lower() == "haut":
+        st.info(
+            f"Liste des derniers jours manquant les données injections du trieur haut : {get_missing_dates('Injection_haut')}"
+        )
+    else:
+        st.info(
+            f"Liste des derniers jours manquant les données injections du trieur bas : {get_missing_dates('Injection_bas')}"
+        )
+    if df_inj_file is not None:
+
+        date = st.date_input(
+            "Date des données d'injection",
+            max_value=datetime.date.today() - datetime.timedelta(days=1),
+            value=datetime.date.today() - datetime.timedelta(days=1),
+        )
+
+        st.button(
+            "Valider la date saisie...",
+            key="valider_inj_file_btn",
+            on_click=add_injection_callback,
+            args=(date, df_inj_file, trieur_dict[bas_haut]),
+        )
+
+    with st.expander("Recharger les injections déjà enregistrées dans Azure"):
+        reload_date = st.date_input(
+            "Date des injections à recharger",
+            max_value=datetime.date.today() - datetime.timedelta(days=1),
+            value=datetime.date.today() - datetime.timedelta(days=1),
+            key="reload_injection_date",
+        )
+        st.button(
+            "Recharger",
+            key="reload_injection_btn",
+            on_click=upload_injection_callback,
+            args=(reload_date,),
+        )
+
+
+def add_trafic_sortie_file():
+    """Add a file uploader for the trafic par sortie file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing trafic par sortie data.
+    It will also display the last date of trafic par sortie data and the list of missing dates.
+    When the user selects a file and a date, and clicks the "Valider la date saisie..." button, the valider_trafic_sortie function will be called to process the data.
+    """
+
+    if "trafic_sortie_file" not in st.session_state:
+        st.session_state["trafic_sortie_file"] = "trafic_sortie_file_key_0"
+
+    df_trafic_sortie_file = st.file_uploader(
+        "Sélectionner un fichier excel des trafics par sortie",
+        key=st.session_state["trafic_sortie_file"],
+        type="xlsx",
+    )
+    trieur_dict = {"Trieur du haut": "haut", "Trieur du bas": "bas"}
+    bas_haut = st.selectbox(
+        "Sélectionner le trieur", options=trieur_dict.keys(), key="trieur_trafic_sortie"
+    )
+
+    dernier_jour_trafic_sortie = get_last_date(
+        f"Trafic_par_sortie_trieur_{trieur_dict[bas_haut]}"
+    )
+    st.info(
+        f"Dernier jour de trafic par sortie du trieur {trieur_dict[bas_haut]} : {dernier_jour_trafic_sortie.strftime('%d/%m/%Y')}",
+    )
+
+    if trieur_dict[bas_haut].lower() == "haut":
+        st.info(
+            f"Liste des derniers jours manquant les données trafic par sortie du trieur haut : {get_missing_dates('Trafic_par_sortie_trieur_haut')}"
+        )
+    else:
+        st.info(
+            f"Liste des derniers jours manquant les données trafic par sortie du trieur bas : {get_missing_dates('Trafic_par_sortie_trieur_bas')}"
+        )
+    if df_trafic_sortie_file is not None:
+
+        date = st.date_input(
+            "Date des données de trafic par sortie",
+            max_value=datetime.date.today() - datetime.timedelta(days=1),
+            value=datetime.date.today() - datetime.timedelta(days=1),
+        )
+
+        st.button(
+            "Valider la date saisie...",
+            key="valider_trafic_sortie_file_btn",
+            on_click=add_trafic_sortie_callback,
+            args=(date, df_trafic_sortie_file, trieur_dict[bas_haut]),
+        )
+
+
+def add_prod_job(date, content: bytes) -> str:
+    """Upload the production file to Azure Blob Storage and update the database.
+
+    Args:
+        date (datetime.date): The date of the production data.
+        content (bytes): The content of the production file.
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+    with ingestion_run("Temps_fonctionnement", date):
+        set_job_progress(0.1, "Enregistrement du fichier")
+        # Store the uploaded workbook as is and parse it once for the database
+        df = store_extraction(
+            date, "Temps_de_fonctionnement_et_arrêts_machine.xlsx", content
+        )
+        set_job_progress(0.5, "Écriture des temps de fonctionnement")
+        with pooled_connection() as (connection, engine):
+            run_pipeline(
+                "Temps_fonctionnement",
+                date,
+                connection,
+                engine,
+                frames={"Temps_de_fonctionnement_et_arrêts_machine.xlsx": df},
+            )
+        return "Le fichier des temps de fonctionnement et arrêts machine est ajouté dans la base de données."
+
+
+def add_prod_callback(date, prod_file):
+    """Queue the upload of the production file, see add_prod_job.
+
+    Args:
+        date (datetime.date): The date of the production data.
+        prod_file (UploadedFile): The uploaded production file.
+    """
+    submit_upload(
+        f"Temps de fonctionnement du {date.strftime('%d/%m/%Y')}",
+        add_prod_job,
+        date,
+        prod_file.getvalue(),
+        lock_key=("Temps_fonctionnement", date),
+        failure_message=BAD_FORMAT_MESSAGE,
+    )
+    st.session_state["fonctionnement_file"] = increment_key(
+        st.session_state["fonctionnement_file"]
+    )
+
+
+def add_prod_file():
+    """Add a file uploader for the production file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing production data.
+    It will also display the last date of production data and the list of missing dates.
+    When the user selects a file and a date, and clicks the "Valider la date saisie..." button, the valider_prod function will be called to process the data.
+    """
+
+    if "fonctionnement_file" not in st.session_state:
+        st.session_state["fonctionnement_file"] = f"fonctionnement_file_key_0"
+    df_prod_file = st.file_uploader(
+        "Sélectionner un fichier excel du temps de fonctionnement et arrêts machine",
+        key=st.session_state["fonctionnement_file"],
+        type="xlsx",
+    )
+
+    dernier_jour_prod = get_last_date("Temps_fonctionnement")
+
+    st.info(
+        f"Dernier jour du temps de fonctionnement et arrêts machine : {dernier_jour_prod.strftime('%d/%m/%Y')}",
+    )
+    st.info(
+        f"Liste des derniers jours manquant les données de fonctionnement et arrêts machine : {get_missing_dates('Temps_fonctionnement')}"
+    )
+
+    if df_prod_file is not None:
+
+        date = st.date_input(
+            "Date des données du temps de fonctionnement et arrêts machine",
+            max_value=datetime.date.today() - datetime.timedelta(days=1),
+            value=datetime.date.today() - datetime.timedelta(days=1),
+        )
+
+        st.button(
+            "Valider la date saisie...",
+            key="valider_prod_btn",
+            on_click=add_prod_callback,
+            args=(date, df_prod_file),
+        )
+
+
+def add_qualite_job(date, content: bytes) -> str:
+    """Upload the quality file to Azure Blob Storage and update the database.
+
+    Args:
+        date (datetime.date): The date of the quality data.
+        content (bytes): The content of the quality file.
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+    with ingestion_run("Qualité_de_tri", date):
+        set_job_progress(0.1, "Enregistrement du fichier")
+        # Store the uploaded workbook as is and parse it once for the database
+        df = store_extraction(date, "Qualité_de_tri.xlsx", content)
+        set_job_progress(0.5, "Écriture de la qualité de tri")
+        with pooled_connection() as (connection, engine):
+            run_pipeline(
+                "Qualité_de_tri", date, connection, engine, frames={"Qualité_de_tri.xlsx": df}
+            )
+        return "Le fichier de qualité de tri est ajouté dans la base de données."
+
+
+def add_qualite_callback(date, qualite_file):
+    """Queue the upload of the quality file, see add_qualite_job.
+
+    Args:
+        date (datetime.date): The date of the quality data.
+        qualite_file (UploadedFile): The uploaded quality file.
+    """
+    submit_upload(
+        f"Qualité de tri du {date.strftime('%d/%m/%Y')}",
+        add_qualite_job,
+        date,
+        qualite_file.getvalue(),
+        lock_key=("Qualité_de_tri", date),
+        failure_message=BAD_FORMAT_MESSAGE,
+    )
+    st.session_state["df_qualite_file"] = increment_key(
+        st.session_state["df_qualite_file"]
+    )
+
+
+def update_trafic_sortie_data(connection, date, file):
+    # Use the shared SQLAlchemy engine of the connection pool
+    engine = get_engine()
+
+    # Replace the rows of the same day, trieurs and sorties in one transaction
+    run_pipeline("Trafic_par_sortie", date, connection, engine, sources=[file])
+
+
+def update_qualite_tri_data(connection, engine, date):
+    """Update the quality of sorting data in the database.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        date (datetime.date): The date of the quality of sorting data.
+    """
+
+    run_pipeline("Qualité_de_tri", date, connection, engine)
+
+
+def update_temps_fonctionnement(connection, engine, date):
+    """Update the temps de fonctionnement data in the database.
+
+    Args:
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        date (datetime.date): The date of the temps de fonctionnement data.
+    """
+
+    run_pipeline("Temps_fonctionnement", date, connection, engine)
+
+
+def add_qualite_file():
+    """Add a file uploader for the quality file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing quality data.
+    It will also display the last date of quality data and the list of missing dates.
+    When the user selects a file and a date, and clicks the "Valider la date saisie..." button, the valider_qualite function will be called to process the data.
+    """
+
+    if "df_qualite_file" not in st.session_state:
+        st.session_state["df_qualite_file"] = f"df_qualite_file_key_0"
+    df_qualite_file = st.file_uploader(
+        "Sélectionner un fichier excel de qualité de tri",
+        key=st.session_state["df_qualite_file"],
+        type="xlsx",
+    )
+
+    dernier_jour_qualite = get_last_date("Qualité_de_tri")
+
+    st.info(
+        f"Dernier jour de qualité de tri : {dernier_jour_qualite.strftime('%d/%m/%Y')}",
+    )
+    st.info(
+        f"Liste des derniers jours manquant les données Qualité de tri : {get_missing_dates('Qualité_de_tri')}"
+    )
+
+    if df_qualite_file is not None:
+        date = st.date_input(
+            "Date des données de qualité de tri",
+            max_value=datetime.date.today() - datetime.timedelta(days=1),
+            value=datetime.date.today() - datetime.timedelta(days=1),
+        )
+        st.button(
+            "Valider la date saisie...",
+            key="valider_qualite_btn",
+            on_click=add_qualite_callback,
+            args=(date, df_qualite_file),
+        )
+
+
+def upload_interventions_job(extraction_date, content: bytes) -> str:
+    """Upload the interventions file to the database.
+
+    Args:
+        extraction_date (datetime.date): The date of extraction of the interventions data.
+        content (bytes): The content of the interventions file.
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+    set_job_progress(0.1, "Écriture des interventions")
+    with pooled_connection() as (connection, engine):
+        # Replace the interventions with the same code in one transaction,
+        # large extracts being read, converted and copied batch by batch
+        run_pipeline(
+            "Interventions",
+            extraction_date,
+            connection,
+            engine,
+            sources=[io.BytesIO(content)],
+        )
+    return "Le fichier des interventions a été chargé avec succès."
+
+
+def upload_interventions_callback(interventions_file, extraction_date):
+    """Queue the upload of the interventions file, see upload_interventions_job.
+
+    Args:
+        interventions_file (UploadedFile): The uploaded interventions file.
+        extraction_date (datetime.date): The date of extraction of the interventions data.
+    """
+    submit_upload(
+        f"Interventions du {extraction_date.strftime('%d/%m/%Y')}",
+        upload_interventions_job,
+        extraction_date,
+        interventions_file.getvalue(),
+        lock_key="Interventions",
+    )
+    st.session_state["interventions_file"] = increment_key(
+        st.session_state["interventions_file"]
+    )
+
+
+def upload_interventions():
+    """Add a file uploader for the interventions file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing interventions data.
+    It will also display the last date of interventions data.
+    When the user selects a file and a date, and clicks the "Valider le chargement des interventions LTH" button, the upload_interventions_callback function will be called to process the data.
+    """
+
+    if "interventions_file" not in st.session_state:
+        st.session_state["interventions_file"] = f"interventions_file_key_0"
+    interventions_file = st.file_uploader(
+        "Sélectionner un fichier Excel des interventions",
+        key=st.session_state["interventions_file"],
+    )
+
+    last_extraction_date = get_last_date("Interventions")
+    st.info(
+        f"Date de la dernière extraction des interventions: {last_extraction_date.strftime('%d/%m/%Y')}"
+    )
+
+    if interventions_file is not None:
+
+        extraction_date = st.date_input(
+            "Sélectionner la date de l'extraction",
+            value=datetime.date.today(),
+            max_value=datetime.date.today(),
+            key="extraction_date_5",
+        )
+
+        if (
+            last_extraction_date is None
+            or last_extraction_date
+            == 0  # Consider if 0 is a valid comparison here, maybe just check for None?
+            or extraction_date >= last_extraction_date
+        ):
+            st.button(
+                "Valider le chargement des interventions LTH",
+                on_click=upload_interventions_callback,
+                args=(interventions_file, extraction_date),
+            )
+        else:
+            st.info(
+                "Les données plus rcentes ont été déjà chargées dans la base de données."
+            )
+
+
+def default_last_date(data_type: str) -> datetime.date:
+    """Get the date shown as the last extraction of a data type never loaded.
+
+    Args:
+        data_type (str): The type of data.
+
+    Returns:
+        datetime.date: The date, None for the data types without one.
+    """
+    if data_type == "Etat_stock":
+        return datetime.date(2025, 3, 31)
+    elif data_type == "OPB":
+        return datetime.date(2025, 4, 1)
+    elif "Injection" in data_type:
+        return datetime.date(2025, 4, 1)
+    elif data_type == "Qualité de tri":
+        return datetime.date(2025, 4, 1)
+    elif data_type == "Temps_fonctionnement":
+        return datetime.date(2025, 4, 1)
+    elif "Trafic_par_sortie_trieur_" in data_type:
+        return datetime.date(2025, 4, 1)
+    elif data_type == "Interventions":
+        return datetime.date(2025, 3, 30)
+    elif data_type == "Mvt_stock":
+        return datetime.date(2025, 3, 30)
+    return None
+
+
+def get_last_date(data_type: str) -> datetime.date:
+    """Get the last date of extraction for a given data type.
+
+    The date comes from the cached ingestion status, see get_ingestion_status.
+
+    Args:
+        data_type (str): The type of data.
+
+    Returns:
+        datetime.date: The last date of extraction.
+    """
+
+    try:
+        last_extraction_date = get_ingestion_status(data_type)["last"].get(data_type)
+    except Exception as e:
+        logging.info(f"Could not get the last date of {data_type}: {e}")
+        last_extraction_date = None
+    if last_extraction_date is None:
+        last_extraction_date = default_last_date(data_type)
+    return last_extraction_date
+
+
+def upload_mvt_stock_job(extraction_date, content: bytes) -> str:
+    """Upload the movements of stock file to the database.
+
+    Args:
+        extraction_date (datetime.date): The date of extraction of the movements of stock data.
+        content (bytes): The content of the movements of stock file.
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+    logging.info(
+        f"Uploading mvt_stock_file to database with extraction date: {extraction_date}"
+    )
+    set_job_progress(0.1, "Écriture des mouvements de stock")
+    with pooled_connection() as (connection, engine):
+        # Only the stored movements sharing a key with the file are replaced,
+        # the rest of the table history is not scanned. Large extracts are read,
+        # converted and copied batch by batch
+        run_pipeline(
+            "Mvt_stock",
+            extraction_date,
+            connection,
+            engine,
+            sources=[io.BytesIO(content)],
+        )
+    return "Le fichier des mouvements de stock est ajouté dans la base de données."
+
+
+def upload_mvt_stock_callback(mvt_stock_file, extraction_date):
+    """Queue the upload of the movements of stock file, see upload_mvt_stock_job.
+
+    Args:
+        mvt_stock_file (UploadedFile): The uploaded movements of stock file.
+        extraction_date (datetime.date): The date of extraction of the movements of stock data.
+    """
+    submit_upload(
+        f"Mouvements de stock du {extraction_date.strftime('%d/%m/%Y')}",
+        upload_mvt_stock_job,
+        extraction_date,
+        mvt_stock_file.getvalue(),
+        lock_key="Mvt_stock",
+    )
+    st.session_state["mvt_file"] = increment_key(st.session_state["mvt_file"])
+
+
+def upload_mvt_stock():
+    """Add a file uploader for the movements of stock file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing movements of stock data.
+    It will also display the last date of movements of stock data.
+    When the user selects a file and a date, and clicks the "Valider le chargement des mouvements de stock LTH" button, the upload_mvt_stock_callback function will be called to process the data.
+    """
+
+    if "mvt_file" not in st.session_state:
+        st.session_state["mvt_file"] = f"mvt_file_key_0"
+    mvt_stock_file = st.file_uploader(
+        "Sélectionner un fichier Excel des mouvements de stock",
+        key=st.session_state["mvt_file"],
+    )
+    last_extraction_date = get_last_date(data_type="Mvt_stock")
+
+    st.info(
+        f"Date de la dernière extraction des mouvements de stock : {last_extraction_date.strftime('%d/%m/%Y')}"
+    )
+
+    if mvt_stock_file is not None:
+        extraction_date = st.date_input(
+            "Sélectionner la date de l'extraction",
+            value=datetime.date.today(),
+            max_value=datetime.date.today(),
+            key="date_input_2",
+        )
+
+        if (
+            last_extraction_date is None
+            or last_extraction_date == 0
+            or extraction_date >= last_extraction_date
+        ):
+            st.button(
+                "Valider le chargement des mouvements de stock LTH",
+                on_click=upload_mvt_stock_callback,
+                args=(mvt_stock_file, extraction_date),
+            )
+        else:
+            st.info(
+                "Les données plus récentes ont été déjà chargées dans la base de données."
+            )
+
+
+def upload_stock_job(extraction_date, content: bytes) -> str:
+    """Upload the stock (inventaire) file to the database.
+
+    Args:
+        extraction_date (datetime.date): The date of extraction of the stock data.
+        content (bytes): The content of the stock file.
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+    logging.info(
+        f"Uploading etat_stock to database with extraction date: {extraction_date}"
+    )
+    set_job_progress(0.1, "Écriture de l'inventaire")
+    with pooled_connection() as (connection, engine):
+        # Only the stored rows of the articles and magasins in the file are replaced
+        run_pipeline(
+            "Etat_stock",
+            extraction_date,
+            connection,
+            engine,
+            sources=[io.BytesIO(content)],
+        )
+    return "Le fichier d'inventaire est ajouté dans la base de données."
+
+
+def upload_stock_callback(etat_stock, extraction_date):
+    """Queue the upload of the stock (inventaire) file, see upload_stock_job.
+
+    Args:
+        etat_stock (UploadedFile): The uploaded stock file.
+        extraction_date (datetime.date): The date of extraction of the stock data.
+    """
+    submit_upload(
+        f"Inventaire du {extraction_date.strftime('%d/%m/%Y')}",
+        upload_stock_job,
+        extraction_date,
+        etat_stock.getvalue(),
+        lock_key="Etat_stock",
+    )
+    st.session_state["inv_file"] = increment_key(st.session_state["inv_file"])
+
+
+def upload_inventaire():
+    """Add a file uploader for the stock (inventaire) file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing stock data.
+    It will also display the last date of stock data.
+    When the user selects a file and a date, and clicks the "Valider le chargement de l'inventaire LTH" button, the upload_stock_callback function will be called to process the data.
+    """
+
+    if "inv_file" not in st.session_state:
+        st.session_state["inv_file"] = f"inv_file_key_0"
+    etat_stock = st.file_uploader(
+        "Sélectionner un fichier Excel de l'inventaire",
+        key=st.session_state["inv_file"],
+    )
+
+    last_extraction_date = get_last_date(data_type="Etat_stock")
+
+    st.info(
+        f"Date de la dernière extraction de l'inventaire: {last_extraction_date.strftime('%d/%m/%Y')}"
+    )
+
+    if etat_stock is not None:
+        extraction_date = st.date_input(
+            "Sélectionner la date de l'extraction",
+            value=datetime.date.today(),
+            max_value=datetime.date.today(),
+            key="date_input_3",
+        )
+
+        if (
+            last_extraction_date is None
+            or last_extraction_date == 0
+            or extraction_date >= last_extraction_date
+        ):
+            st.button(
+                "Valider le chargement de l'inventaire LTH",
+                on_click=upload_stock_callback,
+                args=(etat_stock, extraction_date),
+            )
+        else:
+            st.info(
+                "Les données plus récentes ont été déjà chargées dans la base de données."
+            )
+
+
+def upload_poids_carbone_job(extraction_date, content: bytes) -> str:
+    """Upload the poids carbone file to the database.
+
+    Args:
+        extraction_date (datetime.date): The date of extraction of the poids carbone data.
+        content (bytes): The content of the poids carbone file.
+
+    Returns:
+        str: The message shown once the file is added.
+    """
+
+    logging.info(
+        f"Uploading poids_carbone to database with extraction date: {extraction_date}"
+    )
+
+    with ingestion_run("Poids_carbone", extraction_date):
+        set_job_progress(0.1, "Lecture du fichier")
+        df = read_excel(io.BytesIO(content))
+        df.columns = ["Article", "Libellé", "Poids carbone (kgCO2eq)"]
+
+        set_job_progress(0.5, "Écriture des poids carbone")
+        with pooled_connection() as (connection, engine):
+            # Write the DataFrame to the PostgreSQL table
+            with timed_stage("to_sql", rows=len(df)):
+                df.to_sql(
+                    "Poids_carbone_LTH",
+                    engine,
+                    schema="public",
+                    if_exists="replace",
+                    index=False,
+                )
+
+            connection.commit()
+
+            add_date_data(
+                connection=connection,
+                engine=engine,
+                date=extraction_date,
+                data_type="Poids_carbone",
+                site="LTH",
+            )
+        return "Le fichier de poids carbone est ajouté dans la base de données."
+
+
+def upload_poids_carbone_callback(poids_carbone, extraction_date):
+    """Queue the upload of the poids carbone file, see upload_poids_carbone_job.
+
+    Args:
+        poids_carbone (UploadedFile): The uploaded poids carbone file.
+        extraction_date (datetime.date): The date of extraction of the poids carbone data.
+    """
+    submit_upload(
+        f"Poids carbone du {extraction_date.strftime('%d/%m/%Y')}",
+        upload_poids_carbone_job,
+        extraction_date,
+        poids_carbone.getvalue(),
+        lock_key="Poids_carbone",
+        failure_message=BAD_FORMAT_MESSAGE,
+    )
+    st.session_state["poids_carbon_file"] = increment_key(
+        st.session_state["poids_carbon_file"]
+    )
+
+
+def upload_poids_carbone():
+    """Add a file uploader for the poids carbone file.
+    This function will add a file uploader to the Streamlit app, allowing the user to select an Excel file containing poids carbone data.
+    It will also display the last date of poids carbone data.
+    When the user selects a file and a date, and clicks the "Valider le chargement de poids carbone" button, the upload_poids_carbone_callback function will be called to process the data.
+    """
+
+    if "poids_carbon_file" not in st.session_state:
+        st.session_state["poids_carbon_file"] = f"poids_carbon_file_key_0"
+    poids_carbone = st.file_uploader(
+        "Sélectionner un fichier Excel de poids carbone",
+        key=st.session_state["poids_carbon_file"],
+    )
+
+    last_extraction_date = get_last_date(data_type="Poids_carbone")
+    st.info(
+        f"Date de la dernière extraction de poids carbone : {last_extraction_date.strftime('%d/%m/%Y')}"
+    )
+
+    if poids_carbone is not None:
+        extraction_date = st.date_input(
+            "Sélectionner la date de l'extraction",
+            value=datetime.date.today(),
+            max_value=datetime.date.today(),
+            key="date_input_4",
+        )
+
+        if (
+            last_extraction_date is None
+            or last_extraction_date == 0
+            or extraction_date >= last_extraction_date
+        ):
+            st.button(
+                "Valider le chargement de poids carbone",
+                on_click=upload_poids_carbone_callback,
+                args=(poids_carbone, extraction_date),
+            )
+        else:
+            st.info(
+                "Les données plus récentes ont été déjà chargées dans la base de données."
+            )
+
+
+def submit_upload(label: str, function, *args, **kwargs):
+    """Queue an upload job and follow its progress in the session.
+
+    Args:
+        label (str): The description of the upload.
+        function (callable): The job function, see submit_job.
+        *args: The positional arguments of the function.
+        **kwargs: The keyword arguments of submit_job and of the function.
+    """
+    job_id = submit_job(label, function, *args, **kwargs)
+    st.session_state.setdefault("upload_jobs", []).append(job_id)
+
+
+def get_missing_dates(data_type, date_format=False):
+    """Get the dates since 2023 without data of a given data type.
+
+    Args:
+        data_type (str): The type of data.
+        date_format (bool, optional): Whether to return all the missing dates,
+            queried from the database, instead of the last ones of the cached
+            ingestion status. Defaults to False.
+
+    Returns:
+        list | str: The missing dates, most recent first, or the last
+            MISSING_DATES_SHOWN of them as "dd/mm/YYYY" separated by commas.
+    """
+    if date_format:
+        # Borrow a connection from the shared pool
+        with pooled_connection() as (conn, _):
+            status = fetch_ingestion_status(conn, [data_type])
+        return status["missing"][data_type]
+
+    missing_dates = get_ingestion_status(data_type)["missing"].get(data_type, [])
+    return ", ".join([x.strftime("%d/%m/%Y") for x in missing_dates])
+
+
+def upload_opb(df_evts, connection, engine, date: datetime.date):
+    """Compute the OPB aggregates of a day of events and write them in the database.
+
+    With opb_in_database=1, the aggregates are computed by the database from the
+    events of the day already written in LTH_Evt_defauts, and df_evts is not used.
+
+    Args:
+        df_evts (pd.DataFrame): The events and defaults, as parsed for
+            LTH_Evt_defauts, read from Azure Blob Storage (or its Parquet
+            sidecar) when None.
+        connection (psycopg2.extensions.connection): The database connection.
+        engine (sqlalchemy.engine.base.Engine): The database engine.
+        date (datetime.date): The date of the OPB data.
+    """
+
+    if OPB_IN_DATABASE:
+        recompute_opb(connection, date, date)
+        return
+
+    if df_evts is None:
+        df_evts = read_extraction(date, "Evenementsetdefauts.xlsx")
+    if df_evts is not None:
+        df_opb, df_bourrage_iob, opb_date = compute_opb(
+            df_evts, get_bourrage_weights(connection)
+        )
+
+        # Write the DataFrame to the PostgreSQL table
+        table = "OPB_Bourrage_LTH"
+        replace_keyed_rows(
+            connection, engine, df_bourrage_iob, table, TABLE_KEYS[table]
+        )
+
+        table = "OPB_LTH"
+        replace_keyed_rows(connection, engine, df_opb, table, TABLE_KEYS[table])
+
+        add_date_data(
+            connection, engine, data_type="OPB", date=opb_date or date, site="LTH"
+        )
+
+
+def upload_injection(date: datetime.date) -> str:
+    """Record the injections of a day from the files already in Azure Blob Storage.
+
+    Args:
+        date (datetime.date): The date of the injections.
+
+    Returns:
+        str: The message shown once the injections are recorded.
+    """
+    # Only the Total rows are needed, loaded from the Parquet sidecars when possible
+    columns = ["Trieur", "Total injecté"]
+    set_job_progress(0.1, "Lecture des fichiers d'injection")
+    df_haut = read_extraction(
+        date, "Injectiondescolisauxantennes_trieur_haut.xlsx", columns=columns
+    )
+    df_bas = read_extraction(
+        date, "Injectiondescolisauxantennes_trieur_bas.xlsx", columns=columns
+    )
+
+    set_job_progress(0.5, "Écriture des injections")
+    with pooled_connection() as (connection, engine):
+        if df_haut is not None:
+            add_date_data(
+                connection=connection,
+                engine=engine,
+                date=date,
+                data_type="Injection_haut",
+                site="LTH",
+            )
+        if df_bas is not None:
+            add_date_data(
+                connection=connection,
+                engine=engine,
+                date=date,
+                data_type="Injection_bas",
+                site="LTH",
+            )
+
+        if df_haut is None or df_bas is None:
+            return "Les fichiers d'injection des deux trieurs ne sont pas tous les deux disponibles."
+
+        try:
+            total_haut = total_injecte(df_haut)
+        except Exception as e:
+            raise ValueError(
+                "Le format du fichier d'injection du trieur haut n'est pas bon. Merci de recharger le fichier."
+            ) from e
+        try:
+            total_bas = total_injecte(df_bas)
+        except Exception as e:
+            raise ValueError(
+                "Le format du fichier d'injection du trieur bas n'est pas bon. Merci de recharger le fichier."
+            ) from e
+
+        write_injection_par_jour(connection, date, total_haut + total_bas)
+    return "Les injections sont ajoutées dans la base de données."
+
+
+def upload_injection_callback(date):
+    """Queue the recording of the injections of a day, see upload_injection.
+
+    Args:
+        date (datetime.date): The date of the injections.
+    """
+    submit_upload(
+        f"Injections du {date.strftime('%d/%m/%Y')} depuis Azure",
+        upload_injection,
+        date,
+        lock_key=("Injection", date),
+    )